@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from .state import SqliteState
+from .storage import analytics_db, jobs_root, load_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL,
+    created_at TEXT,
+    indexed_at REAL NOT NULL,
+    fps REAL,
+    frames INTEGER,
+    player_count INTEGER,
+    event_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_profile ON jobs (profile);
+CREATE TABLE IF NOT EXISTS players (
+    job_id TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    team TEXT,
+    distance_m REAL,
+    avg_speed_mps REAL,
+    max_speed_mps REAL,
+    PRIMARY KEY (job_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS players_player ON players (player_id);
+CREATE INDEX IF NOT EXISTS players_team ON players (team);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event_id TEXT,
+    type TEXT NOT NULL,
+    frame INTEGER,
+    start_s REAL,
+    end_s REAL,
+    confidence REAL,
+    PRIMARY KEY (job_id, seq)
+);
+-- Event counts rolled up at index time, so aggregate queries scan a few rows per job.
+CREATE TABLE IF NOT EXISTS job_event_counts (
+    job_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (job_id, type)
+);
+CREATE TABLE IF NOT EXISTS player_event_counts (
+    job_id TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (job_id, player_id, type)
+);
+"""
+
+# Group-by keys callers may ask for, mapped to SQL expressions; nothing else reaches the query text.
+PLAYER_GROUPS = {"profile": "j.profile", "team": "p.team", "player": "p.player_id", "job": "p.job_id"}
+EVENT_GROUPS = {"profile": "j.profile", "type": "c.type", "job": "j.job_id"}
+EVENT_PLAYER_GROUPS = {**EVENT_GROUPS, "team": "p.team", "player": "p.player_id", "job": "p.job_id"}
+
+
+class AnalyticsIndex:
+    """Per-player metrics and events of completed jobs in one SQLite file.
+
+    Jobs are written whole, replacing any earlier rows for the same job, so
+    reruns and resumed pipelines can index again safely. Queries aggregate
+    over these small tables and never touch the per-job artifacts.
+    """
+
+    def __init__(self, path: Path):
+        self.db = SqliteState(path, schema=SCHEMA)
+
+    def index_job(
+        self,
+        job_id: str,
+        profile: str,
+        metrics: dict[str, Any],
+        events: list[dict[str, Any]],
+        created_at: Optional[str] = None,
+        fps: Optional[float] = None,
+        frames: Optional[int] = None,
+    ) -> None:
+        players = metrics.get("players", [])
+        with self.db.transaction() as conn:
+            _delete_job(conn, job_id)
+            conn.execute(
+                "INSERT INTO jobs (job_id, profile, created_at, indexed_at, fps, frames, player_count, event_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, profile, created_at, time.time(), fps, frames, len(players), len(events)),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO players (job_id, player_id, team, distance_m, avg_speed_mps, max_speed_mps) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, player["id"], player.get("team"), player.get("distance_m"), player.get("avg_speed_mps"), player.get("max_speed_mps"))
+                    for player in players
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO events (job_id, seq, event_id, type, frame, start_s, end_s, confidence) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, seq, event.get("id"), event["type"], event.get("frame"), event.get("start"), event.get("end"), event.get("confidence"))
+                    for seq, event in enumerate(events)
+                ],
+            )
+            by_type: dict[str, list[float]] = {}
+            by_player: dict[tuple[str, str], list[float]] = {}
+            for event in events:
+                confidence = float(event.get("confidence") or 0.0)
+                _tally(by_type, event["type"], confidence)
+                for player_id in dict.fromkeys(event.get("involved") or ()):
+                    if player_id:
+                        _tally(by_player, (player_id, event["type"]), confidence)
+            conn.executemany(
+                "INSERT INTO job_event_counts (job_id, type, events, confidence_sum) VALUES (?, ?, ?, ?)",
+                [(job_id, event_type, int(count), total) for event_type, (count, total) in by_type.items()],
+            )
+            conn.executemany(
+                "INSERT INTO player_event_counts (job_id, player_id, type, events, confidence_sum) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, player_id, event_type, int(count), total) for (player_id, event_type), (count, total) in by_player.items()],
+            )
+
+    def remove_job(self, job_id: str) -> None:
+        with self.db.transaction() as conn:
+            _delete_job(conn, job_id)
+
+    def indexed_jobs(self) -> set[str]:
+        return {row[0] for row in self.db.query("SELECT job_id FROM jobs")}
+
+    def backfill(self, root: Optional[Path] = None, force: bool = False) -> int:
+        """Index completed jobs found on disk that are not indexed yet (all of them with ``force``)."""
+        known = set() if force else self.indexed_jobs()
+        count = 0
+        for job_path in sorted((root or jobs_root()).glob("*/job.json")):
+            job = load_json(job_path)
+            artifacts = job_path.parent / "artifacts"
+            if job.get("status") != "completed" or job["id"] in known:
+                continue
+            if not (artifacts / "metrics.json").exists() or not (artifacts / "events.json").exists():
+                continue
+            summary = job.get("summary") or {}
+            self.index_job(
+                job["id"],
+                (job.get("config") or {}).get("profile") or summary.get("profile") or "unknown",
+                load_json(artifacts / "metrics.json"),
+                load_json(artifacts / "events.json").get("events", []),
+                created_at=job.get("created_at"),
+                fps=summary.get("fps"),
+                frames=summary.get("frames"),
+            )
+            count += 1
+        return count
+
+    def player_stats(
+        self,
+        group_by: list[str],
+        profile: Optional[str] = None,
+        team: Optional[str] = None,
+        player: Optional[str] = None,
+    ) -> list[dict[str, Any]]:
+        """Per-player metrics aggregated over the groups; ``appearances`` counts player-job pairs."""
+        groups = _groups(group_by, PLAYER_GROUPS)
+        where, params = _filters({"j.profile": profile, "p.team": team, "p.player_id": player})
+        sql = (
+            f"SELECT {_select(groups)}COUNT(DISTINCT p.job_id) AS jobs, COUNT(*) AS appearances, "
+            "ROUND(AVG(p.distance_m), 2) AS avg_distance_m, ROUND(SUM(p.distance_m), 2) AS total_distance_m, "
+            "ROUND(AVG(p.avg_speed_mps), 2) AS avg_speed_mps, MAX(p.max_speed_mps) AS max_speed_mps "
+            f"FROM players p JOIN jobs j ON j.job_id = p.job_id{where}{_group_order(groups)}"
+        )
+        return self.db.query_dicts(sql, tuple(params))
+
+    def event_stats(
+        self,
+        group_by: list[str],
+        profile: Optional[str] = None,
+        event_type: Optional[str] = None,
+        team: Optional[str] = None,
+        player: Optional[str] = None,
+    ) -> list[dict[str, Any]]:
+        """Event counts over the groups, with ``per_job`` = events / jobs in the group.
+
+        Grouping or filtering by player or team counts events per involved
+        player and averages over every job the player (or team) appeared in,
+        including jobs without a matching event.
+        """
+        per_player = bool({"player", "team"} & set(group_by)) or team is not None or player is not None
+        groups = _groups(group_by, EVENT_PLAYER_GROUPS if per_player else EVENT_GROUPS)
+        type_params: list[Any] = []
+        type_clause = ""
+        if event_type is not None:
+            type_clause = " AND c.type = ?"
+            type_params.append(event_type)
+        if per_player:
+            source = (
+                "players p JOIN jobs j ON j.job_id = p.job_id LEFT JOIN player_event_counts c "
+                f"ON c.job_id = p.job_id AND c.player_id = p.player_id{type_clause}"
+            )
+            jobs = "COUNT(DISTINCT p.job_id)"
+        else:
+            source = f"jobs j LEFT JOIN job_event_counts c ON c.job_id = j.job_id{type_clause}"
+            jobs = "COUNT(DISTINCT j.job_id)"
+        where, params = _filters({"j.profile": profile, "p.team": team, "p.player_id": player})
+        if "type" in group_by:
+            # Jobs without a matching event would otherwise form a group of their own.
+            where = f"{where} AND c.type IS NOT NULL" if where else " WHERE c.type IS NOT NULL"
+        events = "COALESCE(SUM(c.events), 0)"
+        sql = (
+            f"SELECT {_select(groups)}{events} AS events, {jobs} AS jobs, "
+            f"ROUND({events} * 1.0 / MAX({jobs}, 1), 3) AS per_job, "
+            "ROUND(SUM(c.confidence_sum) / SUM(c.events), 3) AS avg_confidence "
+            f"FROM {source}{where}{_group_order(groups)}"
+        )
+        return self.db.query_dicts(sql, (*type_params, *params))
+
+    def summary(self) -> dict[str, Any]:
+        rows = self.db.query("SELECT profile, COUNT(*), SUM(event_count) FROM jobs GROUP BY profile ORDER BY profile")
+        return {"profiles": [{"profile": profile, "jobs": jobs, "events": events or 0} for profile, jobs, events in rows]}
+
+
+def _delete_job(conn: sqlite3.Connection, job_id: str) -> None:
+    for table in ("jobs", "players", "events", "job_event_counts", "player_event_counts"):
+        conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+
+
+def _tally(counts: dict[Any, list[float]], key: Any, confidence: float) -> None:
+    entry = counts.setdefault(key, [0, 0.0])
+    entry[0] += 1
+    entry[1] += confidence
+
+
+def _groups(group_by: list[str], allowed: dict[str, str]) -> list[tuple[str, str]]:
+    unknown = [key for key in group_by if key not in allowed]
+    if unknown:
+        raise ValueError(f"cannot group by {', '.join(unknown)}; choose from {', '.join(allowed)}")
+    return [(key, allowed[key]) for key in dict.fromkeys(group_by)]
+
+
+def _select(groups: list[tuple[str, str]]) -> str:
+    return "".join(f"{expr} AS {key}, " for key, expr in groups)
+
+
+def _group_order(groups: list[tuple[str, str]]) -> str:
+    if not groups:
+        return ""
+    exprs = ", ".join(expr for _, expr in groups)
+    keys = ", ".join(key for key, _ in groups)
+    return f" GROUP BY {exprs} ORDER BY {keys}"
+
+
+def _filters(values: dict[str, Optional[str]]) -> tuple[str, list[Any]]:
+    clauses = [(f"{column} = ?", value) for column, value in values.items() if value is not None]
+    if not clauses:
+        return "", []
+    return " WHERE " + " AND ".join(clause for clause, _ in clauses), [value for _, value in clauses]
+
+
+_indexes: dict[Path, AnalyticsIndex] = {}
+_lock = threading.Lock()
+
+
+def open_index(path: Optional[Path] = None) -> AnalyticsIndex:
+    """Process-wide AnalyticsIndex for ``path`` (DATA_DIR/analytics.db by default)."""
+    path = path or analytics_db()
+    with _lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = AnalyticsIndex(path)
+        return index
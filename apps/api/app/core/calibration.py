@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Sequence
+
+from .config import DEFAULT_PROFILE, FIELD_DIMENSIONS
+from .schemas import CalibrationPoint, JobConfig
+from .telemetry import register_lru_cache
+
+Point = tuple[float, float]
+Correspondence = tuple[float, float, float, float]
+
+MIN_CALIBRATION_POINTS = 4
+
+
+@dataclass(frozen=True)
+class FieldTransform:
+    matrix: tuple[float, float, float, float, float, float, float, float, float]
+    calibrated: bool
+
+    def map_point(self, x: float, y: float) -> Point:
+        return self.map_points(((x, y),))[0]
+
+    def map_points(self, points: Iterable[Sequence[float]]) -> list[Point]:
+        h00, h01, h02, h10, h11, h12, h20, h21, h22 = self.matrix
+        if not self.calibrated:
+            # Plain scale: skip the projective divide.
+            return [(h00 * x, h11 * y) for x, y in points]
+        mapped = []
+        for x, y in points:
+            w = h20 * x + h21 * y + h22
+            if abs(w) < 1e-12:
+                w = 1e-12
+            mapped.append(((h00 * x + h01 * y + h02) / w, (h10 * x + h11 * y + h12) / w))
+        return mapped
+
+
+def field_dims(profile: str) -> tuple[float, float]:
+    dims = FIELD_DIMENSIONS.get(profile, FIELD_DIMENSIONS[DEFAULT_PROFILE])
+    return dims["length"], dims["width"]
+
+
+def _scale_matrix(width: float, height: float, profile: str) -> tuple[float, ...]:
+    length, field_width = field_dims(profile)
+    return (length / width, 0.0, 0.0, 0.0, field_width / height, 0.0, 0.0, 0.0, 1.0)
+
+
+def _normalizer(points: Sequence[Point]) -> tuple[float, float, float]:
+    cx = sum(p[0] for p in points) / len(points)
+    cy = sum(p[1] for p in points) / len(points)
+    mean_dist = sum(math.hypot(p[0] - cx, p[1] - cy) for p in points) / len(points)
+    scale = math.sqrt(2) / mean_dist if mean_dist > 1e-12 else 1.0
+    return scale, cx, cy
+
+
+def _solve(matrix: list[list[float]], rhs: list[float]) -> list[float] | None:
+    size = len(rhs)
+    rows = [row[:] + [value] for row, value in zip(matrix, rhs)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        pivot_row = rows[col]
+        for r in range(col + 1, size):
+            factor = rows[r][col] / pivot_row[col]
+            if factor:
+                row = rows[r]
+                for c in range(col, size + 1):
+                    row[c] -= factor * pivot_row[c]
+    solution = [0.0] * size
+    for r in range(size - 1, -1, -1):
+        acc = rows[r][size] - sum(rows[r][c] * solution[c] for c in range(r + 1, size))
+        solution[r] = acc / rows[r][r]
+    return solution
+
+
+def _matmul(a: Sequence[float], b: Sequence[float]) -> list[float]:
+    return [
+        sum(a[row * 3 + k] * b[k * 3 + col] for k in range(3))
+        for row in range(3)
+        for col in range(3)
+    ]
+
+
+def fit_homography(correspondences: Sequence[Correspondence]) -> tuple[float, ...] | None:
+    """Least-squares DLT fit of image -> field points, with Hartley normalization."""
+    if len(correspondences) < MIN_CALIBRATION_POINTS:
+        return None
+
+    src = [(c[0], c[1]) for c in correspondences]
+    dst = [(c[2], c[3]) for c in correspondences]
+    src_scale, src_cx, src_cy = _normalizer(src)
+    dst_scale, dst_cx, dst_cy = _normalizer(dst)
+
+    # Normal equations for the 8 unknowns with h22 fixed to 1.
+    ata = [[0.0] * 8 for _ in range(8)]
+    atb = [0.0] * 8
+    for (x, y), (u, v) in zip(src, dst):
+        x = (x - src_cx) * src_scale
+        y = (y - src_cy) * src_scale
+        u = (u - dst_cx) * dst_scale
+        v = (v - dst_cy) * dst_scale
+        for row, target in (
+            ((x, y, 1.0, 0.0, 0.0, 0.0, -u * x, -u * y), u),
+            ((0.0, 0.0, 0.0, x, y, 1.0, -v * x, -v * y), v),
+        ):
+            for i in range(8):
+                if row[i]:
+                    atb[i] += row[i] * target
+                    ata_row = ata[i]
+                    for j in range(8):
+                        ata_row[j] += row[i] * row[j]
+
+    solution = _solve(ata, atb)
+    if solution is None:
+        return None
+
+    normalized = solution + [1.0]
+    src_norm = (src_scale, 0.0, -src_scale * src_cx, 0.0, src_scale, -src_scale * src_cy, 0.0, 0.0, 1.0)
+    dst_denorm = (1 / dst_scale, 0.0, dst_cx, 0.0, 1 / dst_scale, dst_cy, 0.0, 0.0, 1.0)
+    matrix = _matmul(dst_denorm, _matmul(normalized, src_norm))
+    if abs(matrix[8]) < 1e-12:
+        return None
+    return tuple(value / matrix[8] for value in matrix)
+
+
+@lru_cache(maxsize=256)
+def _cached_transform(
+    profile: str,
+    width: float,
+    height: float,
+    correspondences: tuple[Correspondence, ...],
+) -> FieldTransform:
+    matrix = fit_homography(correspondences)
+    if matrix is None:
+        return FieldTransform(matrix=_scale_matrix(width, height, profile), calibrated=False)
+    return FieldTransform(matrix=matrix, calibrated=True)
+
+
+register_lru_cache("calibration", _cached_transform)
+
+
+def _correspondences(points: Iterable[CalibrationPoint]) -> tuple[Correspondence, ...]:
+    return tuple((p.image_x, p.image_y, p.field_x, p.field_y) for p in points)
+
+
+def field_transform(config: JobConfig, width: float, height: float) -> FieldTransform:
+    """Image -> field transform for a job config.
+
+    Fits a homography when at least four calibration points are configured and
+    falls back to scaling the frame onto the profile's field dimensions.
+    Results are cached per (profile, frame size, calibration points).
+    """
+    return _cached_transform(
+        config.profile.value,
+        float(width),
+        float(height),
+        _correspondences(config.calibration_points),
+    )
+
+
+def map_series_to_field(config: JobConfig, series: dict) -> dict:
+    """Map every player and ball position of a series into field meters in one pass."""
+    transform = field_transform(config, series["width"], series["height"])
+    return {
+        "calibrated": transform.calibrated,
+        "player_positions": {
+            player_id: transform.map_points(positions)
+            for player_id, positions in series["player_positions"].items()
+        },
+        "ball_positions": transform.map_points(series["ball_positions"]),
+    }
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from .schemas import ArtifactItem
+from .storage import load_json, save_json
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable short hash of JSON-serializable parts."""
+    body = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+
+
+def input_identity(path: Optional[Path]) -> Optional[str]:
+    """Cheap identity for an input file: name, size and mtime."""
+    if path is None or not path.exists():
+        return None
+    stat = path.stat()
+    return f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Checkpoints:
+    """Per-stage completion markers for one job, kept in artifacts/checkpoints.json.
+
+    A marker records the fingerprint of everything the stage read, the
+    artifacts it wrote and the summary keys it set. A stage can be skipped
+    when its fingerprint still matches and every output is on disk with the
+    recorded size.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.stages: dict[str, dict[str, Any]] = load_json(path).get("stages", {}) if path.exists() else {}
+
+    def valid(self, stage: str, stage_fingerprint: str) -> Optional[dict[str, Any]]:
+        entry = self.stages.get(stage)
+        if not entry or entry.get("fingerprint") != stage_fingerprint:
+            return None
+        for item in entry["outputs"]:
+            path = Path(item["path"])
+            if not path.exists():
+                return None
+            if item.get("size_bytes") is not None and path.stat().st_size != item["size_bytes"]:
+                return None
+        return entry
+
+    def outputs(self, entry: dict[str, Any]) -> list[ArtifactItem]:
+        return [ArtifactItem.model_validate(item) for item in entry["outputs"]]
+
+    def record(
+        self,
+        stage: str,
+        stage_fingerprint: str,
+        outputs: list[ArtifactItem],
+        summary: dict[str, Any],
+    ) -> None:
+        self.stages[stage] = {
+            "fingerprint": stage_fingerprint,
+            "outputs": [item.model_dump() for item in outputs],
+            "summary": summary,
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        save_json(self.path, {"stages": self.stages})
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from .checkpoints import fingerprint, input_identity
+from .config import CLIP_WORKERS
+from .schemas import ArtifactItem, JobConfig
+from .storage import ensure_dir, file_size, save_json
+
+
+@dataclass(frozen=True)
+class ClipOptions:
+    enabled: bool = True
+    pre_s: float = 2.0
+    post_s: float = 2.0
+    by_type: bool = False
+    max_clips: int = 50
+
+    @classmethod
+    def from_config(cls, config: JobConfig) -> "ClipOptions":
+        """Read ``clips_enabled``, ``clip_pre_s``, ``clip_post_s``, ``clip_by_type`` and ``clip_max`` thresholds."""
+        thresholds = config.thresholds
+        return cls(
+            enabled=bool(thresholds.get("clips_enabled", 1)),
+            pre_s=max(0.0, float(thresholds.get("clip_pre_s", 2.0))),
+            post_s=max(0.0, float(thresholds.get("clip_post_s", 2.0))),
+            by_type=bool(thresholds.get("clip_by_type", 0)),
+            max_clips=max(1, int(thresholds.get("clip_max", 50))),
+        )
+
+
+@dataclass(frozen=True)
+class ClipPlan:
+    name: str
+    key: str
+    segments: tuple[tuple[float, float], ...]
+    event_ids: tuple[str, ...]
+
+
+def _merge(windows: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    merged: list[list[float]] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _window(event: dict[str, Any], options: ClipOptions) -> tuple[float, float]:
+    start = event["start"]
+    return round(max(0.0, start - options.pre_s), 2), round((event.get("end") or start) + options.post_s, 2)
+
+
+def plan_clips(events: list[dict[str, Any]], options: ClipOptions, source: Optional[str]) -> list[ClipPlan]:
+    """One clip per event (the most confident ``max_clips``), or one reel per event type.
+
+    A clip's key hashes the source identity and its cut points, so an
+    unchanged event maps to the same file across reruns.
+    """
+    timed = [event for event in events if event.get("start") is not None]
+    if not options.by_type:
+        timed = sorted(timed, key=lambda event: event.get("confidence") or 0.0, reverse=True)[: options.max_clips]
+        timed.sort(key=lambda event: event["start"])
+        plans = []
+        for event in timed:
+            segment = _window(event, options)
+            plans.append(ClipPlan(f"clip_{event['id']}", fingerprint(source, [segment]), (segment,), (event["id"],)))
+        return plans
+    by_type: dict[str, list[dict[str, Any]]] = {}
+    for event in timed:
+        by_type.setdefault(event["type"], []).append(event)
+    plans = []
+    for event_type, group in sorted(by_type.items()):
+        segments = tuple(_merge([_window(event, options) for event in group])[: options.max_clips])
+        plans.append(ClipPlan(f"clip_{event_type}", fingerprint(source, segments), segments, tuple(event["id"] for event in group)))
+    return plans
+
+
+def _ffmpeg() -> str:
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg is required for highlight clips")
+    return ffmpeg
+
+
+def _run(command: list[str]) -> None:
+    completed = subprocess.run(command, capture_output=True, timeout=600)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.decode(errors="replace").strip() or f"ffmpeg exited with {completed.returncode}")
+
+
+def _cut(ffmpeg: str, input_path: Path, start: float, end: float, output: Path) -> None:
+    # -ss before -i with stream copy starts at the keyframe at or before ``start``: no re-encode.
+    _run([
+        ffmpeg, "-v", "error", "-y", "-ss", f"{start:.2f}", "-i", str(input_path), "-t", f"{end - start:.2f}",
+        "-map", "0:v:0", "-map", "0:a?", "-c", "copy", "-avoid_negative_ts", "make_zero",
+        "-movflags", "+faststart", "-f", "mp4", str(output),
+    ])
+
+
+def _render(ffmpeg: str, input_path: Path, plan: ClipPlan, output: Path) -> None:
+    """Cut the plan's segments and join them, writing ``output`` atomically."""
+    partial = output.with_suffix(".part")
+    if len(plan.segments) == 1:
+        _cut(ffmpeg, input_path, *plan.segments[0], partial)
+    else:
+        with tempfile.TemporaryDirectory(dir=output.parent) as scratch:
+            parts = []
+            for index, (start, end) in enumerate(plan.segments):
+                part = Path(scratch) / f"{index:04d}.mp4"
+                _cut(ffmpeg, input_path, start, end, part)
+                parts.append(part)
+            listing = Path(scratch) / "segments.txt"
+            listing.write_text("".join(f"file '{part.name}'\n" for part in parts), encoding="utf-8")
+            _run([
+                ffmpeg, "-v", "error", "-y", "-f", "concat", "-safe", "0", "-i", str(listing),
+                "-c", "copy", "-movflags", "+faststart", "-f", "mp4", str(partial),
+            ])
+    os.replace(partial, output)
+
+
+def extract_clips(
+    clips_dir: Path,
+    input_path: Path,
+    events: list[dict[str, Any]],
+    options: ClipOptions,
+) -> tuple[list[ArtifactItem], dict[str, Any]]:
+    """Cut highlight clips for ``events`` from ``input_path`` by stream copy.
+
+    Clips already on disk under the same key are reused, and clips no
+    longer planned are deleted. ffmpeg does the work in child processes, so
+    a thread pool is enough to run CLIP_WORKERS cuts at once. Returns the
+    artifacts, including a clips.json mapping clips to events, and summary
+    counts.
+    """
+    ffmpeg = _ffmpeg()
+    ensure_dir(clips_dir)
+    plans = plan_clips(events, options, input_identity(input_path))
+    outputs = {plan.key: clips_dir / f"{plan.key}.mp4" for plan in plans}
+    # Events with identical windows share one file.
+    pending = list({plan.key: plan for plan in plans if not file_size(outputs[plan.key])}.values())
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(CLIP_WORKERS, len(pending))) as pool:
+            futures = [pool.submit(_render, ffmpeg, input_path, plan, outputs[plan.key]) for plan in pending]
+            for future in futures:
+                future.result()
+
+    keep = {path.name for path in outputs.values()}
+    for stale in clips_dir.glob("*.mp4"):
+        if stale.name not in keep:
+            stale.unlink()
+
+    items = []
+    index = []
+    for plan in plans:
+        path = outputs[plan.key]
+        items.append(ArtifactItem(name=plan.name, kind="export", path=str(path), content_type="video/mp4", size_bytes=file_size(path)))
+        index.append({
+            "name": plan.name,
+            "file": path.name,
+            "events": list(plan.event_ids),
+            "segments": [list(segment) for segment in plan.segments],
+        })
+    index_path = clips_dir / "clips.json"
+    save_json(index_path, {"clips": index})
+    items.append(ArtifactItem(name="clips", kind="export", path=str(index_path), content_type="application/json", size_bytes=file_size(index_path)))
+    return items, {"clips": len(plans), "clips_cut": len(pending)}
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from .config import COLUMNAR_FORMATS
+from .records import TrackTable
+from .schemas import ArtifactItem
+from .storage import file_size
+
+FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+EVENT_COLUMNS = ("id", "type", "start", "end", "frame", "confidence", "explanation")
+# Exporters run concurrently; pyarrow releases the GIL while encoding and compressing.
+MAX_WRITERS = 4
+
+
+def _pyarrow() -> Any:
+    try:
+        import pyarrow as pa
+    except ImportError as exc:
+        raise RuntimeError("pyarrow is required for columnar exports: pip install -r requirements-exports.txt") from exc
+    return pa
+
+
+def columnar_available() -> bool:
+    try:
+        _pyarrow()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _column(pa: Any, values: array, dtype: Any) -> Any:
+    """Zero-copy Arrow view of an array.array with the same item width."""
+    return pa.Array.from_buffers(dtype, len(values), [None, pa.py_buffer(values)])
+
+
+def _track_batches(pa: Any, tracks: TrackTable) -> tuple[Any, Iterator[Any]]:
+    ids = pa.array(tracks.ids.values, pa.string())
+    labels = pa.array(tracks.labels.values, pa.string())
+    teams = pa.array([tracks.team_of.get(value) for value in tracks.ids.values], pa.string())
+    schema = pa.schema([
+        ("frame", pa.uint32()),
+        ("id", pa.dictionary(pa.int32(), pa.string())),
+        ("label", pa.dictionary(pa.int8(), pa.string())),
+        ("team", pa.string()),
+        ("x", pa.float32()),
+        ("y", pa.float32()),
+        ("w", pa.float32()),
+        ("h", pa.float32()),
+        ("confidence", pa.float32()),
+    ])
+
+    def batches() -> Iterator[Any]:
+        for chunk in tracks.chunks:
+            frames = array("I")
+            start = 0
+            for offset, end in enumerate(chunk.ends):
+                frames.extend([chunk.first_frame + offset] * (end - start))
+                start = end
+            track = _column(pa, chunk.track, pa.int32())
+            yield pa.record_batch([
+                _column(pa, frames, pa.uint32()),
+                pa.DictionaryArray.from_arrays(track, ids),
+                pa.DictionaryArray.from_arrays(_column(pa, chunk.label, pa.int8()), labels),
+                teams.take(track),
+                _column(pa, chunk.x, pa.float32()),
+                _column(pa, chunk.y, pa.float32()),
+                _column(pa, chunk.w, pa.float32()),
+                _column(pa, chunk.h, pa.float32()),
+                _column(pa, chunk.confidence, pa.float32()),
+            ], schema=schema)
+
+    return schema, batches()
+
+
+def _series_batches(pa: Any, series: dict[str, Any], field: dict[str, Any]) -> tuple[Any, Iterator[Any]]:
+    """Long format: one row per entity per frame, image and field coordinates side by side."""
+    schema = pa.schema([
+        ("frame", pa.uint32()),
+        ("entity", pa.string()),
+        ("x", pa.float64()),
+        ("y", pa.float64()),
+        ("field_x", pa.float64()),
+        ("field_y", pa.float64()),
+        ("speed_mps", pa.float64()),
+    ])
+    first_frames = series.get("player_first_frame") or {}
+
+    def batch(entity: str, first: int, positions: list, field_positions: list, speeds: Optional[list]) -> Any:
+        count = len(positions)
+        return pa.record_batch([
+            pa.array(range(first, first + count), pa.uint32()),
+            pa.array([entity] * count, pa.string()),
+            pa.array([pos[0] for pos in positions], pa.float64()),
+            pa.array([pos[1] for pos in positions], pa.float64()),
+            pa.array([pos[0] for pos in field_positions], pa.float64()),
+            pa.array([pos[1] for pos in field_positions], pa.float64()),
+            pa.array(speeds if speeds is not None else [None] * count, pa.float64()),
+        ], schema=schema)
+
+    def batches() -> Iterator[Any]:
+        yield batch("ball", 0, series["ball_positions"], field["ball_positions"], None)
+        for player_id, positions in series["player_positions"].items():
+            yield batch(
+                player_id,
+                first_frames.get(player_id, 0),
+                positions,
+                field["player_positions"][player_id],
+                field["player_speeds"].get(player_id),
+            )
+
+    return schema, batches()
+
+
+def _events_table(pa: Any, events: list[dict[str, Any]]) -> Any:
+    rows = [
+        {
+            **{column: event.get(column) for column in EVENT_COLUMNS},
+            "details": json.dumps({k: v for k, v in event.items() if k not in EVENT_COLUMNS}, default=str),
+        }
+        for event in events
+    ]
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("type", pa.string()),
+        ("start", pa.float64()),
+        ("end", pa.float64()),
+        ("frame", pa.int64()),
+        ("confidence", pa.float64()),
+        ("explanation", pa.string()),
+        ("details", pa.string()),
+    ])
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+def _write(pa: Any, path: Path, fmt: str, schema: Any, batches: Iterator[Any]) -> None:
+    """Stream batches to disk so only one batch is materialized at a time."""
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+        return
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _export_all(
+    export_dir: Path,
+    tables: dict[str, Callable[[Any], tuple[Any, Iterator[Any]]]],
+    formats: Optional[list[str]],
+) -> list[ArtifactItem]:
+    pa = _pyarrow()
+    formats = [fmt for fmt in (COLUMNAR_FORMATS if formats is None else formats) if fmt in FORMATS]
+    jobs = []
+    for name, build in tables.items():
+        for fmt in formats:
+            suffix, content_type = FORMATS[fmt]
+            item = ArtifactItem(name=f"{name}_{fmt}", kind="export", path=str(export_dir / f"{name}{suffix}"), content_type=content_type)
+            jobs.append((item, fmt, build))
+
+    def run(job: tuple[ArtifactItem, str, Callable]) -> ArtifactItem:
+        item, fmt, build = job
+        schema, batches = build(pa)
+        _write(pa, Path(item.path), fmt, schema, batches)
+        item.size_bytes = file_size(Path(item.path))
+        return item
+
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_WRITERS, len(jobs))) as pool:
+        return list(pool.map(run, jobs))
+
+
+def export_tracks(
+    export_dir: Path,
+    tracks: TrackTable,
+    series: dict[str, Any],
+    field: dict[str, Any],
+    formats: Optional[list[str]] = None,
+) -> list[ArtifactItem]:
+    """Write per-object tracks and per-frame positions as Parquet and/or Arrow IPC files."""
+    return _export_all(export_dir, {
+        "tracks": lambda pa: _track_batches(pa, tracks),
+        "series": lambda pa: _series_batches(pa, series, field),
+    }, formats)
+
+
+def export_analytics(
+    export_dir: Path,
+    metrics: dict[str, Any],
+    events: list[dict[str, Any]],
+    formats: Optional[list[str]] = None,
+) -> list[ArtifactItem]:
+    """Write per-player metrics and events as Parquet and/or Arrow IPC files."""
+
+    def players(pa: Any) -> tuple[Any, Iterator[Any]]:
+        schema = pa.schema([
+            ("id", pa.string()),
+            ("team", pa.string()),
+            ("distance_m", pa.float64()),
+            ("avg_speed_mps", pa.float64()),
+            ("max_speed_mps", pa.float64()),
+        ])
+        table = pa.Table.from_pylist(metrics["players"], schema=schema)
+        return schema, iter(table.to_batches())
+
+    def event_rows(pa: Any) -> tuple[Any, Iterator[Any]]:
+        table = _events_table(pa, events)
+        return table.schema, iter(table.to_batches())
+
+    return _export_all(export_dir, {"players": players, "events": event_rows}, formats)
@@ -7,6 +7,27 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).resolve().parents[3]
 DATA_DIR = Path(os.getenv("VAP_DATA_DIR", ROOT_DIR / "data"))
 CV_PROVIDER = os.getenv("VAP_CV_PROVIDER", "synthetic")
+# Pace pipeline stages with fixed sleeps so demos show visible progress.
+DEMO_DELAYS = os.getenv("VAP_DEMO_DELAYS", "").lower() in {"1", "true", "yes"}
+# Seconds a pipelined detect stage waits for more upload bytes before giving up.
+UPLOAD_STALL_S = float(os.getenv("VAP_UPLOAD_STALL_S", "300"))
+# Where job, share and upload records live: "memory" (one process) or "sqlite"
+# (DATA_DIR/state.db, shared by every API process on the host).
+STATE_BACKEND = os.getenv("VAP_STATE_BACKEND", "memory").lower()
+# "inline" runs pipelines inside the API process; "queue" only enqueues them for
+# `python -m app.worker` processes (requires the sqlite state backend).
+JOB_EXECUTOR = os.getenv("VAP_JOB_EXECUTOR", "inline").lower()
+# A leased job not heartbeated for this long is handed to another worker.
+QUEUE_VISIBILITY_S = float(os.getenv("VAP_QUEUE_VISIBILITY_S", "60"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("VAP_QUEUE_MAX_ATTEMPTS", "3"))
+# Columnar export formats written when pyarrow is installed: "parquet", "arrow" or both, comma-separated.
+COLUMNAR_FORMATS = [fmt.strip() for fmt in os.getenv("VAP_COLUMNAR_FORMATS", "parquet").lower().split(",") if fmt.strip()]
+# Downsampled track levels (frames per second) written next to tracks.json for overview rendering.
+LOD_FPS = sorted({float(value) for value in os.getenv("VAP_LOD_FPS", "1,5").split(",") if value.strip()})
+# Highlight clips cut at once; each cut is its own ffmpeg process.
+CLIP_WORKERS = max(1, int(os.getenv("VAP_CLIP_WORKERS", str(min(4, os.cpu_count() or 1)))))
+# Optional per-job profiler dump: "cprofile" or "pyinstrument".
+PROFILE_MODE = os.getenv("VAP_PROFILE", "").lower()
 
 DEFAULT_PROFILE = "soccer"
 
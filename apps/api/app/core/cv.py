@@ -1,67 +1,117 @@
 from __future__ import annotations
 
+import json
 import os
+import shutil
+import subprocess
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Callable
 
+from .decode import DecodeOptions, PipeDecoder, VideoInfo, open_decoder
+from .profiling import StageProfiler
+from .records import SparseTrack, TrackTable
+from .reid import UNASSIGNED_ID, ReidOptions, compact_identities, concat_tracks, merge_fragments
 from .schemas import JobConfig
+from .spatial import nearest_owner
+from .teams import classify_teams
+
+# Header bytes handed to ffprobe before pipelined decoding starts.
+STREAM_PROBE_BYTES = 4 * 1024 * 1024
+STREAM_FEED_BYTES = 1024 * 1024
+# Torso colour histograms sampled per track for re-identification.
+APPEARANCE_SAMPLES = 8
+APPEARANCE_STRIDE = 10
+APPEARANCE_BINS = (8, 4)
 
 
 def _assign_team(track_id: int) -> str:
+    """Placeholder until colour clustering runs; kept only for tracks without crops."""
     return "A" if track_id % 2 == 0 else "B"
 
 
-def run_ultralytics(input_path: Path, config: JobConfig) -> tuple[dict[str, Any], dict[str, Any]]:
-    try:
-        import cv2  # type: ignore
-        from ultralytics import YOLO  # type: ignore
-    except Exception as exc:  # pragma: no cover - optional dependency
-        raise RuntimeError("Ultralytics and OpenCV are required for real CV processing") from exc
-
-    model_name = os.getenv("VAP_MODEL", "yolov8n.pt")
-    confidence = float(config.thresholds.get("det_confidence", 0.3))
-
-    cap = cv2.VideoCapture(str(input_path))
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 1280)
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 720)
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-    cap.release()
+def _torso_histogram(frame: Any, x1: float, y1: float, x2: float, y2: float) -> list[float] | None:
+    """Hue/saturation histogram of the shirt region of a person box, L1-normalized."""
+    import cv2  # type: ignore
 
-    model = YOLO(model_name)
-    results = model.track(source=str(input_path), stream=True, persist=True, conf=confidence, verbose=False)
+    height, width = frame.shape[:2]
+    box_w, box_h = x2 - x1, y2 - y1
+    top = max(0, int(y1 + 0.2 * box_h))
+    bottom = min(height, int(y1 + 0.55 * box_h))
+    left = max(0, int(x1 + 0.2 * box_w))
+    right = min(width, int(x2 - 0.2 * box_w))
+    if bottom - top < 2 or right - left < 2:
+        return None
+    hsv = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, list(APPEARANCE_BINS), [0, 180, 0, 256]).flatten()
+    total = float(hist.sum())
+    return (hist / total).tolist() if total else None
 
-    frames = []
-    tracks_map: dict[str, dict[str, Any]] = {}
-    player_positions: dict[str, list[tuple[float, float]]] = {}
-    ball_positions: list[tuple[float, float]] = []
 
-    last_player_positions: dict[str, tuple[float, float]] = {}
-    last_ball: tuple[float, float] | None = None
+class _TrackAccumulator:
+    """Fold per-frame Ultralytics results into tracks and series payloads."""
 
-    frame_idx = 0
-    class_names = model.names
+    def __init__(
+        self,
+        class_names: dict[int, str],
+        width: int,
+        height: int,
+        profiler: StageProfiler | None,
+        box_scale: float = 1.0,
+    ):
+        self.class_names = class_names
+        # Maps boxes from a downscaled decode back to source pixels.
+        self.box_scale = box_scale
+        self.width = width
+        self.height = height
+        self.profiler = profiler
+        self.table = TrackTable({})
+        self.tracks_map: dict[str, dict[str, Any]] = {}
+        self.player_tracks: dict[str, SparseTrack] = {}
+        self.appearance: dict[str, list[float]] = {}
+        self.appearance_samples: dict[str, int] = {}
+        self.untracked = 0
+        self.ball_positions: list[tuple[float, float]] = []
+        self.last_ball: tuple[float, float] | None = None
+        self.frame_idx = 0
 
-    for result in results:
-        objects = []
+    def add(self, result: Any) -> None:
+        frame_idx = self.frame_idx
+        if self.profiler is not None:
+            # Ultralytics reports per-frame milliseconds for each model phase.
+            for phase, millis in (getattr(result, "speed", None) or {}).items():
+                self.profiler.add(f"detect.model_{phase}", (millis or 0.0) / 1000)
+        table = self.table
+        table.start_frame()
         if result.boxes is None:
-            frames.append({"frame": frame_idx, "objects": objects})
-            frame_idx += 1
-            continue
+            self.frame_idx += 1
+            return
 
-        xyxy = result.boxes.xyxy.cpu().tolist()
+        decoded_xyxy = result.boxes.xyxy.cpu().tolist()
+        xyxy = decoded_xyxy
+        if self.box_scale != 1.0:
+            scale = self.box_scale
+            xyxy = [[value * scale for value in box] for box in decoded_xyxy]
+        frame = getattr(result, "orig_img", None)
         confs = result.boxes.conf.cpu().tolist()
         classes = result.boxes.cls.cpu().tolist()
         track_ids = result.boxes.id.cpu().tolist() if result.boxes.id is not None else [None] * len(xyxy)
 
         ball_candidates = []
-        frame_players: dict[str, tuple[float, float]] = {}
+        tracks_map = self.tracks_map
+        player_tracks = self.player_tracks
 
-        for bbox, conf, cls_id, track_id in zip(xyxy, confs, classes, track_ids):
-            label = class_names.get(int(cls_id), "")
+        for bbox, decoded_bbox, conf, cls_id, track_id in zip(xyxy, decoded_xyxy, confs, classes, track_ids):
+            label = self.class_names.get(int(cls_id), "")
             if label == "person":
-                track_num = int(track_id) if track_id is not None else int(conf * 10000) + frame_idx
-                track_key = f"p{track_num}"
+                if track_id is not None:
+                    track_num = int(track_id)
+                    track_key = f"p{track_num}"
+                else:
+                    # Untracked detections become one-frame fragments for re-identification.
+                    self.untracked += 1
+                    track_num = self.untracked
+                    track_key = f"u{track_num}"
                 team = _assign_team(track_num)
                 tracks_map.setdefault(track_key, {"id": track_key, "label": "player", "team": team})
                 x1, y1, x2, y2 = bbox
@@ -69,106 +119,271 @@ def run_ultralytics(input_path: Path, config: JobConfig) -> tuple[dict[str, Any]
                 h = y2 - y1
                 cx = x1 + w / 2
                 cy = y1 + h / 2
-                frame_players[track_key] = (cx, cy)
-                objects.append({
-                    "id": track_key,
-                    "label": "player",
-                    "team": team,
-                    "bbox": [round(x1, 2), round(y1, 2), round(w, 2), round(h, 2)],
-                    "confidence": round(conf, 3),
-                })
+                track = player_tracks.get(track_key)
+                if track is None:
+                    track = player_tracks[track_key] = SparseTrack()
+                if not track.frames or track.last_frame != frame_idx:
+                    track.observe(frame_idx, cx, cy)
+                    self._sample_appearance(track_key, len(track.frames), frame, decoded_bbox)
+                table.add(track_key, "player", team, x1, y1, w, h, conf)
             elif label == "sports ball":
                 x1, y1, x2, y2 = bbox
                 w = x2 - x1
                 h = y2 - y1
                 cx = x1 + w / 2
                 cy = y1 + h / 2
-                ball_candidates.append({
-                    "confidence": conf,
-                    "center": (cx, cy),
-                    "bbox": [round(x1, 2), round(y1, 2), round(w, 2), round(h, 2)],
-                })
+                ball_candidates.append((conf, (cx, cy), (x1, y1, w, h)))
 
         if ball_candidates:
-            best = max(ball_candidates, key=lambda item: item["confidence"])
-            last_ball = best["center"]
-            objects.append({
-                "id": "ball",
-                "label": "ball",
-                "team": None,
-                "bbox": best["bbox"],
-                "confidence": round(best["confidence"], 3),
-            })
-        elif last_ball is not None:
-            cx, cy = last_ball
-            objects.append({
-                "id": "ball",
-                "label": "ball",
-                "team": None,
-                "bbox": [round(cx - 8, 2), round(cy - 8, 2), 16, 16],
-                "confidence": 0.2,
-            })
-
-        frames.append({"frame": frame_idx, "objects": objects})
-
-        for track_key in tracks_map.keys():
-            if track_key not in player_positions:
-                player_positions[track_key] = []
-            if track_key in frame_players:
-                last_player_positions[track_key] = frame_players[track_key]
-            if track_key in last_player_positions:
-                player_positions[track_key].append(last_player_positions[track_key])
-            else:
-                player_positions[track_key].append((0.0, 0.0))
-
-        if last_ball is not None:
-            ball_positions.append(last_ball)
+            conf, center, (x1, y1, w, h) = max(ball_candidates, key=lambda item: item[0])
+            self.last_ball = center
+            table.add("ball", "ball", None, x1, y1, w, h, conf)
+        elif self.last_ball is not None:
+            cx, cy = self.last_ball
+            table.add("ball", "ball", None, cx - 8, cy - 8, 16, 16, 0.2)
+
+        if self.last_ball is not None:
+            self.ball_positions.append(self.last_ball)
         else:
-            ball_positions.append((width / 2, height / 2))
-
-        frame_idx += 1
-
-    if frame_count == 0:
-        frame_count = frame_idx
-
-    owner_by_frame = []
-    last_owner = None
-    for idx in range(frame_count):
-        ball = ball_positions[idx]
-        nearest_id = None
-        nearest_dist = None
-        for player_id, positions in player_positions.items():
-            if idx >= len(positions):
-                continue
-            px, py = positions[idx]
-            dist = (px - ball[0]) ** 2 + (py - ball[1]) ** 2
-            if nearest_dist is None or dist < nearest_dist:
-                nearest_dist = dist
-                nearest_id = player_id
-        if nearest_id is None:
-            nearest_id = last_owner or (list(player_positions.keys())[0] if player_positions else "p1")
-        owner_by_frame.append(nearest_id)
-        last_owner = nearest_id
-
-    tracks_data = {
-        "meta": {
+            self.ball_positions.append((self.width / 2, self.height / 2))
+
+        self.frame_idx += 1
+
+    def _sample_appearance(self, track_key: str, observed: int, frame: Any, bbox: list[float]) -> None:
+        taken = self.appearance_samples.get(track_key, 0)
+        if frame is None or taken >= APPEARANCE_SAMPLES or (observed - 1) % APPEARANCE_STRIDE:
+            return
+        hist = _torso_histogram(frame, *bbox)
+        if hist is None:
+            return
+        total = self.appearance.get(track_key)
+        self.appearance[track_key] = hist if total is None else [a + b for a, b in zip(total, hist)]
+        self.appearance_samples[track_key] = taken + 1
+
+    def _features(self, keys: list[str]) -> list[float] | None:
+        sums = [self.appearance[key] for key in keys if key in self.appearance]
+        if not sums:
+            return None
+        combined = [sum(values) for values in zip(*sums)]
+        total = sum(combined)
+        return [value / total for value in combined] if total else None
+
+    def _merge_fragments(self, config: JobConfig, fps: float) -> dict[str, list[str]]:
+        """Join fragments into compact identities and relabel the track table."""
+        fragments = self.player_tracks
+        options = ReidOptions.from_config(config, fps, self.height)
+        features = {key: self._features([key]) for key in fragments}
+        chains = merge_fragments(fragments, {k: v for k, v in features.items() if v}, fps, options)
+        mapping = compact_identities(fragments, chains, options)
+
+        identities: dict[str, list[str]] = {}
+        for head, chain in chains.items():
+            identity = mapping[head]
+            if identity != UNASSIGNED_ID:
+                identities[identity] = chain
+        self.player_tracks = {identity: concat_tracks([fragments[key] for key in chain]) for identity, chain in identities.items()}
+        self.appearance = {
+            identity: features
+            for identity, chain in identities.items()
+            if (features := self._features(chain)) is not None
+        }
+        team_of = {identity: self.tracks_map[chain[0]]["team"] for identity, chain in identities.items()}
+        self.table.rename_ids(mapping, team_of)
+        self.tracks_map = {
+            identity: {"id": identity, "label": "player", "team": team_of[identity], "fragments": chain}
+            for identity, chain in identities.items()
+        }
+        if UNASSIGNED_ID in mapping.values():
+            self.tracks_map[UNASSIGNED_ID] = {"id": UNASSIGNED_ID, "label": "player", "team": None}
+        return identities
+
+    def finish(self, config: JobConfig, fps: float, frame_count: int) -> tuple[TrackTable, dict[str, Any]]:
+        fragment_count = len(self.player_tracks)
+        reid = None
+        if config.thresholds.get("reid_enabled", 1):
+            section = self.profiler.section("detect.reid") if self.profiler is not None else nullcontext()
+            with section:
+                identities = self._merge_fragments(config, fps)
+            reid = {"fragments": fragment_count, "identities": len(identities)}
+
+        anchors = {key: sum(track.xs) / len(track.xs) for key, track in self.player_tracks.items() if track.frames}
+        for key, team in classify_teams(self.appearance, anchors).items():
+            self.tracks_map[key]["team"] = team
+            self.table.team_of[key] = team
+        teams = {key: self.tracks_map[key]["team"] for key in self.player_tracks}
+
+        # Tracks are materialized only over their active range; frames between
+        # detections are interpolated rather than padded.
+        player_positions = {key: track.dense() for key, track in self.player_tracks.items()}
+        first_frames = {key: track.first_frame for key, track in self.player_tracks.items()}
+        if frame_count == 0:
+            frame_count = self.frame_idx
+
+        owner_by_frame = []
+        last_owner = None
+        for nearest_id, _ in nearest_owner(player_positions, self.ball_positions, first_frames):
+            if nearest_id is None:
+                nearest_id = last_owner or (list(player_positions.keys())[0] if player_positions else "p1")
+            owner_by_frame.append(nearest_id)
+            last_owner = nearest_id
+
+        tracks = self.table
+        tracks.meta = {
             "profile": config.profile.value,
             "fps": fps,
             "frame_count": frame_count,
-            "width": width,
-            "height": height,
-        },
-        "tracks": list(tracks_map.values()),
-        "frames": frames,
-    }
+            "width": self.width,
+            "height": self.height,
+        }
+        if reid is not None:
+            tracks.meta["reid"] = reid
+        tracks.tracks = list(self.tracks_map.values())
+
+        series = {
+            "player_positions": player_positions,
+            "player_first_frame": first_frames,
+            "player_appearance": self.appearance,
+            "teams": teams,
+            "ball_positions": self.ball_positions,
+            "owner_by_frame": owner_by_frame,
+            "fps": fps,
+            "width": self.width,
+            "height": self.height,
+        }
+
+        return tracks, series
+
+
+def _effective_fps(info: VideoInfo, options: DecodeOptions, processed: int) -> float:
+    """Frame rate of the processed sequence, which analytics treat as uniform."""
+    if options.keyframes_only and info.frame_count and processed:
+        return processed / (info.frame_count / info.fps)
+    return info.fps / options.stride
+
 
-    series = {
-        "player_positions": player_positions,
-        "ball_positions": ball_positions,
-        "owner_by_frame": owner_by_frame,
-        "fps": fps,
-        "width": width,
-        "height": height,
+def _finish(
+    accumulator: _TrackAccumulator,
+    config: JobConfig,
+    info: VideoInfo,
+    options: DecodeOptions,
+) -> tuple[TrackTable, dict[str, Any]]:
+    processed = accumulator.frame_idx
+    if options.is_default:
+        return accumulator.finish(config, info.fps, info.frame_count)
+    tracks, series = accumulator.finish(config, round(_effective_fps(info, options, processed), 3), processed)
+    tracks.meta["decode"] = {
+        "stride": options.stride,
+        "scale": options.scale,
+        "keyframes_only": options.keyframes_only,
+        "source_fps": info.fps,
+        "source_frame_count": info.frame_count,
     }
+    return tracks, series
+
+
+def run_ultralytics(
+    input_path: Path,
+    config: JobConfig,
+    profiler: StageProfiler | None = None,
+) -> tuple[TrackTable, dict[str, Any]]:
+    """Detect and track on a local file.
+
+    Frames come from one shared decoder that reuses its buffers; the
+    ``decode_stride``, ``decode_scale`` and ``decode_keyframes`` thresholds
+    trade temporal or spatial resolution for throughput.
+    """
+    try:
+        from ultralytics import YOLO  # type: ignore
+    except Exception as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("Ultralytics and OpenCV are required for real CV processing") from exc
+
+    model_name = os.getenv("VAP_MODEL", "yolov8n.pt")
+    confidence = float(config.thresholds.get("det_confidence", 0.3))
+    options = DecodeOptions.from_config(config)
+
+    with open_decoder(input_path, options) as decoder:
+        info = decoder.info
+        model = YOLO(model_name)
+        accumulator = _TrackAccumulator(
+            model.names, info.width, info.height, profiler, box_scale=info.width / decoder.output_size[0]
+        )
+        for _, frame in decoder.frames():
+            accumulator.add(model.track(frame, persist=True, conf=confidence, verbose=False)[0])
+    return _finish(accumulator, config, info, options)
+
+
+def _read_head(reader: BinaryIO, limit: int) -> bytes:
+    chunks = []
+    remaining = limit
+    while remaining > 0:
+        chunk = reader.read(min(remaining, STREAM_FEED_BYTES))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _probe_stream(ffprobe: str, head: bytes) -> VideoInfo:
+    completed = subprocess.run(
+        [
+            ffprobe, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height,avg_frame_rate,nb_frames", "-of", "json", "pipe:0",
+        ],
+        input=head,
+        capture_output=True,
+        timeout=60,
+    )
+    streams = json.loads(completed.stdout or b"{}").get("streams") or []
+    if not streams or not streams[0].get("width"):
+        detail = completed.stderr.decode(errors="replace").strip()
+        raise RuntimeError(f"input is not streamable; wait for the full upload ({detail or 'no video stream in header'})")
+    stream = streams[0]
+    num, _, den = str(stream.get("avg_frame_rate", "0/0")).partition("/")
+    fps = float(num) / float(den) if den and float(den) else 0.0
+    frame_count = int(stream["nb_frames"]) if str(stream.get("nb_frames", "")).isdigit() else 0
+    return VideoInfo(fps=fps or 25, width=int(stream["width"]), height=int(stream["height"]), frame_count=frame_count)
+
+
+def run_ultralytics_stream(
+    open_reader: Callable[[], BinaryIO],
+    config: JobConfig,
+    profiler: StageProfiler | None = None,
+) -> tuple[TrackTable, dict[str, Any]]:
+    """Detect and track on a growing input, decoding through an ffmpeg pipe.
+
+    ``open_reader`` returns a blocking reader over the bytes received so far,
+    so inference starts on the first GOPs while the rest is still uploading.
+    Containers that need their index first (MP4 without faststart) fail the
+    header probe with RuntimeError and the caller falls back to the file path.
+    """
+    try:
+        from ultralytics import YOLO  # type: ignore
+    except Exception as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("Ultralytics is required for pipelined CV processing") from exc
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        raise RuntimeError("ffmpeg and ffprobe are required for pipelined CV processing")
+
+    with open_reader() as reader:
+        head = _read_head(reader, STREAM_PROBE_BYTES)
+    info = _probe_stream(ffprobe, head)
+
+    model_name = os.getenv("VAP_MODEL", "yolov8n.pt")
+    confidence = float(config.thresholds.get("det_confidence", 0.3))
+    options = DecodeOptions.from_config(config)
+    model = YOLO(model_name)
+
+    with PipeDecoder(None, info, options, feed=open_reader) as decoder:
+        accumulator = _TrackAccumulator(
+            model.names, info.width, info.height, profiler, box_scale=info.width / decoder.output_size[0]
+        )
+        for _, frame in decoder.frames():
+            accumulator.add(model.track(frame, persist=True, conf=confidence, verbose=False)[0])
 
-    return tracks_data, series
+    if accumulator.frame_idx == 0:
+        raise RuntimeError(f"no frames decoded from streamed input ({decoder.error or 'empty stream'})")
+    if options.is_default:
+        # Frame count is only known once the stream ends.
+        info = VideoInfo(info.fps, info.width, info.height, accumulator.frame_idx)
+    return _finish(accumulator, config, info, options)
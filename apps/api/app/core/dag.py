@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from .checkpoints import Checkpoints, fingerprint
+from .profiling import StageProfiler
+from .schemas import ArtifactItem, JobRecord
+from .uploads import UploadSource
+
+
+class Resource(str, Enum):
+    cpu = "cpu"
+    io = "io"
+    inference = "inference"
+
+
+# Stages of one class that may run at once within a job. Pure-Python CPU work
+# (analytics, JSON encoding) shares the GIL, and overlapping it in threads is
+# slower than running it back to back, so CPU stages only overlap with IO
+# waits and with inference, which releases the GIL.
+DEFAULT_LIMITS = {Resource.cpu: 1, Resource.io: 4, Resource.inference: 1}
+
+
+@dataclass
+class StageContext:
+    job: JobRecord
+    input_path: Optional[Path]
+    upload: Optional[UploadSource]
+    artifacts_path: Path
+    profiler: StageProfiler
+    values: dict[str, Any] = field(default_factory=dict)
+    artifacts: dict[str, list[ArtifactItem]] = field(default_factory=dict)
+    order: list[str] = field(default_factory=list)
+    resumed: list[str] = field(default_factory=list)
+    # Values read by stages that run rather than resume, so restores can skip the rest.
+    needed: set[str] = field(default_factory=set)
+
+    def collected(self) -> list[ArtifactItem]:
+        """Artifacts of finished stages, in graph order rather than completion order."""
+        return [item for name in self.order for item in self.artifacts.get(name, [])]
+
+
+@dataclass
+class StageOutput:
+    values: dict[str, Any] = field(default_factory=dict)
+    artifacts: list[ArtifactItem] = field(default_factory=list)
+    # Merged into job.summary on the event loop; stages never touch the job directly from threads.
+    summary: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One node of the pipeline graph.
+
+    ``run`` takes the StageContext and returns a StageOutput. Coroutine
+    functions run on the event loop, plain functions in a worker thread.
+    ``inputs`` and ``outputs`` name entries of ``StageContext.values``; a
+    stage starts once every producer of its inputs has finished. A ``final``
+    stage waits for every other stage.
+
+    With ``fingerprint`` set the stage is checkpointed: its fingerprint hashes
+    the returned config parts with the fingerprints of its upstream stages,
+    and a matching marker skips the stage. ``restore`` then rebuilds the
+    values listed in ``restores`` from the stage's files; outputs it cannot
+    rebuild force a rerun when a downstream stage needs them, and a rerun
+    invalidates every stage downstream of it. A restore that also reads the
+    files of later stages names them in ``restores_from`` and only holds while
+    their checkpoints do.
+    """
+
+    name: str
+    run: Callable[[StageContext], Any]
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    resource: Resource = Resource.cpu
+    weight: float = 1.0
+    fingerprint: Optional[Callable[[StageContext], Any]] = None
+    restore: Optional[Callable[[StageContext], dict[str, Any]]] = None
+    restores: tuple[str, ...] = ()
+    restores_from: tuple[str, ...] = ()
+    final: bool = False
+
+
+class StageGraph:
+    def __init__(self, stages: list[Stage], limits: Optional[dict[Resource, int]] = None):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.stages: dict[str, Stage] = {}
+        self.producers: dict[str, str] = {}
+        for stage in stages:
+            self.add(stage)
+
+    def add(self, stage: Stage) -> None:
+        if stage.name in self.stages:
+            raise ValueError(f"duplicate stage: {stage.name}")
+        for output in stage.outputs:
+            if output in self.producers:
+                raise ValueError(f"{output} is produced by both {self.producers[output]} and {stage.name}")
+            self.producers[output] = stage.name
+        self.stages[stage.name] = stage
+
+    def dependencies(self, stage: Stage) -> set[str]:
+        if stage.final:
+            return {name for name, other in self.stages.items() if not other.final}
+        missing = [name for name in stage.inputs if name not in self.producers]
+        if missing:
+            raise ValueError(f"stage {stage.name} needs {', '.join(missing)}, which no stage produces")
+        return {self.producers[name] for name in stage.inputs}
+
+    def order(self) -> list[str]:
+        """Topological order, keeping registration order among independent stages."""
+        deps = {name: self.dependencies(stage) for name, stage in self.stages.items()}
+        ordered: list[str] = []
+        placed: set[str] = set()
+        while len(ordered) < len(deps):
+            ready = [name for name in deps if name not in placed and deps[name] <= placed]
+            if not ready:
+                raise ValueError("stage graph has a cycle")
+            ordered.extend(ready)
+            placed.update(ready)
+        return ordered
+
+    def _fingerprint(self, stage: Stage, ctx: StageContext, upstream: dict[str, str]) -> str:
+        parents = sorted(upstream.get(name, "") for name in self.dependencies(stage))
+        # Stages without checkpoints still pass their parents' fingerprints downstream.
+        parts = stage.fingerprint(ctx) if stage.fingerprint else None
+        return fingerprint(stage.name, parts, parents)
+
+    def plan(self, ctx: StageContext, checkpoints: Checkpoints) -> dict[str, dict[str, Any]]:
+        """Checkpoint entries for the stages that can be skipped."""
+        order = self.order()
+        upstream: dict[str, str] = {}
+        valid: dict[str, dict[str, Any]] = {}
+        clean: set[str] = set()
+        for name in order:
+            stage = self.stages[name]
+            upstream[name] = self._fingerprint(stage, ctx, upstream)
+            # A stage can only be skipped if everything upstream is unchanged.
+            if not self.dependencies(stage) <= clean:
+                continue
+            if stage.fingerprint is None:
+                clean.add(name)
+                continue
+            entry = checkpoints.valid(name, upstream[name])
+            if entry is not None:
+                valid[name] = entry
+                clean.add(name)
+        # A stage that runs needs its inputs in memory: rerun producers that cannot restore them.
+        changed = True
+        while changed:
+            changed = False
+            for name in reversed(order):
+                stage = self.stages[name]
+                if name in valid:
+                    continue
+                for key in stage.inputs:
+                    producer = self.producers[key]
+                    if producer in valid and key not in self._restorable(producer, valid):
+                        self._evict(producer, valid, order)
+                        changed = True
+        return valid
+
+    def _restorable(self, name: str, valid: dict[str, dict[str, Any]]) -> tuple[str, ...]:
+        stage = self.stages[name]
+        return stage.restores if all(other in valid for other in stage.restores_from) else ()
+
+    def _evict(self, name: str, valid: dict[str, dict[str, Any]], order: list[str]) -> None:
+        """Drop a stage from the skip plan along with everything downstream of it.
+
+        Restored descendants would otherwise mix the previous run's outputs
+        with the rerun's.
+        """
+        evicted = {name}
+        for other in order:
+            if other in valid and self.dependencies(self.stages[other]) & evicted:
+                evicted.add(other)
+        for other in evicted:
+            valid.pop(other, None)
+
+    async def run(
+        self,
+        ctx: StageContext,
+        checkpoints: Checkpoints,
+        on_progress: Optional[Callable[[list[str], float], Awaitable[None]]] = None,
+        before_stage: Optional[Callable[[Stage], Awaitable[None]]] = None,
+    ) -> None:
+        ctx.order = self.order()
+        skip = self.plan(ctx, checkpoints)
+        ctx.needed = {key for name, stage in self.stages.items() if name not in skip for key in stage.inputs}
+        total = sum(stage.weight for stage in self.stages.values()) or 1.0
+        semaphores = {resource: asyncio.Semaphore(limit) for resource, limit in self.limits.items()}
+        fingerprints: dict[str, str] = {}
+        done: set[str] = set()
+        running: dict[asyncio.Task, Stage] = {}
+        finished_weight = 0.0
+
+        async def report() -> None:
+            if on_progress:
+                await on_progress([stage.name for stage in running.values()], round(finished_weight / total, 3))
+
+        async def execute(stage: Stage) -> StageOutput:
+            async with semaphores[stage.resource]:
+                if before_stage:
+                    await before_stage(stage)
+                if inspect.iscoroutinefunction(stage.run):
+                    with ctx.profiler.stage(stage.name):
+                        return await stage.run(ctx) or StageOutput()
+
+                def call() -> StageOutput:
+                    with ctx.profiler.stage(stage.name):
+                        return stage.run(ctx) or StageOutput()
+
+                return await asyncio.to_thread(call)
+
+        def finish(stage: Stage, output: StageOutput, entry: Optional[dict[str, Any]] = None) -> None:
+            ctx.values.update(output.values)
+            ctx.job.summary.update(output.summary)
+            ctx.artifacts[stage.name] = output.artifacts
+            if entry is not None:
+                fingerprints[stage.name] = entry["fingerprint"]
+                return
+            # Fingerprint after the run: inputs such as a pipelined upload are only final now.
+            fingerprints[stage.name] = self._fingerprint(stage, ctx, fingerprints)
+            if stage.fingerprint is not None:
+                checkpoints.record(stage.name, fingerprints[stage.name], output.artifacts, output.summary)
+
+        try:
+            while len(done) < len(self.stages):
+                for name in ctx.order:
+                    stage = self.stages[name]
+                    if name in done or stage in running.values() or not self.dependencies(stage) <= done:
+                        continue
+                    entry = skip.get(name)
+                    if entry is not None:
+                        values = stage.restore(ctx) if stage.restore else {}
+                        finish(stage, StageOutput(values or {}, checkpoints.outputs(entry), entry["summary"]), entry)
+                        ctx.resumed.append(name)
+                        done.add(name)
+                        finished_weight += stage.weight
+                        continue
+                    running[asyncio.create_task(execute(stage))] = stage
+                if len(done) == len(self.stages):
+                    break
+                await report()
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    stage = running.pop(task)
+                    finish(stage, task.result())
+                    done.add(stage.name)
+                    finished_weight += stage.weight
+        finally:
+            for task in running:
+                task.cancel()
+        await report()
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator
+
+from .schemas import JobConfig
+
+# Frames handed out are views into a small ring of buffers. Two is enough for
+# consumers that finish with a frame before asking for the next one.
+DEFAULT_RING = 2
+FEED_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class DecodeOptions:
+    stride: int = 1
+    scale: float = 1.0
+    keyframes_only: bool = False
+
+    @classmethod
+    def from_config(cls, config: JobConfig) -> "DecodeOptions":
+        """Read ``decode_stride``, ``decode_scale`` and ``decode_keyframes`` thresholds."""
+        thresholds = config.thresholds
+        return cls(
+            stride=max(1, int(thresholds.get("decode_stride", 1))),
+            scale=min(1.0, max(0.05, float(thresholds.get("decode_scale", 1.0)))),
+            keyframes_only=bool(thresholds.get("decode_keyframes", 0)),
+        )
+
+    @property
+    def is_default(self) -> bool:
+        return self.stride == 1 and self.scale == 1.0 and not self.keyframes_only
+
+
+@dataclass(frozen=True)
+class VideoInfo:
+    fps: float
+    width: int
+    height: int
+    frame_count: int
+
+
+def _output_size(width: int, height: int, scale: float) -> tuple[int, int]:
+    if scale >= 1.0:
+        return width, height
+    # Even dimensions keep ffmpeg's scaler and most models happy.
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def _require_numpy() -> Any:
+    try:
+        import numpy as np  # type: ignore
+    except Exception as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("NumPy is required for frame decoding") from exc
+    return np
+
+
+class FrameDecoder:
+    """One OpenCV capture per video, decoding into reused buffers.
+
+    Skipped frames on a stride are only grabbed, never converted to BGR, and
+    downscaling writes into a preallocated output buffer.
+    """
+
+    def __init__(self, path: Path, options: DecodeOptions = DecodeOptions(), ring: int = DEFAULT_RING):
+        try:
+            import cv2  # type: ignore
+        except Exception as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("OpenCV is required for frame decoding") from exc
+        self._cv2 = cv2
+        self._np = _require_numpy()
+        self.options = options
+        self.ring = max(1, ring)
+        self._cap = cv2.VideoCapture(str(path))
+        if not self._cap.isOpened():
+            raise RuntimeError(f"could not open video: {path}")
+        self.info = VideoInfo(
+            fps=self._cap.get(cv2.CAP_PROP_FPS) or 25,
+            width=int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 1280),
+            height=int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 720),
+            frame_count=int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0),
+        )
+        self.output_size = _output_size(self.info.width, self.info.height, options.scale)
+
+    def frames(self) -> Iterator[tuple[int, Any]]:
+        """Yield ``(source_frame_index, frame)``; a frame is valid until ``ring`` more are read."""
+        cv2, np, cap = self._cv2, self._np, self._cap
+        width, height = self.info.width, self.info.height
+        out_w, out_h = self.output_size
+        scaled = (out_w, out_h) != (width, height)
+        decoded = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(1 if scaled else self.ring)]
+        outputs = [np.empty((out_h, out_w, 3), dtype=np.uint8) for _ in range(self.ring)] if scaled else decoded
+        stride = self.options.stride
+        index = -1
+        slot = 0
+        while True:
+            if not cap.grab():
+                return
+            index += 1
+            if index % stride:
+                continue
+            target = decoded[0] if scaled else decoded[slot]
+            ok, frame = cap.retrieve(target)
+            if not ok:
+                return
+            if frame is not target and frame.shape == target.shape:
+                # Some backends ignore the destination; keep the ring stable anyway.
+                np.copyto(target, frame)
+                frame = target
+            if scaled:
+                frame = cv2.resize(frame, (out_w, out_h), dst=outputs[slot], interpolation=cv2.INTER_AREA)
+            yield index, frame
+            slot = (slot + 1) % self.ring
+
+    def close(self) -> None:
+        self._cap.release()
+
+    def __enter__(self) -> "FrameDecoder":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class PipeDecoder:
+    """Decode through an ffmpeg subprocess into reused raw buffers.
+
+    Used for keyframe-only decoding (``-skip_frame nokey``) and for inputs fed
+    over stdin while they are still arriving. Frames are NumPy views over the
+    bytes ffmpeg wrote, so nothing is copied after the pipe read.
+    """
+
+    def __init__(
+        self,
+        source: Path | None,
+        info: VideoInfo,
+        options: DecodeOptions = DecodeOptions(),
+        feed: Callable[[], BinaryIO] | None = None,
+        ring: int = DEFAULT_RING,
+    ):
+        self._np = _require_numpy()
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise RuntimeError("ffmpeg is required for pipe decoding")
+        if source is None and feed is None:
+            raise ValueError("PipeDecoder needs a source path or a feed")
+        self.info = info
+        self.options = options
+        self.ring = max(1, ring)
+        self.output_size = _output_size(info.width, info.height, options.scale)
+        self._feed = feed
+        self._feed_error: list[BaseException] = []
+        self._stderr: list[bytes] = []
+
+        command = [ffmpeg, "-v", "error"]
+        if options.keyframes_only:
+            command += ["-skip_frame", "nokey"]
+        command += ["-i", "pipe:0" if source is None else str(source)]
+        filters = []
+        if options.stride > 1:
+            filters.append(f"select=not(mod(n\\,{options.stride}))")
+        if self.output_size != (info.width, info.height):
+            filters.append(f"scale={self.output_size[0]}:{self.output_size[1]}:flags=area")
+        if filters:
+            command += ["-vf", ",".join(filters)]
+        command += ["-fps_mode", "passthrough", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if feed is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._threads = []
+        if feed is not None:
+            self._threads.append(threading.Thread(target=self._pump, name="vap-decode-feed", daemon=True))
+        # ffmpeg -v error writes little, but drain stderr so it can never block the decoder.
+        self._threads.append(threading.Thread(target=lambda: self._stderr.append(self._process.stderr.read()), daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _pump(self) -> None:
+        stdin = self._process.stdin
+        try:
+            with self._feed() as reader:
+                shutil.copyfileobj(reader, stdin, FEED_BYTES)
+        except BrokenPipeError:
+            pass
+        except BaseException as exc:  # surfaced by close()
+            self._feed_error.append(exc)
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def frames(self) -> Iterator[tuple[int, Any]]:
+        """Yield ``(decoded_index, frame)``; a frame is valid until ``ring`` more are read."""
+        np = self._np
+        out_w, out_h = self.output_size
+        frame_bytes = out_w * out_h * 3
+        buffers = [bytearray(frame_bytes) for _ in range(self.ring)]
+        views = [np.frombuffer(buffer, dtype=np.uint8).reshape(out_h, out_w, 3) for buffer in buffers]
+        stdout = self._process.stdout
+        index = 0
+        slot = 0
+        while True:
+            view = memoryview(buffers[slot])
+            filled = 0
+            while filled < frame_bytes:
+                count = stdout.readinto(view[filled:])
+                if not count:
+                    return
+                filled += count
+            yield index, views[slot]
+            index += 1
+            slot = (slot + 1) % self.ring
+
+    @property
+    def error(self) -> str:
+        return b"".join(self._stderr).decode(errors="replace").strip()
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        # On a clean EOF the feeder closed stdin first. If decoding stopped early it may
+        # still be waiting for input; its next write fails and it exits on its own.
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        if self._feed_error:
+            error = self._feed_error[0]
+            raise RuntimeError(f"decoder feed failed: {error}") from error
+
+    def __enter__(self) -> "PipeDecoder":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def open_decoder(path: Path, options: DecodeOptions) -> FrameDecoder | PipeDecoder:
+    """Pick the decoder for ``options``: OpenCV unless keyframes need ffmpeg."""
+    decoder = FrameDecoder(path, options)
+    if not options.keyframes_only:
+        return decoder
+    info = decoder.info
+    decoder.close()
+    return PipeDecoder(path, info, options)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from array import array
+from itertools import chain
+from pathlib import Path
+from typing import Any
+
+from .calibration import map_series_to_field
+from .schemas import JobConfig
+from .spatial import nearest_owner
+from .storage import load_json, save_json
+
+FIELD_SERIES_VERSION = 2
+
+
+def _series_digest(series: dict[str, Any]) -> str:
+    """Digest of the positions a field series is built from, as packed doubles (cheaper than JSON)."""
+    digest = hashlib.sha1()
+    first_frames = series.get("player_first_frame") or {}
+    for player_id in sorted(series["player_positions"]):
+        digest.update(f"{player_id}:{first_frames.get(player_id, 0)}".encode("utf-8"))
+        digest.update(array("d", chain.from_iterable(series["player_positions"][player_id])).tobytes())
+    digest.update(b"ball")
+    digest.update(array("d", chain.from_iterable(series["ball_positions"])).tobytes())
+    return digest.hexdigest()
+
+
+def field_fingerprint(config: JobConfig, series: dict[str, Any]) -> str:
+    payload = {
+        "version": FIELD_SERIES_VERSION,
+        "profile": config.profile.value,
+        "width": series["width"],
+        "height": series["height"],
+        "fps": series["fps"],
+        "frames": len(series["ball_positions"]),
+        "calibration": [point.model_dump() for point in config.calibration_points],
+        # New detections, a different reid merge or seed change the positions, not the shape.
+        "series": _series_digest(series),
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _kinematics(positions: list[tuple[float, float]], fps: float) -> tuple[list[list[float]], list[float]]:
+    velocities: list[list[float]] = []
+    speeds: list[float] = []
+    last = None
+    for x, y in positions:
+        if last is None:
+            velocities.append([0.0, 0.0])
+            speeds.append(0.0)
+        else:
+            dx = x - last[0]
+            dy = y - last[1]
+            velocities.append([dx * fps, dy * fps])
+            speeds.append(math.hypot(dx, dy) * fps)
+        last = (x, y)
+    return velocities, speeds
+
+
+def build_field_series(config: JobConfig, series: dict[str, Any]) -> dict[str, Any]:
+    """Project a detection series into field meters with per-frame kinematics.
+
+    Player lists start at ``player_first_frame[id]`` (0 when absent, as in
+    series written before tracks were sparse). The first entry of every player
+    has zero velocity and speed; analytics that need frame-to-frame motion
+    read from index 1 onwards.
+    """
+    fps = series["fps"]
+    mapped = map_series_to_field(config, series)
+    player_positions = mapped["player_positions"]
+    ball_positions = mapped["ball_positions"]
+
+    player_velocities: dict[str, list[list[float]]] = {}
+    player_speeds: dict[str, list[float]] = {}
+    for player_id, positions in player_positions.items():
+        player_velocities[player_id], player_speeds[player_id] = _kinematics(positions, fps)
+
+    first_frames = dict(series.get("player_first_frame") or {})
+    nearest = nearest_owner(player_positions, ball_positions, first_frames)
+
+    return {
+        "version": FIELD_SERIES_VERSION,
+        "fingerprint": field_fingerprint(config, series),
+        "calibrated": mapped["calibrated"],
+        "fps": fps,
+        "player_positions": player_positions,
+        "player_first_frame": first_frames,
+        "player_velocities": player_velocities,
+        "player_speeds": player_speeds,
+        "ball_positions": ball_positions,
+        "nearest_player": [player_id for player_id, _ in nearest],
+        "nearest_player_distance": [distance for _, distance in nearest],
+    }
+
+
+def load_field_series(path: Path, config: JobConfig, series: dict[str, Any]) -> tuple[dict[str, Any], bool]:
+    """Return the persisted field series if it still matches, rebuilding it otherwise.
+
+    The flag is True when the series was (re)built and written to ``path``.
+    """
+    if path.exists():
+        cached = load_json(path)
+        if cached.get("fingerprint") == field_fingerprint(config, series):
+            return cached, False
+    field = build_field_series(config, series)
+    save_json(path, field)
+    return field, True
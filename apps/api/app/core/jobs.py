@@ -1,35 +1,126 @@
 from __future__ import annotations
 
 import asyncio
+import os
+import socket
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
 from uuid import uuid4
 
+from .config import QUEUE_VISIBILITY_S
 from .pipeline import run_pipeline
+from .queue import JobQueue
 from .schemas import JobConfig, JobRecord, JobStatus
+from .state import SqliteState
 from .storage import job_file, load_json, save_json
+from .telemetry import JOB_OUTCOMES, SSE_DROPPED
+from .uploads import UploadSource, UploadStore
+
+
+# How often a process tails the shared event log, and how often it prunes it.
+EVENT_POLL_S = 0.1
+EVENT_PRUNE_S = 60.0
 
 
 class JobStore:
-    def __init__(self, data_dir: Path):
+    """Job records, live-update fan-out and in-process pipeline tasks.
+
+    Without ``state`` everything lives in this process. With a shared
+    SqliteState, records are read from and written to SQLite, updates are
+    published to its event log, and ``follow_events`` delivers every
+    process's updates to local SSE subscribers. ``jobs`` then only holds the
+    live records of pipelines running here.
+
+    With a ``queue``, ``start_job`` only enqueues and worker processes
+    (``python -m app.worker``) run the pipelines. With shared state but no
+    queue, each process claims the jobs it runs in the state database and
+    ``watch_claims`` keeps those claims alive, so another process can tell
+    a running job from one whose process died.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        state: Optional[SqliteState] = None,
+        queue: Optional[JobQueue] = None,
+        claim_ttl_s: float = QUEUE_VISIBILITY_S,
+    ):
         self.data_dir = data_dir
+        self.state = state
+        self.queue = queue
+        self.claim_ttl_s = claim_ttl_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
         self.jobs: dict[str, JobRecord] = {}
         self.lock = asyncio.Lock()
         self.subscriber_lock = asyncio.Lock()
         self.subscribers: set[asyncio.Queue] = set()
         self.job_subscribers: dict[str, set[asyncio.Queue]] = {}
-        self.worker_tasks: list[asyncio.Task] = []
+        self.worker_tasks: set[asyncio.Task] = set()
 
     async def load_from_disk(self) -> None:
         jobs_root = self.data_dir / "jobs"
         if not jobs_root.exists():
             return
-        for job_path in jobs_root.glob("*/job.json"):
-            payload = load_json(job_path)
-            record = JobRecord.model_validate(payload)
+        records = [JobRecord.model_validate(load_json(job_path)) for job_path in jobs_root.glob("*/job.json")]
+        if self.state is not None:
+            self.state.import_records(
+                "job",
+                ((job.id, job.model_dump(mode="json"), job.status.value, job.created_at.isoformat()) for job in records),
+            )
+            return
+        for record in records:
             self.jobs[record.id] = record
 
+    @property
+    def claims_jobs(self) -> bool:
+        """Whether this process claims the jobs it runs (shared state, inline executor)."""
+        return self.state is not None and self.queue is None
+
+    async def resume_interrupted(self, uploads: Optional[UploadStore] = None) -> list[str]:
+        """Restart jobs a previous process left in ``processing``.
+
+        Stage checkpoints let them skip whatever finished before the crash. A
+        pipelined upload that was still arriving is waited on again, so the
+        client can resume it. With shared state only jobs nobody holds a live
+        claim on are restarted, after claiming them here; with the queue
+        executor, workers re-lease interrupted jobs instead.
+        """
+        if self.queue is not None:
+            return []
+        if self.state is None:
+            jobs = [job for job in self.jobs.values() if job.status == JobStatus.processing]
+        else:
+            jobs = []
+            for job_id in await asyncio.to_thread(self.state.unclaimed, "job", JobStatus.processing.value):
+                if await asyncio.to_thread(self.state.claim, "job", job_id, self.owner, self.claim_ttl_s):
+                    jobs.append(await self.get_job(job_id))
+        resumed = []
+        for job in jobs:
+            upload = None
+            upload_info = job.summary.get("upload")
+            if upload_info and uploads is not None:
+                session = await uploads.get(upload_info["id"])
+                if session and not session.completed:
+                    upload = UploadSource(uploads, session.id)
+            self.start_job(job.id, Path(job.input.path) if job.input else None, upload)
+            resumed.append(job.id)
+        return resumed
+
+    async def watch_claims(self, uploads: Optional[UploadStore] = None) -> None:
+        """Renew this process's job claims and adopt jobs whose claims lapsed, until cancelled.
+
+        A process that restarts within the claim TTL still sees its old
+        claims as live, so its interrupted jobs are picked up here once they
+        expire rather than at startup.
+        """
+        if not self.claims_jobs:
+            return
+        while True:
+            await asyncio.sleep(self.claim_ttl_s / 3)
+            await asyncio.to_thread(self.state.renew_claims, self.owner, self.claim_ttl_s)
+            await self.resume_interrupted(uploads)
+
     async def save_job(self, job: JobRecord) -> None:
         save_json(job_file(job.id), job.model_dump())
 
@@ -44,48 +135,158 @@ class JobStore:
             stage="queued",
             config=config,
         )
-        self.jobs[job.id] = job
+        if self.state is None:
+            self.jobs[job.id] = job
         await self.update_job(job)
         return job
 
-    def start_job(self, job_id: str, input_path: Optional[Path]) -> None:
-        asyncio.create_task(self.run_job(job_id, input_path))
+    def start_job(self, job_id: str, input_path: Optional[Path], upload: Optional[UploadSource] = None) -> None:
+        if self.queue is not None:
+            self.queue.enqueue(job_id, {
+                "input_path": str(input_path) if input_path else None,
+                "upload_id": upload.upload_id if upload else None,
+            })
+            return
+        task = asyncio.create_task(self.run_job(job_id, input_path, upload))
+        self.worker_tasks.add(task)
+        task.add_done_callback(self.worker_tasks.discard)
 
     async def update_job(self, job: JobRecord) -> None:
+        if self.state is not None:
+            payload = job.model_dump(mode="json")
+            async with self.lock:
+                await self.save_job(job)
+                await asyncio.to_thread(
+                    self.state.put, "job", job.id, payload, job.status.value, job.created_at.isoformat(), "job"
+                )
+            return
         async with self.lock:
             self.jobs[job.id] = job
             await self.save_job(job)
-            async with self.subscriber_lock:
-                subscribers = list(self.subscribers)
-                job_subscribers = list(self.job_subscribers.get(job.id, set()))
-        payload = job.model_dump(mode="json")
+        await self._fan_out(job.id, job.model_dump(mode="json"))
+
+    async def _fan_out(self, job_id: str, payload: dict) -> None:
+        async with self.subscriber_lock:
+            subscribers = list(self.subscribers)
+            job_subscribers = list(self.job_subscribers.get(job_id, set()))
         for queue in subscribers + job_subscribers:
+            # A slow subscriber gets the newest update, never a stale one.
             try:
                 queue.put_nowait(payload)
-            except asyncio.QueueFull:
                 continue
+            except asyncio.QueueFull:
+                pass
+            try:
+                queue.get_nowait()
+                SSE_DROPPED.inc()
+            except asyncio.QueueEmpty:
+                pass
+            queue.put_nowait(payload)
+
+    async def follow_events(self, interval: float = EVENT_POLL_S) -> None:
+        """Deliver updates published by any process to local subscribers until cancelled."""
+        state = self.state
+        if state is None:
+            return
+        last = await asyncio.to_thread(state.last_event)
+        pruned_at = asyncio.get_running_loop().time()
+        while True:
+            events = await asyncio.to_thread(state.events_since, last)
+            # Subscriber queues hold one update; only the newest per job in a batch matters.
+            latest: dict[str, dict] = {}
+            for seq, topic, key, payload in events:
+                last = seq
+                if topic == "job" and key:
+                    latest[key] = payload
+            for key, payload in latest.items():
+                await self._fan_out(key, payload)
+            if asyncio.get_running_loop().time() - pruned_at > EVENT_PRUNE_S:
+                await asyncio.to_thread(state.prune_events)
+                pruned_at = asyncio.get_running_loop().time()
+            if not events:
+                await asyncio.sleep(interval)
 
-    async def run_job(self, job_id: str, input_path: Optional[Path]) -> None:
-        job = self.jobs[job_id]
+    async def run_job(self, job_id: str, input_path: Optional[Path], upload: Optional[UploadSource] = None) -> None:
+        if self.claims_jobs and not await asyncio.to_thread(self.state.claim, "job", job_id, self.owner, self.claim_ttl_s):
+            return
+        try:
+            await self.process_job(job_id, input_path, upload)
+        except Exception as exc:
+            await self.fail_job(job_id, str(exc))
+        finally:
+            if self.claims_jobs:
+                await asyncio.to_thread(self.state.release, "job", job_id, self.owner)
+
+    async def process_job(self, job_id: str, input_path: Optional[Path], upload: Optional[UploadSource] = None) -> None:
+        """Run the pipeline for a job; pipeline errors propagate to the caller."""
+        job = await self.get_job(job_id)
+        # The running process owns the live record until the pipeline finishes.
+        self.jobs[job_id] = job
         job.status = JobStatus.processing
+        job.error = None
         job.updated_at = datetime.now(timezone.utc)
         await self.update_job(job)
         try:
-            manifest = await run_pipeline(job, input_path, on_update=self.update_job)
+            manifest = await run_pipeline(job, input_path, on_update=self.update_job, upload=upload)
             job.manifest = manifest
             job.updated_at = datetime.now(timezone.utc)
             await self.update_job(job)
-        except Exception as exc:
+            JOB_OUTCOMES.inc(status=JobStatus.completed.value)
+        finally:
+            if self.state is not None:
+                self.jobs.pop(job_id, None)
+
+    async def fail_job(self, job_id: str, error: str, retrying: bool = False) -> None:
+        """Mark a job failed, or back to queued when a worker will retry it."""
+        job = await self.get_job(job_id)
+        job.error = error
+        job.updated_at = datetime.now(timezone.utc)
+        if retrying:
+            job.status = JobStatus.queued
+            job.stage = "retry"
+        else:
             job.status = JobStatus.failed
-            job.error = str(exc)
-            job.updated_at = datetime.now(timezone.utc)
-            await self.update_job(job)
+            JOB_OUTCOMES.inc(status=JobStatus.failed.value)
+        await self.update_job(job)
+
+    def _status_counts(self) -> dict[JobStatus, int]:
+        counts = {status: 0 for status in JobStatus}
+        if self.state is not None:
+            for status, count in self.state.status_counts("job").items():
+                counts[JobStatus(status)] += count
+            return counts
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def status_counts(self) -> list[tuple[dict[str, str], int]]:
+        return [({"status": status.value}, count) for status, count in self._status_counts().items()]
+
+    def queue_depth(self) -> int:
+        return self._status_counts()[JobStatus.queued]
+
+    def subscriber_counts(self) -> list[tuple[dict[str, str], int]]:
+        per_job = sum(len(queues) for queues in self.job_subscribers.values())
+        return [({"scope": "all"}, len(self.subscribers)), ({"scope": "job"}, per_job)]
+
+    def owns(self, job_id: str) -> bool:
+        """Whether this process holds the authoritative copy of the job right now."""
+        return self.state is None or job_id in self.jobs
 
     async def list_jobs(self) -> list[JobRecord]:
+        if self.state is not None:
+            payloads = await asyncio.to_thread(self.state.list, "job")
+            return [self.jobs.get(payload["id"]) or JobRecord.model_validate(payload) for payload in payloads]
         return sorted(self.jobs.values(), key=lambda item: item.created_at, reverse=True)
 
     async def get_job(self, job_id: str) -> JobRecord:
-        return self.jobs[job_id]
+        """Return the job or raise KeyError."""
+        if self.state is None or job_id in self.jobs:
+            return self.jobs[job_id]
+        payload = await asyncio.to_thread(self.state.get, "job", job_id)
+        if payload is None:
+            raise KeyError(job_id)
+        return JobRecord.model_validate(payload)
 
     async def subscribe_all(self) -> asyncio.Queue:
         queue: asyncio.Queue = asyncio.Queue(maxsize=1)
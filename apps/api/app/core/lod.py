@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Optional
+
+from .config import LOD_FPS
+from .records import TrackTable, iter_track_frames, read_track_header, write_frames_json
+from .schemas import ArtifactItem
+from .storage import ensure_dir, file_size, load_json, save_json
+
+# Most frames a tracks response should carry; the finest level under it wins.
+MAX_FRAMES = 1500
+ENVELOPE_S = 1.0
+ENVELOPE_COLUMNS = ("t", "min_x", "max_x", "min_y", "max_y", "samples")
+
+
+def lod_steps(fps: float, levels: list[float]) -> list[tuple[float, int]]:
+    """(level fps, frame step) for each level coarser than the native rate."""
+    steps: dict[int, float] = {}
+    for level in levels:
+        step = max(1, round(fps / level)) if level > 0 else 1
+        if step > 1:
+            steps[step] = fps / step
+    return sorted(((level, step) for step, level in steps.items()), key=lambda item: item[1], reverse=True)
+
+
+def _envelopes(tracks: TrackTable, bucket_frames: int) -> list[dict[str, Any]]:
+    """Per track and time bucket, the min/max of box centers and the number of samples."""
+    boxes: dict[int, dict[int, list[float]]] = {}
+    first_label: dict[int, int] = {}
+    for chunk in tracks.chunks:
+        track, label = chunk.track.tolist(), chunk.label.tolist()
+        xs, ys, ws, hs = chunk.x.tolist(), chunk.y.tolist(), chunk.w.tolist(), chunk.h.tolist()
+        start = 0
+        for offset, end in enumerate(chunk.ends):
+            bucket = (chunk.first_frame + offset) // bucket_frames
+            for row in range(start, end):
+                code = track[row]
+                cx = xs[row] + ws[row] / 2
+                cy = ys[row] + hs[row] / 2
+                per_track = boxes.get(code)
+                if per_track is None:
+                    per_track = boxes[code] = {}
+                    first_label[code] = label[row]
+                box = per_track.get(bucket)
+                if box is None:
+                    per_track[bucket] = [cx, cx, cy, cy, 1]
+                    continue
+                if cx < box[0]:
+                    box[0] = cx
+                elif cx > box[1]:
+                    box[1] = cx
+                if cy < box[2]:
+                    box[2] = cy
+                elif cy > box[3]:
+                    box[3] = cy
+                box[4] += 1
+            start = end
+    seconds = bucket_frames / float(tracks.meta.get("fps") or 25.0)
+    return [
+        {
+            "id": tracks.ids.values[code],
+            "label": tracks.labels.values[first_label[code]],
+            "team": tracks.team_of.get(tracks.ids.values[code]),
+            "buckets": [
+                [round(bucket * seconds, 3), *(round(value, 2) for value in box[:4]), box[4]]
+                for bucket, box in sorted(per_track.items())
+            ],
+        }
+        for code, per_track in sorted(boxes.items())
+    ]
+
+
+def write_lod(artifacts_path: Path, tracks: TrackTable, levels: Optional[list[float]] = None) -> list[ArtifactItem]:
+    """Write downsampled copies of tracks.json plus per-second envelopes under artifacts/lod/.
+
+    Levels keep the native frame numbers and the tracks.json shape, so the
+    same readers and index seeking work on every level.
+    """
+    lod_dir = ensure_dir(artifacts_path / "lod")
+    fps = float(tracks.meta.get("fps") or 25.0)
+    items = []
+    index: dict[str, Any] = {"fps": fps, "levels": [], "envelope": None}
+    for level, step in lod_steps(fps, LOD_FPS if levels is None else levels):
+        name = f"tracks_{step}"
+        path = lod_dir / f"{name}.json"
+        meta = {**tracks.meta, "lod": {"fps": round(level, 3), "step": step}}
+        write_frames_json(path, meta, tracks.tracks, tracks.iter_frames(step))
+        index["levels"].append({"fps": round(level, 3), "step": step, "file": path.name})
+        items.append(ArtifactItem(name=f"tracks_lod_{step}", kind="artifact", path=str(path), content_type="application/json", size_bytes=file_size(path)))
+
+    bucket_frames = max(1, round(fps * ENVELOPE_S))
+    envelope_path = lod_dir / "envelope.json"
+    save_json(envelope_path, {
+        "meta": {**tracks.meta, "lod": {"bucket_s": bucket_frames / fps, "bucket_frames": bucket_frames}},
+        "columns": list(ENVELOPE_COLUMNS),
+        "tracks": _envelopes(tracks, bucket_frames),
+    })
+    index["envelope"] = {"bucket_s": bucket_frames / fps, "file": envelope_path.name}
+    items.append(ArtifactItem(name="tracks_envelope", kind="artifact", path=str(envelope_path), content_type="application/json", size_bytes=file_size(envelope_path)))
+
+    index_path = lod_dir / "index.json"
+    save_json(index_path, index)
+    items.append(ArtifactItem(name="tracks_lod", kind="artifact", path=str(index_path), content_type="application/json", size_bytes=file_size(index_path)))
+    return items
+
+
+def choose_level(index: dict[str, Any], span_s: float, max_frames: int = MAX_FRAMES) -> Optional[dict[str, Any]]:
+    """Finest level whose frames over ``span_s`` fit in ``max_frames``; None means native tracks.json.
+
+    Falls back to the coarsest level when even that is over budget.
+    """
+    levels = sorted(index.get("levels", []), key=lambda level: level["fps"], reverse=True)
+    if span_s * index.get("fps", 25.0) <= max_frames or not levels:
+        return None
+    for level in levels:
+        if span_s * level["fps"] <= max_frames:
+            return level
+    return levels[-1]
+
+
+def tracks_window(
+    artifacts_path: Path,
+    start_s: float = 0.0,
+    end_s: Optional[float] = None,
+    lod: str = "auto",
+    max_frames: int = MAX_FRAMES,
+) -> dict[str, Any]:
+    """The tracks.json shape for a time window, read from the level ``lod`` selects.
+
+    ``lod`` is "auto" (pick from the window length), "full", "envelope" or a
+    level's fps. Raises FileNotFoundError when the tracks are missing and
+    ValueError for an unknown level.
+    """
+    tracks_path = artifacts_path / "tracks.json"
+    if not tracks_path.exists():
+        raise FileNotFoundError(tracks_path)
+    header = read_track_header(tracks_path)
+    meta = header["meta"]
+    fps = float(meta.get("fps") or 25.0)
+    if end_s is None:
+        end_s = float(meta.get("frame_count") or 0) / fps
+    index_path = artifacts_path / "lod" / "index.json"
+    # Jobs processed before LOD levels existed only have the native tracks.
+    index = load_json(index_path) if index_path.exists() else {"fps": fps, "levels": [], "envelope": None}
+
+    if lod == "envelope":
+        if not index.get("envelope"):
+            raise FileNotFoundError(index_path)
+        envelope = load_json(index_path.parent / index["envelope"]["file"])
+        envelope["tracks"] = [
+            {**track, "buckets": [row for row in track["buckets"] if start_s <= row[0] <= end_s]}
+            for track in envelope["tracks"]
+        ]
+        return envelope
+
+    if lod == "auto":
+        level = choose_level(index, max(0.0, end_s - start_s), max_frames)
+    elif lod == "full":
+        level = None
+    else:
+        try:
+            wanted = float(lod)
+        except ValueError:
+            raise ValueError(f"unknown lod: {lod}") from None
+        level = next((item for item in index["levels"] if abs(item["fps"] - wanted) < 1e-6), None)
+        if level is None and abs(wanted - fps) > 1e-6:
+            raise ValueError(f"unknown lod: {lod}; available: {', '.join(str(item['fps']) for item in index['levels'])}")
+
+    path = tracks_path if level is None else index_path.parent / level["file"]
+    lod_meta = {"fps": fps, "step": 1} if level is None else {"fps": level["fps"], "step": level["step"]}
+    start_frame = max(0, int(start_s * fps))
+    end_frame = int(end_s * fps)
+    return {
+        "meta": {**meta, "lod": {**lod_meta, "start_s": start_s, "end_s": end_s}},
+        "tracks": header["tracks"],
+        "frames": list(iter_track_frames(path, start_frame, end_frame)),
+    }
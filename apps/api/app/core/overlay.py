@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import queue
+import shutil
+import subprocess
+import threading
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from .decode import DecodeOptions, FrameDecoder
+from .records import iter_track_frames
+from .schemas import JobConfig
+
+# Frames in flight between decode -> draw and draw -> encode. Decoded buffers
+# are drawn on in place and handed to the encoder, so the decoder's ring must
+# outlive both queues plus the frame each thread holds.
+QUEUE_FRAMES = 8
+# BGR, matching the studio's VideoOverlay colours.
+COLORS = {"A": (240, 201, 76), "B": (6, 140, 244), "ball": (133, 37, 247)}
+OTHER_COLOR = (200, 200, 200)
+ZONE_COLOR = (80, 220, 120)
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class OverlayOptions:
+    enabled: bool = False
+    scale: float = 0.5
+    stride: int = 1
+    trail: int = 30
+
+    @classmethod
+    def from_config(cls, config: JobConfig) -> "OverlayOptions":
+        """Read ``overlay_enabled``, ``overlay_scale``, ``overlay_stride`` and ``overlay_trail`` thresholds."""
+        thresholds = config.thresholds
+        return cls(
+            enabled=bool(thresholds.get("overlay_enabled", 0)),
+            scale=min(1.0, max(0.1, float(thresholds.get("overlay_scale", 0.5)))),
+            stride=max(1, int(thresholds.get("overlay_stride", 1))),
+            trail=max(0, int(thresholds.get("overlay_trail", 30))),
+        )
+
+
+class _FfmpegWriter:
+    """H.264 through an ffmpeg pipe, so the MP4 plays in browsers."""
+
+    def __init__(self, ffmpeg: str, path: Path, fps: float, size: tuple[int, int]):
+        self._process = subprocess.Popen(
+            [
+                ffmpeg, "-v", "error", "-y", "-f", "rawvideo", "-pix_fmt", "bgr24",
+                "-s", f"{size[0]}x{size[1]}", "-r", f"{fps:.3f}", "-i", "pipe:0",
+                "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+                "-movflags", "+faststart", str(path),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        self._stderr: list[bytes] = []
+        self._drain = threading.Thread(target=lambda: self._stderr.append(self._process.stderr.read()), daemon=True)
+        self._drain.start()
+
+    def write(self, frame: Any) -> None:
+        self._process.stdin.write(memoryview(frame).cast("B"))
+
+    def close(self) -> None:
+        self._process.stdin.close()
+        code = self._process.wait()
+        self._drain.join(timeout=1.0)
+        if code != 0:
+            raise RuntimeError(b"".join(self._stderr).decode(errors="replace").strip() or f"ffmpeg exited with {code}")
+
+
+class _Cv2Writer:
+    """MPEG-4 Part 2 through OpenCV when ffmpeg is not installed."""
+
+    def __init__(self, cv2: Any, path: Path, fps: float, size: tuple[int, int]):
+        self._writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        if not self._writer.isOpened():
+            raise RuntimeError(f"could not open video writer for {path}")
+
+    def write(self, frame: Any) -> None:
+        self._writer.write(frame)
+
+    def close(self) -> None:
+        self._writer.release()
+
+
+def _open_writer(cv2: Any, path: Path, fps: float, size: tuple[int, int]) -> _FfmpegWriter | _Cv2Writer:
+    ffmpeg = shutil.which("ffmpeg")
+    return _FfmpegWriter(ffmpeg, path, fps, size) if ffmpeg else _Cv2Writer(cv2, path, fps, size)
+
+
+class _Painter:
+    """Draws one job's tracks onto decoded frames, in frame order."""
+
+    def __init__(self, cv2: Any, np: Any, tracks_path: Path, config: JobConfig, source_size: tuple[int, int], output_size: tuple[int, int], trail: int):
+        self._cv2 = cv2
+        self._np = np
+        self._frames = iter_track_frames(tracks_path)
+        self._pending: Optional[dict[str, Any]] = None
+        self._sx = output_size[0] / source_size[0]
+        self._sy = output_size[1] / source_size[1]
+        self._overrides = config.team_overrides
+        self._trail: deque[tuple[int, int]] = deque(maxlen=max(1, trail))
+        self._show_trail = trail > 0
+        self._zones = [
+            np.array([[int(x * self._sx), int(y * self._sy)] for x, y, *_ in zone.polygon], dtype=np.int32)
+            for zone in config.zones
+            if len(zone.polygon) >= 3
+        ]
+
+    def _objects_at(self, index: int) -> list[dict[str, Any]]:
+        """Objects of frame ``index``; frames skipped on a stride still feed the ball trail."""
+        frame = self._pending
+        while frame is None or frame["frame"] < index:
+            if frame is not None:
+                self._note_ball(frame)
+            frame = next(self._frames, None)
+            if frame is None:
+                self._pending = None
+                return []
+        self._pending = frame
+        if frame["frame"] != index:
+            return []
+        self._note_ball(frame)
+        self._pending = None
+        return frame["objects"]
+
+    def _note_ball(self, frame: dict[str, Any]) -> None:
+        for obj in frame["objects"]:
+            if obj["label"] == "ball":
+                x, y, w, h = obj["bbox"]
+                self._trail.append((int((x + w / 2) * self._sx), int((y + h / 2) * self._sy)))
+                return
+
+    def draw(self, index: int, image: Any) -> None:
+        cv2 = self._cv2
+        objects = self._objects_at(index)
+        if self._zones:
+            cv2.polylines(image, self._zones, True, ZONE_COLOR, 2, cv2.LINE_AA)
+        if self._show_trail and len(self._trail) > 1:
+            points = self._np.array(self._trail, dtype=self._np.int32)
+            cv2.polylines(image, [points], False, COLORS["ball"], 2, cv2.LINE_AA)
+        for obj in objects:
+            x, y, w, h = obj["bbox"]
+            if obj["label"] == "ball":
+                color = COLORS["ball"]
+            else:
+                team = self._overrides.get(obj["id"], obj.get("team"))
+                color = COLORS.get(team or "", OTHER_COLOR)
+            top_left = (int(x * self._sx), int(y * self._sy))
+            bottom_right = (int((x + w) * self._sx), int((y + h) * self._sy))
+            cv2.rectangle(image, top_left, bottom_right, color, 2 if obj["label"] == "ball" else 3)
+            if obj["label"] != "ball":
+                cv2.putText(image, obj["id"], (top_left[0] + 2, top_left[1] - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1, cv2.LINE_AA)
+
+
+def _stage(
+    name: str,
+    work: Callable[[Any], Any],
+    source: queue.Queue,
+    sink: Optional[queue.Queue],
+    stop: threading.Event,
+    errors: list[BaseException],
+) -> threading.Thread:
+    """A pipeline thread: take from ``source``, apply ``work``, pass the result on."""
+
+    def run() -> None:
+        try:
+            while not stop.is_set():
+                item = _get(source, stop)
+                if item is _DONE:
+                    break
+                result = work(item)
+                if sink is not None:
+                    _put(sink, result, stop)
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            if sink is not None:
+                _put(sink, _DONE, stop)
+
+    return threading.Thread(target=run, name=f"overlay-{name}", daemon=True)
+
+
+def _put(target: queue.Queue, item: Any, stop: threading.Event) -> None:
+    # After a failure every consumer exits on its own, so nothing needs delivering.
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(source: queue.Queue, stop: threading.Event) -> Any:
+    while True:
+        try:
+            return source.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return _DONE
+
+
+def render_overlay(
+    input_path: Path,
+    tracks_path: Path,
+    output_path: Path,
+    config: JobConfig,
+    options: OverlayOptions,
+    queue_frames: int = QUEUE_FRAMES,
+) -> dict[str, Any]:
+    """Render boxes, IDs, ball trail and zones onto the input video as an MP4.
+
+    Decode, draw and encode run in their own threads joined by bounded
+    queues, so the three overlap and memory stays at a fixed number of
+    frames. OpenCV decode and drawing and the encoder all release the GIL.
+    """
+    try:
+        import cv2  # type: ignore
+        import numpy as np  # type: ignore
+    except Exception as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("OpenCV and NumPy are required for overlay rendering") from exc
+
+    decoder = FrameDecoder(input_path, DecodeOptions(stride=options.stride, scale=options.scale), ring=2 * queue_frames + 3)
+    info = decoder.info
+    painter = _Painter(cv2, np, tracks_path, config, (info.width, info.height), decoder.output_size, options.trail)
+    partial = output_path.with_suffix(".part.mp4")
+    writer = _open_writer(cv2, partial, info.fps / options.stride, decoder.output_size)
+
+    decoded: queue.Queue = queue.Queue(maxsize=queue_frames)
+    drawn: queue.Queue = queue.Queue(maxsize=queue_frames)
+    stop = threading.Event()
+    errors: list[BaseException] = []
+    written = 0
+
+    def draw(item: tuple[int, Any]) -> Any:
+        index, image = item
+        painter.draw(index, image)
+        return image
+
+    def encode(image: Any) -> None:
+        nonlocal written
+        writer.write(image)
+        written += 1
+
+    threads = [
+        _stage("draw", draw, decoded, drawn, stop, errors),
+        _stage("encode", encode, drawn, None, stop, errors),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        frames: Iterator[tuple[int, Any]] = decoder.frames()
+        for item in frames:
+            if stop.is_set():
+                break
+            _put(decoded, item, stop)
+    except BaseException as exc:
+        errors.append(exc)
+        stop.set()
+    finally:
+        _put(decoded, _DONE, stop)
+        for thread in threads:
+            thread.join()
+        decoder.close()
+        try:
+            writer.close()
+        except RuntimeError as exc:
+            errors.append(exc)
+    if errors:
+        partial.unlink(missing_ok=True)
+        raise RuntimeError(f"overlay rendering failed: {errors[0]}") from errors[0]
+    partial.replace(output_path)
+    return {"overlay_frames": written, "overlay_size": list(decoder.output_size)}
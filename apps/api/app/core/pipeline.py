@@ -2,144 +2,63 @@ from __future__ import annotations
 
 import asyncio
 import csv
-import math
-import random
+import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Awaitable, Callable
 
-from .config import CV_PROVIDER, DEFAULT_PROFILE, FIELD_DIMENSIONS
-from .cv import run_ultralytics
-from .schemas import ArtifactItem, ArtifactManifest, JobConfig, JobRecord, JobStatus
-from .storage import artifacts_dir, exports_dir, file_size, save_json
+from .analytics import open_index
+from .calibration import field_dims
+from .checkpoints import Checkpoints, input_identity
+from .clips import ClipOptions, extract_clips
+from .columnar import columnar_available, export_analytics, export_tracks
+from .config import COLUMNAR_FORMATS, CV_PROVIDER, DEMO_DELAYS, LOD_FPS, PROFILE_MODE
+from .cv import run_ultralytics, run_ultralytics_stream
+from .dag import Resource, Stage, StageContext, StageGraph, StageOutput
+from .field import build_field_series, load_field_series
+from .lod import write_lod
+from .overlay import OverlayOptions, render_overlay
+from .profiling import ProfileDump, StageProfiler
+from .records import TrackTable, read_track_table
+from .schemas import ArtifactItem, ArtifactManifest, JobConfig, JobRecord, JobStatus, SportProfile
+from .spatial import radius_counts
+from .storage import artifacts_dir, clips_dir, exports_dir, file_size, load_json, save_json
+from .synthetic import SyntheticSpec, generate_synthetic
+from .telemetry import STAGE_LATENCY, record_cache
+from .uploads import UploadSource
+from .zones import analyze_zones
 
 
 def _clamp(value: float, lower: float, upper: float) -> float:
     return max(lower, min(value, upper))
 
 
-def _field_dims(profile: str) -> tuple[float, float]:
-    dims = FIELD_DIMENSIONS.get(profile, FIELD_DIMENSIONS[DEFAULT_PROFILE])
-    return dims["length"], dims["width"]
+def _generate_tracks(
+    config: JobConfig,
+    seed: int,
+    frame_count: int | None = None,
+    player_count: int | None = None,
+) -> tuple[TrackTable, dict[str, Any]]:
+    spec = SyntheticSpec.from_config(config, seed, frame_count=frame_count, player_count=player_count)
+    return generate_synthetic(spec)
 
 
-def _map_to_field(x: float, y: float, width: float, height: float, profile: str) -> tuple[float, float]:
-    length, field_width = _field_dims(profile)
-    return (x / width) * length, (y / height) * field_width
-
-
-def _generate_tracks(config: JobConfig, seed: int) -> tuple[dict[str, Any], dict[str, Any]]:
-    rng = random.Random(seed)
-    profile = config.profile.value
-    width = 1280
-    height = 720
-    fps = 25
-    frame_count = 250
-    player_count = 20 if profile == "soccer" else 10
-    player_size = (32, 64) if profile == "soccer" else (36, 72)
-
-    players = []
-    for idx in range(player_count):
-        team = "A" if idx < player_count / 2 else "B"
-        x = rng.uniform(200, width - 200)
-        y = rng.uniform(100, height - 100)
-        vx = rng.uniform(-2.5, 2.5)
-        vy = rng.uniform(-2.0, 2.0)
-        players.append({
-            "id": f"p{idx + 1}",
-            "team": team,
-            "x": x,
-            "y": y,
-            "vx": vx,
-            "vy": vy,
-        })
-
-    ball_owner = rng.choice(players)["id"]
-    possession_timer = 0
-
-    frames = []
-    positions_by_player: dict[str, list[tuple[float, float]]] = {p["id"]: [] for p in players}
-    ball_positions: list[tuple[float, float]] = []
-    owner_by_frame: list[str] = []
-
-    for frame in range(frame_count):
-        objects = []
-        for player in players:
-            player["x"] += player["vx"] + rng.uniform(-0.6, 0.6)
-            player["y"] += player["vy"] + rng.uniform(-0.5, 0.5)
-            player["x"] = _clamp(player["x"], 60, width - 60)
-            player["y"] = _clamp(player["y"], 60, height - 60)
-
-            bbox_w, bbox_h = player_size
-            bbox = [
-                round(player["x"] - bbox_w / 2, 2),
-                round(player["y"] - bbox_h / 2, 2),
-                bbox_w,
-                bbox_h,
-            ]
-            objects.append({
-                "id": player["id"],
-                "label": "player",
-                "team": player["team"],
-                "bbox": bbox,
-                "confidence": round(rng.uniform(0.82, 0.98), 3),
-            })
-            positions_by_player[player["id"]].append((player["x"], player["y"]))
-
-        possession_timer += 1
-        if possession_timer > rng.randint(20, 45):
-            ball_owner = rng.choice(players)["id"]
-            possession_timer = 0
-
-        owner_by_frame.append(ball_owner)
-        owner = next(p for p in players if p["id"] == ball_owner)
-        ball_x = owner["x"] + rng.uniform(-18, 18)
-        ball_y = owner["y"] + rng.uniform(-18, 18)
-        ball_positions.append((ball_x, ball_y))
-        objects.append({
-            "id": "ball",
-            "label": "ball",
-            "team": None,
-            "bbox": [round(ball_x - 8, 2), round(ball_y - 8, 2), 16, 16],
-            "confidence": round(rng.uniform(0.7, 0.95), 3),
-        })
-
-        frames.append({"frame": frame, "objects": objects})
-
-    tracks_data = {
-        "meta": {
-            "profile": profile,
-            "fps": fps,
-            "frame_count": frame_count,
-            "width": width,
-            "height": height,
-        },
-        "tracks": [
-            {"id": p["id"], "label": "player", "team": p["team"]} for p in players
-        ],
-        "frames": frames,
-    }
-
-    series = {
-        "player_positions": positions_by_player,
-        "ball_positions": ball_positions,
-        "owner_by_frame": owner_by_frame,
-        "fps": fps,
-        "width": width,
-        "height": height,
-    }
-
-    return tracks_data, series
-
-
-def _compute_metrics(config: JobConfig, series: dict[str, Any]) -> dict[str, Any]:
+def _compute_metrics(
+    config: JobConfig,
+    series: dict[str, Any],
+    field: dict[str, Any] | None = None,
+    zone_report: dict[str, Any] | None = None,
+) -> dict[str, Any]:
     profile = config.profile.value
     fps = series["fps"]
-    width = series["width"]
-    height = series["height"]
     player_positions: dict[str, list[tuple[float, float]]] = series["player_positions"]
     ball_positions: list[tuple[float, float]] = series["ball_positions"]
     owner_by_frame: list[str] = series["owner_by_frame"]
+    if field is None:
+        field = build_field_series(config, series)
+    field_players: dict[str, list[tuple[float, float]]] = field["player_positions"]
+    field_speeds: dict[str, list[float]] = field["player_speeds"]
+    field_ball: list[tuple[float, float]] = field["ball_positions"]
 
     def _default_team(player_id: str) -> str:
         if player_id.startswith("p"):
@@ -149,10 +68,16 @@ def _compute_metrics(config: JobConfig, series: dict[str, Any]) -> dict[str, Any
                 return "A"
         return "A"
 
+    # Per-track teams from classification (or the generator), computed once at detection time.
+    classified: dict[str, str] = series.get("teams") or {}
+
     def _resolve_team(player_id: str) -> str:
         override = config.team_overrides.get(player_id)
         if override in {"A", "B"}:
             return override
+        team = classified.get(player_id)
+        if team in {"A", "B"}:
+            return team
         return _default_team(player_id)
 
     team_possession_frames = {"A": 0, "B": 0}
@@ -165,27 +90,17 @@ def _compute_metrics(config: JobConfig, series: dict[str, Any]) -> dict[str, Any
         team: round(count / frame_count, 3) for team, count in team_possession_frames.items()
     }
 
-    length, field_width = _field_dims(profile)
+    length, field_width = field_dims(profile)
 
     player_metrics = []
     heatmap_grid = {"A": [[0 for _ in range(10)] for _ in range(6)], "B": [[0 for _ in range(10)] for _ in range(6)]}
     player_heatmaps: dict[str, list[list[int]]] = {}
 
-    for player_id, positions in player_positions.items():
-        total_distance = 0.0
-        speeds = []
+    for player_id, positions in field_players.items():
+        speeds = field_speeds[player_id][1:]
+        total_distance = sum(speeds) / fps
         heatmap = [[0 for _ in range(10)] for _ in range(6)]
-        last_field_pos = None
-        for (x, y) in positions:
-            field_x, field_y = _map_to_field(x, y, width, height, profile)
-            if last_field_pos is not None:
-                dx = field_x - last_field_pos[0]
-                dy = field_y - last_field_pos[1]
-                dist = math.hypot(dx, dy)
-                total_distance += dist
-                speeds.append(dist * fps)
-            last_field_pos = (field_x, field_y)
-
+        for (field_x, field_y) in positions:
             cell_x = int(_clamp((field_x / length) * 10, 0, 9))
             cell_y = int(_clamp((field_y / field_width) * 6, 0, 5))
             heatmap[cell_y][cell_x] += 1
@@ -210,15 +125,16 @@ def _compute_metrics(config: JobConfig, series: dict[str, Any]) -> dict[str, Any
             "frame": idx,
             "image_x": round(pos[0], 2),
             "image_y": round(pos[1], 2),
-            "field_x": round(_map_to_field(pos[0], pos[1], width, height, profile)[0], 2),
-            "field_y": round(_map_to_field(pos[0], pos[1], width, height, profile)[1], 2),
+            "field_x": round(field_pos[0], 2),
+            "field_y": round(field_pos[1], 2),
         }
-        for idx, pos in enumerate(ball_positions)
+        for idx, (pos, field_pos) in enumerate(zip(ball_positions, field_ball))
     ]
 
     metrics = {
         "summary": {
             "player_count": len(player_positions),
+            "calibrated": field["calibrated"],
             "team_possession": team_possession,
             "avg_speed_mps": round(sum(p["avg_speed_mps"] for p in player_metrics) / len(player_metrics), 2),
         },
@@ -230,17 +146,27 @@ def _compute_metrics(config: JobConfig, series: dict[str, Any]) -> dict[str, Any
         "ball_trajectory": ball_path,
     }
 
+    if config.zones:
+        if zone_report is None:
+            zone_report = _zone_report(config, series)
+        metrics["zones"] = zone_report["summary"]
+
     return metrics
 
 
-def _compute_events(config: JobConfig, series: dict[str, Any]) -> list[dict[str, Any]]:
+def _compute_events(
+    config: JobConfig,
+    series: dict[str, Any],
+    field: dict[str, Any] | None = None,
+    zone_report: dict[str, Any] | None = None,
+) -> list[dict[str, Any]]:
     profile = config.profile.value
     fps = series["fps"]
-    width = series["width"]
-    height = series["height"]
     ball_positions: list[tuple[float, float]] = series["ball_positions"]
     owner_by_frame: list[str] = series["owner_by_frame"]
     player_positions: dict[str, list[tuple[float, float]]] = series["player_positions"]
+    if field is None:
+        field = build_field_series(config, series)
 
     events = []
 
@@ -254,22 +180,6 @@ def _compute_events(config: JobConfig, series: dict[str, Any]) -> list[dict[str,
     crowding_min_frames = int(config.thresholds.get("crowding_min_frames", 5))
     zone_entry_min_frames = int(config.thresholds.get("zone_entry_min_frames", 4))
 
-    def _point_in_polygon(x: float, y: float, polygon: list[list[float]]) -> bool:
-        inside = False
-        if len(polygon) < 3:
-            return False
-        j = len(polygon) - 1
-        for i in range(len(polygon)):
-            xi, yi = polygon[i]
-            xj, yj = polygon[j]
-            intersects = ((yi > y) != (yj > y)) and (
-                x < (xj - xi) * (y - yi) / (yj - yi + 1e-9) + xi
-            )
-            if intersects:
-                inside = not inside
-            j = i
-        return inside
-
     last_owner = owner_by_frame[0]
     stable_count = 0
     for idx, owner in enumerate(owner_by_frame):
@@ -292,7 +202,7 @@ def _compute_events(config: JobConfig, series: dict[str, Any]) -> list[dict[str,
             last_owner = owner
             stable_count = 0
 
-    length, field_width = _field_dims(profile)
+    length, field_width = field_dims(profile)
     zone_threshold = length * 0.66
     shot_threshold = length * 0.92
 
@@ -301,11 +211,14 @@ def _compute_events(config: JobConfig, series: dict[str, Any]) -> list[dict[str,
             zone.id: {"inside": False, "streak": 0} for zone in config.zones
         }
         shot_keywords = ("shot", "box", "key", "paint")
+        if zone_report is None:
+            zone_report = _zone_report(config, series)
+        ball_in_zone = zone_report["ball"]
 
-        for idx, (x, y) in enumerate(ball_positions):
+        for idx in range(len(ball_positions)):
             for zone in config.zones:
                 state = zone_state[zone.id]
-                inside = _point_in_polygon(x, y, zone.polygon)
+                inside = ball_in_zone[zone.id][idx]
                 if inside and not state["inside"]:
                     state["streak"] += 1
                     if state["streak"] >= zone_entry_min_frames:
@@ -338,8 +251,7 @@ def _compute_events(config: JobConfig, series: dict[str, Any]) -> list[dict[str,
                     state["streak"] = 0
                     state["inside"] = False
     else:
-        for idx, (x, y) in enumerate(ball_positions):
-            field_x, field_y = _map_to_field(x, y, width, height, profile)
+        for idx, (field_x, field_y) in enumerate(field["ball_positions"]):
             if field_x > zone_threshold and idx % 40 == 0:
                 events.append({
                     "id": f"evt_zone_{idx}",
@@ -363,38 +275,31 @@ def _compute_events(config: JobConfig, series: dict[str, Any]) -> list[dict[str,
                     "explanation": "ball reached shot zone",
                 })
 
-    for player_id, positions in player_positions.items():
+    first_frames: dict[str, int] = series.get("player_first_frame") or {}
+    for player_id, speeds in field["player_speeds"].items():
         speed_streak = 0
-        last_pos = None
-        for idx, (x, y) in enumerate(positions):
-            field_x, field_y = _map_to_field(x, y, width, height, profile)
-            if last_pos is not None:
-                dist = math.hypot(field_x - last_pos[0], field_y - last_pos[1])
-                speed = dist * fps
-                if speed > sprint_speed:
-                    speed_streak += 1
-                else:
-                    if speed_streak >= sprint_min_frames:
-                        events.append({
-                            "id": f"evt_sprint_{player_id}_{idx}",
-                            "type": "sprint_burst",
-                            "start": round((idx - speed_streak) / fps, 2),
-                            "end": round(idx / fps, 2),
-                            "frame": idx,
-                            "involved": [player_id],
-                            "confidence": 0.6,
-                            "explanation": f"player exceeded sprint threshold for {speed_streak} frames",
-                        })
-                    speed_streak = 0
-            last_pos = (field_x, field_y)
+        first = first_frames.get(player_id, 0)
+        for offset in range(1, len(speeds)):
+            idx = first + offset
+            if speeds[offset] > sprint_speed:
+                speed_streak += 1
+            else:
+                if speed_streak >= sprint_min_frames:
+                    events.append({
+                        "id": f"evt_sprint_{player_id}_{idx}",
+                        "type": "sprint_burst",
+                        "start": round((idx - speed_streak) / fps, 2),
+                        "end": round(idx / fps, 2),
+                        "frame": idx,
+                        "involved": [player_id],
+                        "confidence": 0.6,
+                        "explanation": f"player exceeded sprint threshold for {speed_streak} frames",
+                    })
+                speed_streak = 0
 
     crowding_window = 0
-    for idx, (ball_x, ball_y) in enumerate(ball_positions):
-        nearby = 0
-        for positions in player_positions.values():
-            px, py = positions[idx]
-            if math.hypot(px - ball_x, py - ball_y) < crowding_distance:
-                nearby += 1
+    nearby_counts = radius_counts(player_positions, ball_positions, crowding_distance, first_frames)
+    for idx, nearby in enumerate(nearby_counts):
         if nearby >= crowding_player_count:
             crowding_window += 1
             if crowding_window == crowding_min_frames:
@@ -495,14 +400,42 @@ def _write_exports(job_id: str, events: list[dict[str, Any]], metrics: dict[str,
     return exports
 
 
-def recompute_analytics(job_id: str, config: JobConfig, series: dict[str, Any]) -> tuple[list[ArtifactItem], dict[str, Any], list[dict[str, Any]]]:
+def _zone_report(config: JobConfig, series: dict[str, Any]) -> dict[str, Any] | None:
+    if not config.zones:
+        return None
+    return analyze_zones(
+        config.zones,
+        series["ball_positions"],
+        series["player_positions"],
+        series["fps"],
+        series.get("player_first_frame"),
+    )
+
+
+def recompute_analytics(
+    job_id: str,
+    config: JobConfig,
+    series: dict[str, Any],
+    input_path: Path | None = None,
+) -> tuple[list[ArtifactItem], dict[str, Any], list[dict[str, Any]], dict[str, Any]]:
+    """Rebuild analytics from a saved series; returns artifacts, metrics, events and summary keys to set."""
     artifacts_path = artifacts_dir(job_id)
-    metrics = _compute_metrics(config, series)
-    events = _compute_events(config, series)
+    field, rebuilt = load_field_series(artifacts_path / "field.json", config, series)
+    record_cache("field_series", hit=not rebuilt)
+    zone_report = _zone_report(config, series)
+    metrics = _compute_metrics(config, series, field, zone_report)
+    events = _compute_events(config, series, field, zone_report)
     save_json(artifacts_path / "metrics.json", metrics)
     save_json(artifacts_path / "events.json", {"events": events})
 
     items = [
+        ArtifactItem(
+            name="field",
+            kind="artifact",
+            path=str(artifacts_path / "field.json"),
+            content_type="application/json",
+            size_bytes=file_size(artifacts_path / "field.json"),
+        ),
         ArtifactItem(
             name="metrics",
             kind="artifact",
@@ -519,112 +452,424 @@ def recompute_analytics(job_id: str, config: JobConfig, series: dict[str, Any])
         ),
     ]
     items.extend(_write_exports(job_id, events, metrics))
-    return items, metrics, events
+    summary: dict[str, Any] = {}
+    try:
+        items.extend(export_analytics(exports_dir(job_id), metrics, events))
+    except RuntimeError as exc:
+        summary["export_warning"] = str(exc)
+    # Clips of unchanged events are reused; only new or moved windows are cut.
+    clip_items, clip_summary = _write_clips(job_id, config, input_path, events)
+    items.extend(clip_items)
+    summary.update(clip_summary)
+    return items, metrics, events, summary
+
+
+def _inference(profiler: StageProfiler, run: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    # Timed in the worker thread, so the section gets that thread's CPU time.
+    with profiler.section("detect.inference"):
+        return run(*args, **kwargs)
+
+
+async def _detect(
+    job: JobRecord,
+    input_path: Path | None,
+    upload: UploadSource | None,
+    profiler: StageProfiler,
+) -> tuple[TrackTable, dict[str, Any]]:
+    # Inference runs in a worker thread so upload chunks and other jobs keep running on the loop.
+    if input_path and CV_PROVIDER != "synthetic":
+        if upload is not None:
+            try:
+                result = await asyncio.to_thread(
+                    _inference, profiler, run_ultralytics_stream, upload.open_reader, job.config, profiler
+                )
+                job.summary["cv_provider"] = CV_PROVIDER
+                job.summary["pipelined"] = True
+                return result
+            except Exception as exc:
+                job.summary["pipeline_warning"] = str(exc)
+                await upload.wait_complete()
+        try:
+            result = await asyncio.to_thread(_inference, profiler, run_ultralytics, input_path, job.config, profiler)
+            job.summary["cv_provider"] = CV_PROVIDER
+            return result
+        except Exception as exc:
+            job.summary["cv_warning"] = str(exc)
+    return await asyncio.to_thread(_inference, profiler, _generate_tracks, job.config, seed=hash(job.id) % 10000)
+
+
+def _artifact(name: str, path: Path, kind: str = "artifact", content_type: str = "application/json") -> ArtifactItem:
+    return ArtifactItem(name=name, kind=kind, path=str(path), content_type=content_type, size_bytes=file_size(path))
+
+
+async def _ingest_stage(ctx: StageContext) -> StageOutput:
+    if ctx.upload is not None and CV_PROVIDER == "synthetic":
+        await ctx.upload.wait_complete()
+    return StageOutput(values={"input": ctx.input_path})
+
+
+async def _detect_stage(ctx: StageContext) -> StageOutput:
+    job = ctx.job
+    before = dict(job.summary)
+    tracks, series = await _detect(job, ctx.input_path, ctx.upload, ctx.profiler)
+    path = ctx.artifacts_path / "series.json"
+    with ctx.profiler.section("write_json"):
+        save_json(path, series)
+    # _detect notes provider and warnings on the summary; keep them with the checkpoint.
+    summary = {key: value for key, value in job.summary.items() if before.get(key) is not value}
+    summary.update(frames=tracks.meta["frame_count"], fps=tracks.meta["fps"], profile=tracks.meta["profile"])
+    return StageOutput(values={"tracks": tracks, "series": series}, artifacts=[_artifact("series", path)], summary=summary)
+
+
+def _detect_fingerprint(ctx: StageContext) -> Any:
+    config = ctx.job.config
+    source = input_identity(ctx.input_path) if ctx.input_path else f"synthetic:{ctx.job.id}"
+    return [CV_PROVIDER, source, config.profile.value, config.thresholds]
+
+
+def _restore_detect(ctx: StageContext) -> dict[str, Any]:
+    values = {"series": load_json(ctx.artifacts_path / "series.json")}
+    # tracks.json comes from write_tracks, which restores_from keeps valid alongside detect.
+    if "tracks" in ctx.needed:
+        values["tracks"] = read_track_table(ctx.artifacts_path / "tracks.json")
+    return values
+
+
+def _write_tracks_stage(ctx: StageContext) -> StageOutput:
+    path = ctx.artifacts_path / "tracks.json"
+    with ctx.profiler.section("write_json"):
+        ctx.values["tracks"].write_json(path)
+    return StageOutput(artifacts=[_artifact("tracks", path)])
+
+
+def _lod_stage(ctx: StageContext) -> StageOutput:
+    with ctx.profiler.section("write_json"):
+        items = write_lod(ctx.artifacts_path, ctx.values["tracks"])
+    return StageOutput(artifacts=items)
+
+
+def _understand_stage(ctx: StageContext) -> StageOutput:
+    field_series = build_field_series(ctx.job.config, ctx.values["series"])
+    path = ctx.artifacts_path / "field.json"
+    with ctx.profiler.section("write_json"):
+        save_json(path, field_series)
+    return StageOutput(values={"field": field_series}, artifacts=[_artifact("field", path)])
+
+
+def _zones_stage(ctx: StageContext) -> StageOutput:
+    return StageOutput(values={"zone_report": _zone_report(ctx.job.config, ctx.values["series"])})
+
+
+def _metrics_stage(ctx: StageContext) -> StageOutput:
+    values = ctx.values
+    metrics = _compute_metrics(ctx.job.config, values["series"], values["field"], values["zone_report"])
+    path = ctx.artifacts_path / "metrics.json"
+    with ctx.profiler.section("write_json"):
+        save_json(path, metrics)
+    return StageOutput(values={"metrics": metrics}, artifacts=[_artifact("metrics", path)], summary={"metrics": metrics["summary"]})
+
+
+def _events_stage(ctx: StageContext) -> StageOutput:
+    values = ctx.values
+    events = _compute_events(ctx.job.config, values["series"], values["field"], values["zone_report"])
+    path = ctx.artifacts_path / "events.json"
+    with ctx.profiler.section("write_json"):
+        save_json(path, {"events": events})
+    return StageOutput(values={"events": events}, artifacts=[_artifact("events", path)], summary={"events": len(events)})
+
+
+def _exports_stage(ctx: StageContext) -> StageOutput:
+    return StageOutput(artifacts=_write_exports(ctx.job.id, ctx.values["events"], ctx.values["metrics"]))
+
+
+def _write_clips(job_id: str, config: JobConfig, input_path: Path | None, events: list[dict[str, Any]]) -> tuple[list[ArtifactItem], dict[str, Any]]:
+    options = ClipOptions.from_config(config)
+    if not options.enabled or input_path is None:
+        return [], {}
+    try:
+        return extract_clips(clips_dir(job_id), input_path, events, options)
+    except RuntimeError as exc:
+        return [], {"clip_warning": str(exc)}
+
+
+def _clips_stage(ctx: StageContext) -> StageOutput:
+    items, summary = _write_clips(ctx.job.id, ctx.job.config, ctx.input_path, ctx.values["events"])
+    return StageOutput(artifacts=items, summary=summary)
+
+
+def _overlay_stage(ctx: StageContext) -> StageOutput:
+    options = OverlayOptions.from_config(ctx.job.config)
+    if not options.enabled or ctx.input_path is None:
+        return StageOutput()
+    path = ctx.artifacts_path / "overlay.mp4"
+    try:
+        summary = render_overlay(ctx.input_path, ctx.artifacts_path / "tracks.json", path, ctx.job.config, options)
+    except RuntimeError as exc:
+        return StageOutput(summary={"overlay_warning": str(exc)})
+    return StageOutput(artifacts=[_artifact("overlay", path, kind="export", content_type="video/mp4")], summary=summary)
+
+
+def _overlay_fingerprint(ctx: StageContext) -> Any:
+    config = ctx.job.config
+    return [
+        OverlayOptions.from_config(config),
+        input_identity(ctx.input_path),
+        [zone.model_dump() for zone in config.zones],
+        config.team_overrides,
+    ]
+
+
+def index_analytics(job: JobRecord, metrics: dict[str, Any], events: list[dict[str, Any]]) -> dict[str, Any]:
+    """Add a job's metrics and events to the cross-job index; returns summary keys to set."""
+    try:
+        open_index().index_job(
+            job.id,
+            job.config.profile.value,
+            metrics,
+            events,
+            created_at=job.created_at.isoformat(),
+            fps=job.summary.get("fps"),
+            frames=job.summary.get("frames"),
+        )
+    except sqlite3.Error as exc:
+        return {"index_warning": str(exc)}
+    return {}
+
+
+def _index_stage(ctx: StageContext) -> StageOutput:
+    return StageOutput(summary=index_analytics(ctx.job, ctx.values["metrics"], ctx.values["events"]))
+
+
+def _columnar_tracks_stage(ctx: StageContext) -> StageOutput:
+    values = ctx.values
+    try:
+        items = export_tracks(exports_dir(ctx.job.id), values["tracks"], values["series"], values["field"])
+    except RuntimeError as exc:
+        return StageOutput(summary={"export_warning": str(exc)})
+    return StageOutput(artifacts=items)
+
+
+def _columnar_analytics_stage(ctx: StageContext) -> StageOutput:
+    try:
+        items = export_analytics(exports_dir(ctx.job.id), ctx.values["metrics"], ctx.values["events"])
+    except RuntimeError as exc:
+        return StageOutput(summary={"export_warning": str(exc)})
+    return StageOutput(artifacts=items)
+
+
+def _columnar_fingerprint(ctx: StageContext) -> Any:
+    # Installing pyarrow later should produce the exports on the next run.
+    return [columnar_available(), COLUMNAR_FORMATS]
+
+
+async def _manifest_stage(ctx: StageContext) -> StageOutput:
+    # Runs on the loop thread, where the profiler dump was started.
+    items = ctx.collected()
+    profile_item = ctx.values["profile_dump"].stop(ctx.artifacts_path)
+    if profile_item:
+        items.append(profile_item)
+    path = ctx.artifacts_path / "manifest.json"
+    save_json(path, ArtifactManifest(items=items).model_dump())
+    return StageOutput(values={"manifest": ArtifactManifest(items=[*items, _artifact("manifest", path)])})
+
+
+def _config_fingerprint(ctx: StageContext) -> Any:
+    return ctx.job.config.model_dump(mode="json")
+
+
+def _load_artifact(name: str, key: str | None = None) -> Callable[[StageContext], dict[str, Any]]:
+    def restore(ctx: StageContext) -> dict[str, Any]:
+        payload = load_json(ctx.artifacts_path / f"{name}.json")
+        return {name: payload[key] if key else payload}
+
+    return restore
+
+
+# Registration order breaks ties between independent stages. Weights are the
+# rough share of a job's wall time each stage takes and drive job progress.
+PIPELINE_STAGES = [
+    Stage("ingest", _ingest_stage, outputs=("input",), resource=Resource.io, weight=0.5),
+    Stage(
+        "detect",
+        _detect_stage,
+        inputs=("input",),
+        outputs=("tracks", "series"),
+        resource=Resource.inference,
+        weight=6.0,
+        fingerprint=_detect_fingerprint,
+        restore=_restore_detect,
+        restores=("tracks", "series"),
+        restores_from=("write_tracks",),
+    ),
+    Stage(
+        "write_tracks",
+        _write_tracks_stage,
+        inputs=("tracks",),
+        outputs=("tracks_json",),
+        resource=Resource.cpu,
+        weight=1.5,
+        fingerprint=lambda ctx: None,
+        # tracks_json is the file itself, which a valid checkpoint guarantees is on disk.
+        restores=("tracks_json",),
+    ),
+    Stage(
+        "lod",
+        _lod_stage,
+        inputs=("tracks",),
+        outputs=("tracks_lod",),
+        resource=Resource.cpu,
+        weight=0.5,
+        fingerprint=lambda ctx: LOD_FPS,
+    ),
+    Stage(
+        "understand",
+        _understand_stage,
+        inputs=("series",),
+        outputs=("field",),
+        weight=1.0,
+        fingerprint=lambda ctx: [ctx.job.config.profile.value, [p.model_dump() for p in ctx.job.config.calibration_points]],
+        restore=_load_artifact("field"),
+        restores=("field",),
+    ),
+    Stage("zones", _zones_stage, inputs=("series",), outputs=("zone_report",), weight=0.3),
+    Stage(
+        "metrics",
+        _metrics_stage,
+        inputs=("series", "field", "zone_report"),
+        outputs=("metrics",),
+        weight=1.0,
+        fingerprint=_config_fingerprint,
+        restore=_load_artifact("metrics"),
+        restores=("metrics",),
+    ),
+    Stage(
+        "events",
+        _events_stage,
+        inputs=("series", "field", "zone_report"),
+        outputs=("events",),
+        weight=1.0,
+        fingerprint=_config_fingerprint,
+        restore=_load_artifact("events", "events"),
+        restores=("events",),
+    ),
+    Stage(
+        "exports",
+        _exports_stage,
+        inputs=("metrics", "events"),
+        outputs=("exports",),
+        resource=Resource.cpu,
+        weight=0.5,
+        fingerprint=lambda ctx: None,
+    ),
+    Stage(
+        "clips",
+        _clips_stage,
+        inputs=("events",),
+        outputs=("clips",),
+        resource=Resource.io,
+        weight=0.5,
+        fingerprint=lambda ctx: [ClipOptions.from_config(ctx.job.config), input_identity(ctx.input_path)],
+    ),
+    # Decoding, drawing and encoding happen in native code that releases the GIL, like inference.
+    Stage(
+        "overlay",
+        _overlay_stage,
+        inputs=("tracks_json",),
+        outputs=("overlay",),
+        resource=Resource.inference,
+        weight=1.0,
+        fingerprint=_overlay_fingerprint,
+    ),
+    Stage("index", _index_stage, inputs=("metrics", "events"), outputs=("analytics_index",), resource=Resource.io, weight=0.2),
+    Stage(
+        "columnar_tracks",
+        _columnar_tracks_stage,
+        inputs=("tracks", "series", "field"),
+        outputs=("columnar_tracks",),
+        resource=Resource.io,
+        weight=1.0,
+        fingerprint=_columnar_fingerprint,
+    ),
+    Stage(
+        "columnar_analytics",
+        _columnar_analytics_stage,
+        inputs=("metrics", "events"),
+        outputs=("columnar_analytics",),
+        resource=Resource.io,
+        weight=0.2,
+        fingerprint=_columnar_fingerprint,
+    ),
+    Stage("manifest", _manifest_stage, outputs=("manifest",), resource=Resource.io, weight=0.2, final=True),
+]
+# Extra stages per sport profile, added with register_stage.
+PROFILE_STAGES: dict[str, list[Stage]] = {}
+
+
+def register_stage(stage: Stage, profiles: tuple[str, ...] = ()) -> None:
+    """Plug a stage into the pipeline for the given profiles, or for all of them."""
+    for profile in profiles or tuple(item.value for item in SportProfile):
+        PROFILE_STAGES.setdefault(profile, []).append(stage)
+
+
+def build_graph(profile: str) -> StageGraph:
+    return StageGraph([*PIPELINE_STAGES, *PROFILE_STAGES.get(profile, [])])
 
 
 async def run_pipeline(
     job: JobRecord,
     input_path: Path | None,
     on_update: Callable[[JobRecord], Awaitable[None]] | None = None,
+    upload: UploadSource | None = None,
 ) -> ArtifactManifest:
-    stages = [
-        ("ingest", 0.1, 0.4),
-        ("detect", 0.35, 0.6),
-        ("track", 0.55, 0.7),
-        ("understand", 0.7, 0.85),
-        ("analytics", 0.85, 0.95),
-        ("exports", 1.0, 0.4),
-    ]
+    """Run the stage graph for ``job``.
 
-    manifest = ArtifactManifest(items=[])
-    artifacts_path = artifacts_dir(job.id)
+    Stages start as soon as their inputs exist, so artifact writes and the
+    independent analytics passes overlap. With ``upload`` set the job starts
+    while the input is still arriving: a real CV provider decodes the growing
+    file, anything else waits for the last byte during ingest.
 
-    for stage, progress, delay in stages:
-        job.stage = stage
-        job.progress = progress
+    Checkpointed stages leave a marker in checkpoints.json. A rerun of the
+    same job, e.g. after a crash, skips every stage whose fingerprint and
+    outputs are unchanged.
+    """
+    artifacts_path = artifacts_dir(job.id)
+    profiler = StageProfiler()
+    profile_dump = ProfileDump(PROFILE_MODE)
+    try:
+        profile_dump.start()
+    except RuntimeError as exc:
+        job.summary["profile_warning"] = str(exc)
+    ctx = StageContext(job, input_path, upload, artifacts_path, profiler, values={"profile_dump": profile_dump})
+
+    async def progress(active: list[str], fraction: float) -> None:
+        if active:
+            job.stage = "+".join(active)
+        job.progress = fraction
         job.updated_at = datetime.now(timezone.utc)
         if on_update:
             await on_update(job)
-        await asyncio.sleep(delay)
-
-        if stage == "detect":
-            if input_path and CV_PROVIDER != "synthetic":
-                try:
-                    tracks_data, series = run_ultralytics(input_path, job.config)
-                    job.summary["cv_provider"] = CV_PROVIDER
-                except Exception as exc:
-                    job.summary["cv_warning"] = str(exc)
-                    tracks_data, series = _generate_tracks(job.config, seed=hash(job.id) % 10000)
-            else:
-                tracks_data, series = _generate_tracks(job.config, seed=hash(job.id) % 10000)
-            save_json(artifacts_path / "tracks.json", tracks_data)
-            save_json(artifacts_path / "series.json", series)
-            manifest.items.append(ArtifactItem(
-                name="tracks",
-                kind="artifact",
-                path=str(artifacts_path / "tracks.json"),
-                content_type="application/json",
-                size_bytes=file_size(artifacts_path / "tracks.json"),
-            ))
-            manifest.items.append(ArtifactItem(
-                name="series",
-                kind="artifact",
-                path=str(artifacts_path / "series.json"),
-                content_type="application/json",
-                size_bytes=file_size(artifacts_path / "series.json"),
-            ))
-            job.summary["frames"] = tracks_data["meta"]["frame_count"]
-            job.summary["fps"] = tracks_data["meta"]["fps"]
-            job.summary["profile"] = tracks_data["meta"]["profile"]
-            job.summary["series"] = series
-            if on_update:
-                await on_update(job)
-
-        if stage == "analytics" and job.summary.get("series"):
-            series = job.summary["series"]
-            metrics = _compute_metrics(job.config, series)
-            events = _compute_events(job.config, series)
-            save_json(artifacts_path / "metrics.json", metrics)
-            save_json(artifacts_path / "events.json", {"events": events})
-            manifest.items.append(ArtifactItem(
-                name="metrics",
-                kind="artifact",
-                path=str(artifacts_path / "metrics.json"),
-                content_type="application/json",
-                size_bytes=file_size(artifacts_path / "metrics.json"),
-            ))
-            manifest.items.append(ArtifactItem(
-                name="events",
-                kind="artifact",
-                path=str(artifacts_path / "events.json"),
-                content_type="application/json",
-                size_bytes=file_size(artifacts_path / "events.json"),
-            ))
-            job.summary["metrics"] = metrics["summary"]
-            job.summary["events"] = len(events)
-            job.summary["events_detail"] = events
-            job.summary["series"] = series
-            exports = _write_exports(job.id, events, metrics)
-            manifest.items.extend(exports)
-            if on_update:
-                await on_update(job)
-
-        if stage == "exports":
-            save_json(artifacts_path / "manifest.json", manifest.model_dump())
-            manifest.items.append(ArtifactItem(
-                name="manifest",
-                kind="artifact",
-                path=str(artifacts_path / "manifest.json"),
-                content_type="application/json",
-                size_bytes=file_size(artifacts_path / "manifest.json"),
-            ))
+
+    async def pace(stage: Stage) -> None:
+        if DEMO_DELAYS:
+            await asyncio.sleep(0.4)
+
+    try:
+        await build_graph(job.config.profile.value).run(
+            ctx, Checkpoints(artifacts_path / "checkpoints.json"), on_progress=progress, before_stage=pace
+        )
+    finally:
+        profile_dump.cancel()
+    manifest = ctx.values["manifest"]
 
     job.status = JobStatus.completed
     job.progress = 1.0
     job.stage = "completed"
     job.updated_at = datetime.now(timezone.utc)
-    job.summary.pop("series", None)
-    job.summary.pop("events_detail", None)
+    if ctx.resumed:
+        job.summary["resumed_stages"] = ctx.resumed
+    job.summary["timings"] = profiler.summary(manifest.items, frames=job.summary.get("frames"))
+    for stage_name, entry in profiler.stages.items():
+        STAGE_LATENCY.observe(entry["wall_s"], stage=stage_name)
     if on_update:
         await on_update(job)
 
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+from .schemas import ArtifactItem
+from .storage import file_size
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class StageProfiler:
+    """Accumulates wall and CPU time per pipeline stage and per named section.
+
+    Stages are the top-level pipeline steps; sections are finer-grained spans
+    inside them (inference, JSON writes, individual analytics passes) and may
+    repeat, in which case their times are summed.
+
+    CPU time is the thread CPU time of spans run in a worker thread, so stages
+    and jobs running concurrently do not count each other's work. The event
+    loop thread runs every job's coroutines at once, so spans timed there
+    (coroutine stages) cannot tell their own CPU time apart and report
+    ``cpu_s`` as null. Work such a stage hands to a thread is measured there
+    under its own section, e.g. ``detect.inference``.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: dict[str, dict[str, float]] = {}
+        self.sections: dict[str, dict[str, float]] = {}
+
+    @staticmethod
+    def _entry(bucket: dict[str, dict[str, float]], name: str) -> dict[str, float]:
+        return bucket.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0, "cpu_calls": 0})
+
+    @contextmanager
+    def _measure(self, bucket: dict[str, dict[str, float]], name: str) -> Iterator[None]:
+        wall = time.perf_counter()
+        cpu = None if _on_event_loop() else time.thread_time()
+        try:
+            yield
+        finally:
+            entry = self._entry(bucket, name)
+            entry["wall_s"] += time.perf_counter() - wall
+            entry["calls"] += 1
+            if cpu is not None:
+                entry["cpu_s"] += time.thread_time() - cpu
+                entry["cpu_calls"] += 1
+
+    def stage(self, name: str):
+        return self._measure(self.stages, name)
+
+    def section(self, name: str):
+        return self._measure(self.sections, name)
+
+    def add(self, name: str, wall_s: float) -> None:
+        """Record a section timed elsewhere, e.g. per-frame model phases reported by Ultralytics."""
+        entry = self._entry(self.sections, name)
+        entry["wall_s"] += wall_s
+        entry["calls"] += 1
+
+    @staticmethod
+    def _rounded(bucket: dict[str, dict[str, float]]) -> dict[str, dict[str, float | None]]:
+        return {
+            name: {
+                "wall_s": round(entry["wall_s"], 4),
+                "cpu_s": round(entry["cpu_s"], 4) if entry["cpu_calls"] else None,
+                "calls": int(entry["calls"]),
+            }
+            for name, entry in bucket.items()
+        }
+
+    def summary(self, artifacts: list[ArtifactItem] | None = None, frames: int | None = None) -> dict[str, Any]:
+        detect_wall = self.sections.get("detect.inference", {}).get("wall_s", 0.0)
+        return {
+            "total_wall_s": round(time.perf_counter() - self.started, 4),
+            "stages": self._rounded(self.stages),
+            "sections": self._rounded(self.sections),
+            "detect_fps": round(frames / detect_wall, 2) if frames and detect_wall > 0 else None,
+            "artifact_bytes": {item.name: item.size_bytes or 0 for item in artifacts or []},
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+class ProfileDump:
+    """Optional per-job profiler dump using cProfile or pyinstrument."""
+
+    def __init__(self, mode: str) -> None:
+        self.mode = mode
+        self._profiler: Any = None
+
+    def start(self) -> None:
+        if self.mode == "cprofile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as exc:
+                # Only one cProfile can be active per process, e.g. with concurrent jobs.
+                raise RuntimeError(f"cProfile unavailable: {exc}") from exc
+            self._profiler = profiler
+        elif self.mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler  # type: ignore
+            except Exception as exc:  # pragma: no cover - optional dependency
+                raise RuntimeError("pyinstrument is required for VAP_PROFILE=pyinstrument") from exc
+            self._profiler = Profiler(async_mode="enabled")
+            self._profiler.start()
+
+    def cancel(self) -> None:
+        if self._profiler is None:
+            return
+        if self.mode == "cprofile":
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        self._profiler = None
+
+    def stop(self, output_dir: Path) -> ArtifactItem | None:
+        if self._profiler is None:
+            return None
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            path = output_dir / "profile.prof"
+            self._profiler.dump_stats(str(path))
+            content_type = "application/octet-stream"
+        else:
+            self._profiler.stop()
+            path = output_dir / "profile.html"
+            path.write_text(self._profiler.output_html(), encoding="utf-8")
+            content_type = "text/html"
+        self._profiler = None
+        return ArtifactItem(
+            name="profile",
+            kind="artifact",
+            path=str(path),
+            content_type=content_type,
+            size_bytes=file_size(path),
+        )
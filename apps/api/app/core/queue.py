@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .config import QUEUE_MAX_ATTEMPTS, QUEUE_VISIBILITY_S
+from .state import SqliteState
+
+# Retry backoff: RETRY_BASE_S, doubling per attempt, capped at RETRY_MAX_S.
+RETRY_BASE_S = 5.0
+RETRY_MAX_S = 300.0
+
+
+@dataclass(frozen=True)
+class Lease:
+    job_id: str
+    payload: dict[str, Any]
+    attempts: int
+    max_attempts: int
+    owner: str
+
+    @property
+    def exhausted(self) -> bool:
+        """True when an expired lease came back after the last allowed attempt."""
+        return self.attempts > self.max_attempts
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX_S, RETRY_BASE_S * 2 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    """Durable job queue in the shared state database.
+
+    Rows move ready -> leased -> done, or back to ready after a failure until
+    ``max_attempts`` is spent, then dead. A lease is held for
+    ``visibility_s`` and extended by heartbeats; a worker that dies stops
+    heartbeating and its job becomes leasable again once the lease expires.
+    """
+
+    def __init__(
+        self,
+        state: SqliteState,
+        visibility_s: float = QUEUE_VISIBILITY_S,
+        max_attempts: int = QUEUE_MAX_ATTEMPTS,
+    ):
+        self.state = state
+        self.visibility_s = visibility_s
+        self.max_attempts = max_attempts
+
+    def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        """Queue a job; enqueueing a known job (e.g. a rerun) resets it."""
+        now = time.time()
+        with self.state.transaction() as conn:
+            conn.execute(
+                "INSERT INTO queue (job_id, payload, state, attempts, max_attempts, available_at, enqueued_at) "
+                "VALUES (?, ?, 'ready', 0, ?, ?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET payload = excluded.payload, state = 'ready', attempts = 0, "
+                "max_attempts = excluded.max_attempts, available_at = excluded.available_at, "
+                "lease_owner = NULL, lease_expires = NULL, error = NULL, enqueued_at = excluded.enqueued_at",
+                (job_id, json.dumps(payload), self.max_attempts, now, now),
+            )
+
+    def lease(self, owner: str) -> Optional[Lease]:
+        """Claim the oldest ready job, or one whose lease has expired."""
+        now = time.time()
+        with self.state.transaction() as conn:
+            rows = conn.execute(
+                "SELECT job_id, payload, attempts, max_attempts FROM queue "
+                "WHERE (state = 'ready' AND available_at <= ?) OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY available_at LIMIT 1",
+                (now, now),
+            ).fetchall()
+            if not rows:
+                return None
+            job_id, payload, attempts, max_attempts = rows[0]
+            conn.execute(
+                "UPDATE queue SET state = 'leased', attempts = attempts + 1, lease_owner = ?, lease_expires = ? "
+                "WHERE job_id = ?",
+                (owner, now + self.visibility_s, job_id),
+            )
+        return Lease(job_id, json.loads(payload), attempts + 1, max_attempts, owner)
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """Extend the lease; False means it expired and another worker took the job."""
+        with self.state.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE queue SET lease_expires = ? WHERE job_id = ? AND lease_owner = ? AND state = 'leased'",
+                (time.time() + self.visibility_s, lease.job_id, lease.owner),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, lease: Lease) -> bool:
+        with self.state.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE queue SET state = 'done', lease_owner = NULL, lease_expires = NULL, error = NULL "
+                "WHERE job_id = ? AND lease_owner = ?",
+                (lease.job_id, lease.owner),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        """Record a failed attempt; returns True when the job will be retried."""
+        retry = lease.attempts < lease.max_attempts
+        with self.state.transaction() as conn:
+            conn.execute(
+                "UPDATE queue SET state = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, error = ? "
+                "WHERE job_id = ? AND lease_owner = ?",
+                (
+                    "ready" if retry else "dead",
+                    time.time() + retry_delay(lease.attempts),
+                    error,
+                    lease.job_id,
+                    lease.owner,
+                ),
+            )
+        return retry
+
+    def counts(self) -> dict[str, int]:
+        rows = self.state.query("SELECT state, COUNT(*) FROM queue GROUP BY state")
+        return {state: count for state, count in rows}
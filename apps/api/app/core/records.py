@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import bisect
+import json
+from array import array
+from pathlib import Path
+from typing import Any, Hashable, Iterable, Iterator, Optional
+
+from .storage import ensure_dir
+
+# Frames per chunk; bounds the cost of growing any one array.
+CHUNK_FRAMES = 4096
+# tracks.index.json records the frame number and byte offset of every INDEX_STRIDE-th frame line.
+INDEX_STRIDE = 256
+
+
+class Interner:
+    """Two-way mapping between values and dense small ints."""
+
+    def __init__(self) -> None:
+        self.values: list[Hashable] = []
+        self.index: dict[Hashable, int] = {}
+
+    def intern(self, value: Hashable) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class SparseTrack:
+    """Observed centers of one track, stored only for frames it was detected in.
+
+    Frames between observations are interpolated when read, so a track costs
+    O(detections) to build and nothing for the frames before it appears.
+    """
+
+    __slots__ = ("frames", "xs", "ys")
+
+    def __init__(self) -> None:
+        self.frames = array("I")
+        self.xs = array("d")
+        self.ys = array("d")
+
+    def observe(self, frame: int, x: float, y: float) -> None:
+        """Record a detection; frames must arrive in increasing order."""
+        self.frames.append(frame)
+        self.xs.append(x)
+        self.ys.append(y)
+
+    @property
+    def first_frame(self) -> int:
+        return self.frames[0]
+
+    @property
+    def last_frame(self) -> int:
+        return self.frames[-1]
+
+    def position(self, frame: int) -> Optional[tuple[float, float]]:
+        """Center at ``frame``, interpolated inside gaps and None outside the active range."""
+        frames = self.frames
+        if not frames or frame < frames[0] or frame > frames[-1]:
+            return None
+        idx = bisect.bisect_left(frames, frame)
+        if frames[idx] == frame:
+            return self.xs[idx], self.ys[idx]
+        before, after = frames[idx - 1], frames[idx]
+        t = (frame - before) / (after - before)
+        return (
+            self.xs[idx - 1] + (self.xs[idx] - self.xs[idx - 1]) * t,
+            self.ys[idx - 1] + (self.ys[idx] - self.ys[idx - 1]) * t,
+        )
+
+    def dense(self) -> list[tuple[float, float]]:
+        """Positions for every frame from first to last observation, gaps filled linearly."""
+        frames, xs, ys = self.frames, self.xs, self.ys
+        if not frames:
+            return []
+        out = [(xs[0], ys[0])]
+        for idx in range(1, len(frames)):
+            span = frames[idx] - frames[idx - 1]
+            x0, y0 = xs[idx - 1], ys[idx - 1]
+            dx, dy = xs[idx] - x0, ys[idx] - y0
+            for step in range(1, span):
+                t = step / span
+                out.append((x0 + dx * t, y0 + dy * t))
+            out.append((xs[idx], ys[idx]))
+        return out
+
+
+class FrameChunk:
+    """Detections for up to CHUNK_FRAMES consecutive frames as parallel arrays.
+
+    ``ends[i]`` is the number of objects up to and including local frame ``i``,
+    so frame ``i`` owns rows ``ends[i - 1]:ends[i]``.
+    """
+
+    __slots__ = ("first_frame", "ends", "track", "label", "x", "y", "w", "h", "confidence")
+
+    def __init__(self, first_frame: int):
+        self.first_frame = first_frame
+        self.ends = array("I")
+        self.track = array("I")
+        self.label = array("B")
+        self.x = array("f")
+        self.y = array("f")
+        self.w = array("f")
+        self.h = array("f")
+        self.confidence = array("f")
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            column.buffer_info()[1] * column.itemsize
+            for column in (self.ends, self.track, self.label, self.x, self.y, self.w, self.h, self.confidence)
+        )
+
+
+class TrackTable:
+    """Compact in-memory form of tracks.json.
+
+    Producers call ``start_frame`` then ``add`` per object. IDs and labels are
+    interned and coordinates are float32. Team is a per-track attribute in
+    ``team_of``, so later stages can relabel tracks without touching rows.
+    The public dict shape only exists transiently in ``iter_frames`` and the
+    JSON writer.
+    """
+
+    def __init__(self, meta: dict[str, Any]):
+        self.meta = meta
+        self.tracks: list[dict[str, Any]] = []
+        self.ids = Interner()
+        self.labels = Interner()
+        self.team_of: dict[str, Optional[str]] = {}
+        self.chunks: list[FrameChunk] = []
+        self._current: Optional[FrameChunk] = None
+
+    @property
+    def frame_count(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(chunk.nbytes for chunk in self.chunks)
+
+    def start_frame(self) -> None:
+        chunk = self._current
+        if chunk is None or len(chunk) == CHUNK_FRAMES:
+            chunk = self._current = FrameChunk(self.frame_count)
+            self.chunks.append(chunk)
+        chunk.ends.append(len(chunk.track))
+
+    def add(
+        self,
+        track_id: str,
+        label: str,
+        team: Optional[str],
+        x: float,
+        y: float,
+        w: float,
+        h: float,
+        confidence: float,
+    ) -> None:
+        chunk = self._current
+        chunk.track.append(self.ids.intern(track_id))
+        chunk.label.append(self.labels.intern(label))
+        if track_id not in self.team_of:
+            self.team_of[track_id] = team
+        chunk.x.append(x)
+        chunk.y.append(y)
+        chunk.w.append(w)
+        chunk.h.append(h)
+        chunk.confidence.append(confidence)
+        chunk.ends[-1] += 1
+
+    def rename_ids(self, mapping: dict[str, str], team_of: dict[str, Optional[str]]) -> None:
+        """Relabel tracks in place; several old ids may map onto one new id."""
+        values = [mapping.get(value, value) for value in self.ids.values]
+        self.ids.values = values
+        self.ids.index = {}
+        for code, value in enumerate(values):
+            self.ids.index.setdefault(value, code)
+        self.team_of = {value: team_of.get(value, self.team_of.get(value)) for value in values}
+
+    def _chunk_frames(self, chunk: FrameChunk, step: int = 1) -> list[dict[str, Any]]:
+        ids = self.ids.values
+        labels = self.labels.values
+        teams = [self.team_of.get(value) for value in ids]
+        track, label = chunk.track.tolist(), chunk.label.tolist()
+        xs, ys, ws, hs = chunk.x.tolist(), chunk.y.tolist(), chunk.w.tolist(), chunk.h.tolist()
+        confidence = chunk.confidence.tolist()
+        ends = chunk.ends
+        frames = []
+        for offset in range(-chunk.first_frame % step, len(ends), step):
+            start = ends[offset - 1] if offset else 0
+            frames.append({
+                "frame": chunk.first_frame + offset,
+                "objects": [
+                    {
+                        "id": ids[track[row]],
+                        "label": labels[label[row]],
+                        "team": teams[track[row]],
+                        "bbox": [round(xs[row], 2), round(ys[row], 2), round(ws[row], 2), round(hs[row], 2)],
+                        "confidence": round(confidence[row], 3),
+                    }
+                    for row in range(start, ends[offset])
+                ],
+            })
+        return frames
+
+    def iter_frames(self, step: int = 1) -> Iterator[dict[str, Any]]:
+        """Public frame dicts, optionally only every ``step``-th frame (frame numbers divisible by it)."""
+        for chunk in self.chunks:
+            yield from self._chunk_frames(chunk, step)
+
+    def to_payload(self) -> dict[str, Any]:
+        """Materialize the public tracks.json shape; prefer ``write_json`` for large tables."""
+        return {"meta": self.meta, "tracks": self.tracks, "frames": list(self.iter_frames())}
+
+    def write_json(self, path: Path) -> None:
+        """Write tracks.json one chunk at a time, one frame per line."""
+        write_frames_json(path, self.meta, self.tracks, self.iter_frames())
+
+
+def write_frames_json(path: Path, meta: dict[str, Any], tracks: list[Any], frames: Iterable[dict[str, Any]]) -> None:
+    """Write the tracks.json shape with one frame per line.
+
+    Also writes a sparse offset index next to it, so readers can seek to a
+    frame range without parsing the frames before it.
+    """
+    ensure_dir(path.parent)
+    offsets: list[int] = []
+    indexed: list[int] = []
+    with path.open("w", encoding="utf-8") as handle:
+        # json.dumps escapes non-ASCII, so string lengths are byte counts.
+        position = handle.write('{"meta": ')
+        position += handle.write(json.dumps(meta, default=str))
+        position += handle.write(', "tracks": ')
+        position += handle.write(json.dumps(tracks))
+        position += handle.write(', "frames": [')
+        count = 0
+        for frame in frames:
+            position += handle.write("\n" if count == 0 else ",\n")
+            if count % INDEX_STRIDE == 0:
+                indexed.append(frame["frame"])
+                offsets.append(position)
+            position += handle.write(json.dumps(frame, separators=(",", ":")))
+            count += 1
+        handle.write("\n]}\n")
+    with track_index_path(path).open("w", encoding="utf-8") as handle:
+        json.dump({"count": count, "frames": indexed, "offsets": offsets}, handle)
+
+
+def read_track_table(path: Path) -> TrackTable:
+    """Load a tracks.json back into a TrackTable, at the rounding it was written with."""
+    header = read_track_header(path)
+    table = TrackTable(header["meta"])
+    table.tracks = header["tracks"]
+    for frame in iter_track_frames(path):
+        table.start_frame()
+        for item in frame["objects"]:
+            table.add(item["id"], item["label"], item["team"], *item["bbox"], item["confidence"])
+    return table
+
+
+def track_index_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.index.json")
+
+
+def read_track_header(path: Path) -> dict[str, Any]:
+    """``meta`` and ``tracks`` of a tracks.json without reading its frames."""
+    with path.open("rb") as handle:
+        header = handle.readline().rstrip()
+    # Files not written by write_json (e.g. pretty-printed) need a full parse.
+    payload = json.loads(header + b"]}") if header.endswith(b"[") else json.loads(path.read_bytes())
+    return {"meta": payload.get("meta", {}), "tracks": payload.get("tracks", [])}
+
+
+def iter_track_frames(path: Path, start: int = 0, end: Optional[int] = None) -> Iterator[dict[str, Any]]:
+    """Stream frames ``start..end`` (inclusive) from a tracks.json, one line at a time."""
+    with path.open("rb") as handle:
+        if not handle.readline().rstrip().endswith(b"["):
+            frames = json.loads(path.read_bytes()).get("frames", [])
+            yield from (frame for frame in frames if frame["frame"] >= start and (end is None or frame["frame"] <= end))
+            return
+        index_path = track_index_path(path)
+        if start > 0 and index_path.exists():
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+            slot = bisect.bisect_right(index["frames"], start) - 1
+            if slot > 0:
+                handle.seek(index["offsets"][slot])
+        for line in handle:
+            line = line.rstrip().rstrip(b",")
+            if not line.startswith(b"{"):
+                continue
+            frame = json.loads(line)
+            if frame["frame"] < start:
+                continue
+            if end is not None and frame["frame"] > end:
+                return
+            yield frame
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence
+
+from .records import SparseTrack
+from .schemas import JobConfig
+
+UNASSIGNED_ID = "unassigned"
+# Observations used to estimate a fragment's velocity at either end.
+VELOCITY_WINDOW = 5
+
+
+@dataclass(frozen=True)
+class ReidOptions:
+    max_gap_s: float = 2.0
+    gate_px: float = 60.0
+    appearance_weight: float = 0.5
+    max_appearance_distance: float = 0.45
+    min_frames: int = 12
+    max_players: int = 26
+
+    @classmethod
+    def from_config(cls, config: JobConfig, fps: float, height: int) -> "ReidOptions":
+        """Read ``reid_*`` thresholds; pixel gates scale with frame height."""
+        thresholds = config.thresholds
+        default_players = 26 if config.profile.value == "soccer" else 14
+        return cls(
+            max_gap_s=float(thresholds.get("reid_max_gap_s", 2.0)),
+            gate_px=float(thresholds.get("reid_gate_px", 60.0 * height / 720)),
+            appearance_weight=float(thresholds.get("reid_appearance_weight", 0.5)),
+            max_appearance_distance=float(thresholds.get("reid_max_appearance_distance", 0.45)),
+            min_frames=int(thresholds.get("reid_min_frames", max(1, round(fps / 2)))),
+            max_players=int(thresholds.get("reid_max_players", default_players)),
+        )
+
+
+def appearance_distance(a: Optional[Sequence[float]], b: Optional[Sequence[float]]) -> Optional[float]:
+    """1 - histogram intersection of two L1-normalized histograms; None if either is missing."""
+    if not a or not b:
+        return None
+    return max(0.0, 1.0 - sum(min(x, y) for x, y in zip(a, b)))
+
+
+def _end_velocity(track: SparseTrack, tail: bool) -> tuple[float, float]:
+    frames = track.frames
+    count = len(frames)
+    if count < 2:
+        return 0.0, 0.0
+    span = min(VELOCITY_WINDOW, count - 1)
+    if tail:
+        i, j = count - 1 - span, count - 1
+    else:
+        i, j = 0, span
+    dt = frames[j] - frames[i]
+    if dt <= 0:
+        return 0.0, 0.0
+    return (track.xs[j] - track.xs[i]) / dt, (track.ys[j] - track.ys[i]) / dt
+
+
+def _link_cost(
+    earlier: SparseTrack,
+    later: SparseTrack,
+    gap: int,
+    fps: float,
+    options: ReidOptions,
+    appearance: Optional[float],
+) -> Optional[float]:
+    """Cost of ``later`` continuing ``earlier``, or None when the gates reject it."""
+    vx, vy = _end_velocity(earlier, tail=True)
+    # Meet in the middle: extrapolate both ends across half the gap each.
+    wx, wy = _end_velocity(later, tail=False)
+    half = gap / 2
+    ax, ay = earlier.xs[-1] + vx * half, earlier.ys[-1] + vy * half
+    bx, by = later.xs[0] - wx * half, later.ys[0] - wy * half
+    radius = options.gate_px * (1.0 + gap / fps)
+    distance = math.hypot(ax - bx, ay - by)
+    if distance > radius:
+        return None
+    if appearance is None:
+        return distance / radius + options.appearance_weight * 0.5
+    if appearance > options.max_appearance_distance:
+        return None
+    return distance / radius + options.appearance_weight * appearance
+
+
+def merge_fragments(
+    fragments: Mapping[str, SparseTrack],
+    features: Mapping[str, Sequence[float]],
+    fps: float,
+    options: ReidOptions,
+) -> dict[str, list[str]]:
+    """Chain time-disjoint fragments into identities.
+
+    Candidate links join a fragment's end to a later fragment's start within
+    ``max_gap_s``, gated on extrapolated position and appearance. Links are
+    accepted cheapest first, each fragment taking at most one predecessor and
+    one successor. Returns identity chains in temporal order, keyed by their
+    first fragment.
+    """
+    max_gap = max(1, int(options.max_gap_s * fps))
+    ordered = sorted((track.first_frame, key) for key, track in fragments.items() if track.frames)
+    by_end = sorted((track.last_frame, key) for key, track in fragments.items() if track.frames)
+
+    candidates: list[tuple[float, str, str]] = []
+    start = 0
+    for first_frame, later_key in ordered:
+        later = fragments[later_key]
+        # by_end is sorted, so skip ends that are already too old for this start.
+        while start < len(by_end) and by_end[start][0] < first_frame - max_gap:
+            start += 1
+        for end_frame, earlier_key in by_end[start:]:
+            if end_frame >= first_frame:
+                break
+            appearance = appearance_distance(features.get(earlier_key), features.get(later_key))
+            cost = _link_cost(fragments[earlier_key], later, first_frame - end_frame, fps, options, appearance)
+            if cost is not None:
+                candidates.append((cost, earlier_key, later_key))
+
+    successor: dict[str, str] = {}
+    predecessor: dict[str, str] = {}
+    for _, earlier_key, later_key in sorted(candidates):
+        if earlier_key in successor or later_key in predecessor:
+            continue
+        successor[earlier_key] = later_key
+        predecessor[later_key] = earlier_key
+
+    chains: dict[str, list[str]] = {}
+    for _, key in ordered:
+        if key in predecessor:
+            continue
+        chain = [key]
+        while chain[-1] in successor:
+            chain.append(successor[chain[-1]])
+        chains[key] = chain
+    return chains
+
+
+def concat_tracks(tracks: Sequence[SparseTrack]) -> SparseTrack:
+    merged = SparseTrack()
+    for track in tracks:
+        merged.frames.extend(track.frames)
+        merged.xs.extend(track.xs)
+        merged.ys.extend(track.ys)
+    return merged
+
+
+def compact_identities(
+    fragments: Mapping[str, SparseTrack],
+    chains: Mapping[str, list[str]],
+    options: ReidOptions,
+) -> dict[str, str]:
+    """Map every fragment to a compact player id, or UNASSIGNED_ID for noise.
+
+    Identities with fewer than ``min_frames`` detections are dropped, and only
+    the ``max_players`` longest survive. Survivors are numbered p1..pN in order
+    of first appearance.
+    """
+    observed = {
+        head: sum(len(fragments[key].frames) for key in chain)
+        for head, chain in chains.items()
+    }
+    kept = [head for head in chains if observed[head] >= options.min_frames]
+    kept = sorted(kept, key=lambda head: -observed[head])[: options.max_players]
+    kept_set = set(kept)
+    kept_in_order = [head for head in chains if head in kept_set]
+
+    mapping = {key: UNASSIGNED_ID for key in fragments}
+    for number, head in enumerate(kept_in_order, 1):
+        for key in chains[head]:
+            mapping[key] = f"p{number}"
+    return mapping
@@ -88,6 +88,30 @@ class ShareLink(BaseModel):
     expires_at: Optional[datetime] = None
 
 
+class UploadCreateRequest(BaseModel):
+    filename: str
+    size: int = Field(ge=0)
+    content_type: Optional[str] = None
+    config: Optional[JobConfig] = None
+    # Start detection on the bytes received so far instead of waiting for the last chunk.
+    pipelined: bool = False
+
+
+class UploadSession(BaseModel):
+    id: str
+    job_id: str
+    filename: str
+    content_type: Optional[str] = None
+    path: str
+    size: int
+    offset: int = 0
+    sha256: Optional[str] = None
+    completed: bool = False
+    pipelined: bool = False
+    created_at: datetime
+    updated_at: datetime
+
+
 class StreamJobRequest(BaseModel):
     stream_url: str
     config: Optional[JobConfig] = None
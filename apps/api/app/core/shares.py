@@ -5,20 +5,28 @@ from typing import Optional
 from uuid import uuid4
 
 from .schemas import ShareLink
+from .state import SqliteState
 from .storage import load_json, save_json
 
 
 class ShareStore:
-    def __init__(self, path):
+    def __init__(self, path, state: Optional[SqliteState] = None):
         self.path = path
+        self.state = state
         self.items: dict[str, ShareLink] = {}
 
     async def load(self) -> None:
         if not self.path.exists():
             return
         payload = load_json(self.path)
-        for item in payload.get("items", []):
-            link = ShareLink.model_validate(item)
+        links = [ShareLink.model_validate(item) for item in payload.get("items", [])]
+        if self.state is not None:
+            self.state.import_records(
+                "share",
+                ((link.id, link.model_dump(mode="json"), None, link.created_at.isoformat()) for link in links),
+            )
+            return
+        for link in links:
             self.items[link.id] = link
 
     async def save(self) -> None:
@@ -34,12 +42,19 @@ class ShareStore:
             created_at=datetime.now(timezone.utc),
             expires_at=expires_at,
         )
+        if self.state is not None:
+            self.state.put("share", link.id, link.model_dump(mode="json"), created_at=link.created_at.isoformat())
+            return link
         self.items[link.id] = link
         await self.save()
         return link
 
     async def get(self, link_id: str) -> Optional[ShareLink]:
-        link = self.items.get(link_id)
+        if self.state is not None:
+            payload = self.state.get("share", link_id)
+            link = ShareLink.model_validate(payload) if payload else None
+        else:
+            link = self.items.get(link_id)
         if not link:
             return None
         if link.expires_at and link.expires_at < datetime.now(timezone.utc):
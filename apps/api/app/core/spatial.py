@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+from typing import Iterator, Mapping, Sequence
+
+Point = tuple[float, float]
+Positions = Mapping[str, Sequence[Sequence[float]]]
+
+
+class GridIndex:
+    """Uniform grid hash over one frame's points.
+
+    Queries only visit the cells that can contain a match, so radius and
+    nearest lookups cost roughly O(points per cell) instead of O(points).
+    Ties on distance resolve to the lower point index, which keeps results
+    identical to a linear scan over the same point order.
+    """
+
+    def __init__(self, points: Sequence[Sequence[float]], cell_size: float):
+        self.points = points
+        self.cell_size = cell_size
+        self._inv = 1.0 / cell_size
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        min_cx = min_cy = max_cx = max_cy = 0
+        for idx, (x, y) in enumerate(points):
+            key = (math.floor(x * self._inv), math.floor(y * self._inv))
+            bucket = self.cells.get(key)
+            if bucket is None:
+                self.cells[key] = [idx]
+            else:
+                bucket.append(idx)
+            if idx == 0:
+                min_cx = max_cx = key[0]
+                min_cy = max_cy = key[1]
+            else:
+                min_cx = min(min_cx, key[0])
+                max_cx = max(max_cx, key[0])
+                min_cy = min(min_cy, key[1])
+                max_cy = max(max_cy, key[1])
+        self._bounds = (min_cx, min_cy, max_cx, max_cy)
+
+    @classmethod
+    def auto(cls, points: Sequence[Sequence[float]]) -> "GridIndex":
+        """Index with a cell size giving about one point per cell."""
+        if not points:
+            return cls(points, 1.0)
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        side = max(max(xs) - min(xs), max(ys) - min(ys))
+        cells_per_side = math.ceil(math.sqrt(len(points)))
+        return cls(points, side / cells_per_side if side > 0 else 1.0)
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x * self._inv), math.floor(y * self._inv)
+
+    def _max_ring(self, cx: int, cy: int) -> int:
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        return max(abs(cx - min_cx), abs(cx - max_cx), abs(cy - min_cy), abs(cy - max_cy))
+
+    def _ring(self, cx: int, cy: int, ring: int) -> Iterator[list[int]]:
+        cells = self.cells
+        if ring == 0:
+            bucket = cells.get((cx, cy))
+            if bucket:
+                yield bucket
+            return
+        for dx in range(-ring, ring + 1):
+            for dy in (-ring, ring):
+                bucket = cells.get((cx + dx, cy + dy))
+                if bucket:
+                    yield bucket
+        for dy in range(-ring + 1, ring):
+            for dx in (-ring, ring):
+                bucket = cells.get((cx + dx, cy + dy))
+                if bucket:
+                    yield bucket
+
+    def within(self, x: float, y: float, radius: float) -> list[int]:
+        """Indices of points strictly closer than ``radius``."""
+        limit = radius * radius
+        min_cx, min_cy = self._cell(x - radius, y - radius)
+        max_cx, max_cy = self._cell(x + radius, y + radius)
+        points = self.points
+        found = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for idx in self.cells.get((cx, cy), ()):
+                    px, py = points[idx]
+                    if (px - x) ** 2 + (py - y) ** 2 < limit:
+                        found.append(idx)
+        return found
+
+    def count_within(self, x: float, y: float, radius: float) -> int:
+        return len(self.within(x, y, radius))
+
+    def k_nearest(self, x: float, y: float, k: int) -> list[tuple[int, float]]:
+        """Up to ``k`` (index, distance) pairs ordered by distance."""
+        if not self.points or k <= 0:
+            return []
+        cx, cy = self._cell(x, y)
+        max_ring = self._max_ring(cx, cy)
+        points = self.points
+        heap: list[tuple[float, int]] = []
+        ring = 0
+        while ring <= max_ring:
+            for bucket in self._ring(cx, cy, ring):
+                for idx in bucket:
+                    px, py = points[idx]
+                    item = (-((px - x) ** 2 + (py - y) ** 2), -idx)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+            # Anything beyond this ring is at least ring * cell_size away.
+            reach = ring * self.cell_size
+            if len(heap) == k and -heap[0][0] <= reach * reach:
+                break
+            ring += 1
+        ordered = sorted((-neg_dist, -neg_idx) for neg_dist, neg_idx in heap)
+        return [(idx, math.sqrt(dist)) for dist, idx in ordered]
+
+    def nearest(self, x: float, y: float) -> tuple[int, float] | None:
+        found = self.k_nearest(x, y, 1)
+        return found[0] if found else None
+
+    def pairs_within(self, radius: float) -> list[tuple[int, int, float]]:
+        """All (i, j, distance) pairs with i < j closer than ``radius``."""
+        pairs = []
+        points = self.points
+        for i, (x, y) in enumerate(points):
+            for j in self.within(x, y, radius):
+                if j > i:
+                    px, py = points[j]
+                    pairs.append((i, j, math.hypot(px - x, py - y)))
+        return pairs
+
+
+def iter_frame_points(
+    player_positions: Positions,
+    frame_count: int,
+    first_frames: Mapping[str, int] | None = None,
+) -> Iterator[tuple[list[str], list[Sequence[float]]]]:
+    """Yield each frame's (ids, points) for the tracks active in that frame.
+
+    A track's positions cover ``first_frames[id]`` (default 0) onwards. Tracks
+    enter and leave a sorted active list as frames advance, so each frame only
+    touches the tracks alive in it, in the mapping's order.
+    """
+    tracks = list(player_positions.items())
+    first_frames = first_frames or {}
+    starts: dict[int, list[int]] = {}
+    ends: dict[int, list[int]] = {}
+    for order, (player_id, positions) in enumerate(tracks):
+        if not positions:
+            continue
+        first = first_frames.get(player_id, 0)
+        starts.setdefault(first, []).append(order)
+        ends.setdefault(first + len(positions), []).append(order)
+    active: list[int] = []
+    for frame in range(frame_count):
+        for order in ends.pop(frame, ()):
+            active.remove(order)
+        for order in starts.pop(frame, ()):
+            bisect.insort(active, order)
+        ids = []
+        points = []
+        for order in active:
+            player_id, positions = tracks[order]
+            ids.append(player_id)
+            points.append(positions[frame - first_frames.get(player_id, 0)])
+        yield ids, points
+
+
+def radius_counts(
+    player_positions: Positions,
+    queries: Sequence[Sequence[float]],
+    radius: float,
+    first_frames: Mapping[str, int] | None = None,
+) -> list[int]:
+    """Per frame, the number of players strictly within ``radius`` of that frame's query point."""
+    if radius <= 0:
+        return [0] * len(queries)
+    counts = []
+    frames = iter_frame_points(player_positions, len(queries), first_frames)
+    for (x, y), (_, points) in zip(queries, frames):
+        counts.append(GridIndex(points, radius).count_within(x, y, radius) if points else 0)
+    return counts
+
+
+def k_nearest(
+    player_positions: Positions,
+    queries: Sequence[Sequence[float]],
+    k: int,
+    first_frames: Mapping[str, int] | None = None,
+) -> list[list[tuple[str, float]]]:
+    """Per frame, the ``k`` players closest to that frame's query point."""
+    results = []
+    frames = iter_frame_points(player_positions, len(queries), first_frames)
+    for (x, y), (ids, points) in zip(queries, frames):
+        index = GridIndex.auto(points)
+        results.append([(ids[idx], dist) for idx, dist in index.k_nearest(x, y, k)])
+    return results
+
+
+def nearest_owner(
+    player_positions: Positions,
+    queries: Sequence[Sequence[float]],
+    first_frames: Mapping[str, int] | None = None,
+) -> list[tuple[str | None, float | None]]:
+    """Per frame, the closest player to that frame's query point and its distance."""
+    owners: list[tuple[str | None, float | None]] = []
+    for found in k_nearest(player_positions, queries, 1, first_frames):
+        owners.append(found[0] if found else (None, None))
+    return owners
+
+
+def frame_pairs_within(
+    player_positions: Positions,
+    frame_count: int,
+    radius: float,
+    first_frames: Mapping[str, int] | None = None,
+) -> list[list[tuple[str, str, float]]]:
+    """Per frame, every pair of players closer than ``radius``."""
+    if radius <= 0:
+        return [[] for _ in range(frame_count)]
+    results = []
+    for ids, points in iter_frame_points(player_positions, frame_count, first_frames):
+        index = GridIndex(points, radius)
+        results.append([(ids[i], ids[j], dist) for i, j, dist in index.pairs_within(radius)])
+    return results
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from .storage import ensure_dir
+
+# Events older than this are pruned; subscribers only ever need the recent tail.
+EVENT_RETENTION_S = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    status TEXT,
+    created_at TEXT,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS records_kind_status ON records (kind, status);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    key TEXT,
+    created REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue (
+    job_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    enqueued_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_state_available ON queue (state, available_at);
+CREATE TABLE IF NOT EXISTS claims (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS claims_owner ON claims (owner);
+"""
+
+
+class SqliteState:
+    """Job, share and upload records plus an event log shared by every process.
+
+    One SQLite file in WAL mode holds the authoritative records. Writers append
+    to ``events`` in the same transaction, and each process tails that table
+    to fan updates out to its own SSE subscribers, so any API worker can serve
+    any job.
+    """
+
+    def __init__(self, path: Path, schema: str = SCHEMA):
+        self.path = path
+        ensure_dir(path.parent)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(schema)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        # Always drain the cursor: a half-read SELECT keeps its read transaction,
+        # and with it a stale WAL snapshot, open on this thread's connection.
+        return self._connect().execute(sql, params).fetchall()
+
+    def query_dicts(self, sql: str, params: tuple = ()) -> list[dict[str, Any]]:
+        cursor = self._connect().execute(sql, params)
+        columns = [item[0] for item in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that takes the database lock up front."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def put(
+        self,
+        kind: str,
+        record_id: str,
+        payload: dict[str, Any],
+        status: Optional[str] = None,
+        created_at: Optional[str] = None,
+        topic: Optional[str] = None,
+    ) -> None:
+        """Upsert a record and, with ``topic``, publish it in the same transaction."""
+        body = json.dumps(payload, default=str)
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO records (kind, id, status, created_at, payload) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, id) DO UPDATE SET status = excluded.status, payload = excluded.payload",
+                (kind, record_id, status, created_at, body),
+            )
+            if topic:
+                conn.execute(
+                    "INSERT INTO events (topic, key, created, payload) VALUES (?, ?, ?, ?)",
+                    (topic, record_id, time.time(), body),
+                )
+
+    def get(self, kind: str, record_id: str) -> Optional[dict[str, Any]]:
+        rows = self.query("SELECT payload FROM records WHERE kind = ? AND id = ?", (kind, record_id))
+        return json.loads(rows[0][0]) if rows else None
+
+    def list(self, kind: str) -> list[dict[str, Any]]:
+        rows = self.query("SELECT payload FROM records WHERE kind = ? ORDER BY created_at DESC", (kind,))
+        return [json.loads(row[0]) for row in rows]
+
+    def status_counts(self, kind: str) -> dict[str, int]:
+        rows = self.query("SELECT status, COUNT(*) FROM records WHERE kind = ? GROUP BY status", (kind,))
+        return {status: count for status, count in rows}
+
+    def import_records(self, kind: str, items: Iterable[tuple[str, dict[str, Any], Optional[str], Optional[str]]]) -> None:
+        """Insert records that are not known yet, e.g. job.json files from before the backend existed."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO records (kind, id, status, created_at, payload) VALUES (?, ?, ?, ?, ?)",
+                [(kind, record_id, status, created_at, json.dumps(payload, default=str)) for record_id, payload, status, created_at in items],
+            )
+
+    def last_event(self) -> int:
+        return int(self.query("SELECT COALESCE(MAX(seq), 0) FROM events")[0][0])
+
+    def events_since(self, seq: int, limit: int = 500) -> list[tuple[int, str, Optional[str], dict[str, Any]]]:
+        rows = self.query(
+            "SELECT seq, topic, key, payload FROM events WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)
+        )
+        return [(row[0], row[1], row[2], json.loads(row[3])) for row in rows]
+
+    def prune_events(self, older_than_s: float = EVENT_RETENTION_S) -> int:
+        with self.transaction() as conn:
+            cursor = conn.execute("DELETE FROM events WHERE created < ?", (time.time() - older_than_s,))
+        return cursor.rowcount
+
+    def claim(self, kind: str, record_id: str, owner: str, ttl_s: float) -> bool:
+        """Take ownership of a record unless another owner holds an unexpired claim."""
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO claims (kind, id, owner, expires) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (kind, id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE claims.owner = excluded.owner OR claims.expires < ?",
+                (kind, record_id, owner, now + ttl_s, now),
+            )
+        return cursor.rowcount == 1
+
+    def renew_claims(self, owner: str, ttl_s: float) -> int:
+        with self.transaction() as conn:
+            cursor = conn.execute("UPDATE claims SET expires = ? WHERE owner = ?", (time.time() + ttl_s, owner))
+        return cursor.rowcount
+
+    def release(self, kind: str, record_id: str, owner: str) -> None:
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM claims WHERE kind = ? AND id = ? AND owner = ?", (kind, record_id, owner))
+
+    def unclaimed(self, kind: str, status: str) -> list[str]:
+        """Ids of records in ``status`` that nobody holds a live claim on."""
+        rows = self.query(
+            "SELECT r.id FROM records r LEFT JOIN claims c ON c.kind = r.kind AND c.id = r.id "
+            "WHERE r.kind = ? AND r.status = ? AND (c.id IS NULL OR c.expires < ?) ORDER BY r.created_at",
+            (kind, status, time.time()),
+        )
+        return [row[0] for row in rows]
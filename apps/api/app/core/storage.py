@@ -20,6 +20,10 @@ def shares_file() -> Path:
     return ensure_dir(DATA_DIR).joinpath("shares.json")
 
 
+def analytics_db() -> Path:
+    return ensure_dir(DATA_DIR).joinpath("analytics.db")
+
+
 def job_dir(job_id: str) -> Path:
     return ensure_dir(jobs_root() / job_id)
 
@@ -32,10 +36,18 @@ def input_dir(job_id: str) -> Path:
     return ensure_dir(job_dir(job_id) / "input")
 
 
+def upload_file(job_id: str) -> Path:
+    return job_dir(job_id) / "upload.json"
+
+
 def artifacts_dir(job_id: str) -> Path:
     return ensure_dir(job_dir(job_id) / "artifacts")
 
 
+def clips_dir(job_id: str) -> Path:
+    return ensure_dir(job_dir(job_id) / "clips")
+
+
 def exports_dir(job_id: str) -> Path:
     return ensure_dir(job_dir(job_id) / "exports")
 
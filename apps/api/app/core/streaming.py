@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from .calibration import field_transform
+from .records import iter_track_frames, read_track_header
+from .schemas import JobConfig
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+TRACK_COLUMNS = ("frame", "time_s", "id", "label", "team", "x", "y", "w", "h", "confidence")
+POSITION_COLUMNS = ("frame", "time_s", "id", "label", "team", "x", "y", "field_x", "field_y", "speed_mps")
+EVENT_COLUMNS = ("id", "type", "start", "end", "frame", "confidence", "involved", "explanation")
+# Rows encoded per chunk handed to the response; keeps syscalls few and memory flat.
+FLUSH_ROWS = 500
+
+
+@dataclass(frozen=True)
+class RowFilter:
+    """Frame range (inclusive) plus optional id, label, team and event-type allow-lists."""
+
+    start_frame: int = 0
+    end_frame: Optional[int] = None
+    ids: Optional[frozenset[str]] = None
+    labels: Optional[frozenset[str]] = None
+    teams: Optional[frozenset[str]] = None
+    types: Optional[frozenset[str]] = None
+
+    @staticmethod
+    def values(raw: Optional[str]) -> Optional[frozenset[str]]:
+        """Parse a comma-separated query value; empty means no filter."""
+        items = frozenset(part.strip() for part in (raw or "").split(",") if part.strip())
+        return items or None
+
+    def frame_in_range(self, frame: int) -> bool:
+        return frame >= self.start_frame and (self.end_frame is None or frame <= self.end_frame)
+
+    def accepts(self, obj: dict[str, Any]) -> bool:
+        return (
+            (self.ids is None or obj.get("id") in self.ids)
+            and (self.labels is None or obj.get("label") in self.labels)
+            and (self.teams is None or obj.get("team") in self.teams)
+        )
+
+
+def track_rows(path: Path, flt: RowFilter) -> Iterator[dict[str, Any]]:
+    """One row per object per frame, straight from tracks.json."""
+    fps = float(read_track_header(path)["meta"].get("fps") or 25.0)
+    for frame in iter_track_frames(path, flt.start_frame, flt.end_frame):
+        index = frame["frame"]
+        for obj in frame["objects"]:
+            if not flt.accepts(obj):
+                continue
+            x, y, w, h = obj["bbox"]
+            yield {
+                "frame": index,
+                "time_s": round(index / fps, 3),
+                "id": obj["id"],
+                "label": obj["label"],
+                "team": obj.get("team"),
+                "x": x,
+                "y": y,
+                "w": w,
+                "h": h,
+                "confidence": obj.get("confidence"),
+            }
+
+
+def position_rows(path: Path, config: JobConfig, flt: RowFilter) -> Iterator[dict[str, Any]]:
+    """Per-frame box centers in image and field coordinates.
+
+    Speed is the field distance to the object's previous observation divided
+    by the elapsed time, so only the last position per object is held.
+    """
+    meta = read_track_header(path)["meta"]
+    fps = float(meta.get("fps") or 25.0)
+    transform = field_transform(config, meta.get("width") or 1.0, meta.get("height") or 1.0)
+    last: dict[str, tuple[int, float, float]] = {}
+    for frame in iter_track_frames(path, flt.start_frame, flt.end_frame):
+        index = frame["frame"]
+        for obj in frame["objects"]:
+            if not flt.accepts(obj):
+                continue
+            x, y, w, h = obj["bbox"]
+            cx, cy = x + w / 2, y + h / 2
+            field_x, field_y = transform.map_point(cx, cy)
+            previous = last.get(obj["id"])
+            speed = None
+            if previous is not None and index > previous[0]:
+                speed = math.hypot(field_x - previous[1], field_y - previous[2]) * fps / (index - previous[0])
+            last[obj["id"]] = (index, field_x, field_y)
+            yield {
+                "frame": index,
+                "time_s": round(index / fps, 3),
+                "id": obj["id"],
+                "label": obj["label"],
+                "team": obj.get("team"),
+                "x": round(cx, 2),
+                "y": round(cy, 2),
+                "field_x": round(field_x, 3),
+                "field_y": round(field_y, 3),
+                "speed_mps": None if speed is None else round(speed, 3),
+            }
+
+
+def event_rows(path: Path, flt: RowFilter) -> Iterator[dict[str, Any]]:
+    """Events in the frame range, filtered by type and by involved object ids."""
+    with path.open("rb") as handle:
+        events = json.load(handle).get("events", [])
+    for event in events:
+        if event.get("frame") is not None and not flt.frame_in_range(event["frame"]):
+            continue
+        if flt.types is not None and event.get("type") not in flt.types:
+            continue
+        if flt.ids is not None and not flt.ids.intersection(event.get("involved") or ()):
+            continue
+        yield event
+
+
+def encode(rows: Iterable[dict[str, Any]], fmt: str, columns: tuple[str, ...]) -> Iterator[bytes]:
+    """Encode rows as CSV (with header) or NDJSON, FLUSH_ROWS rows per chunk."""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow([_cell(row.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(row, default=str, separators=(",", ":")))
+            buffer.write("\n")
+        pending += 1
+        if pending >= FLUSH_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ";".join(str(item) for item in value)
+    return value
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from .records import TrackTable
+from .schemas import JobConfig
+
+MotionModel = Literal["random_walk", "formation"]
+PossessionModel = Literal["random", "team"]
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    profile: str = "soccer"
+    frame_count: int = 250
+    fps: int = 25
+    width: int = 1280
+    height: int = 720
+    player_count: int = 20
+    motion: MotionModel = "random_walk"
+    possession: PossessionModel = "random"
+    seed: int = 0
+
+    @classmethod
+    def from_config(cls, config: JobConfig, seed: int, **overrides: Any) -> "SyntheticSpec":
+        """Build a spec from profile defaults and optional ``synthetic_*`` thresholds.
+
+        ``synthetic_duration_s`` (or ``synthetic_frames``), ``synthetic_fps``,
+        ``synthetic_players``, ``synthetic_width`` and ``synthetic_height`` let
+        load tests request match-scale jobs through the regular job API.
+        Thresholds are numeric, so ``synthetic_formation`` and
+        ``synthetic_team_possession`` set to 1 select the non-default models.
+        """
+        profile = config.profile.value
+        thresholds = config.thresholds
+        fps = int(thresholds.get("synthetic_fps", 25))
+        frame_count = int(thresholds.get("synthetic_frames", 250))
+        if "synthetic_duration_s" in thresholds:
+            frame_count = int(thresholds["synthetic_duration_s"] * fps)
+        values: dict[str, Any] = {
+            "profile": profile,
+            "frame_count": max(frame_count, 1),
+            "fps": fps,
+            "width": int(thresholds.get("synthetic_width", 1280)),
+            "height": int(thresholds.get("synthetic_height", 720)),
+            "player_count": int(thresholds.get("synthetic_players", 20 if profile == "soccer" else 10)),
+            "motion": "formation" if thresholds.get("synthetic_formation") else "random_walk",
+            "possession": "team" if thresholds.get("synthetic_team_possession") else "random",
+            "seed": seed,
+        }
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**values)
+
+
+def _random_walk(spec: SyntheticSpec, rng: random.Random, scale: float) -> tuple[list[float], list[float]]:
+    width, height, frames = spec.width, spec.height, spec.frame_count
+    margin = 60 * scale
+    low_x, high_x = margin, width - margin
+    low_y, high_y = margin, height - margin
+    x = rng.uniform(200 * scale, width - 200 * scale)
+    y = rng.uniform(100 * scale, height - 100 * scale)
+    vx = rng.uniform(-2.5, 2.5) * scale
+    vy = rng.uniform(-2.0, 2.0) * scale
+    jitter_x = 0.6 * scale
+    jitter_y = 0.5 * scale
+    uniform = rng.uniform
+    xs = [0.0] * frames
+    ys = [0.0] * frames
+    for idx in range(frames):
+        x = min(max(x + vx + uniform(-jitter_x, jitter_x), low_x), high_x)
+        y = min(max(y + vy + uniform(-jitter_y, jitter_y), low_y), high_y)
+        xs[idx] = x
+        ys[idx] = y
+    return xs, ys
+
+
+def _formation(
+    spec: SyntheticSpec,
+    rng: random.Random,
+    scale: float,
+    slot: int,
+    slots: int,
+    left_side: bool,
+) -> tuple[list[float], list[float]]:
+    """Mean-reverting motion around a formation anchor that drifts with play."""
+    width, height, frames, fps = spec.width, spec.height, spec.frame_count, spec.fps
+    columns = max(1, math.ceil(math.sqrt(slots)))
+    row, column = divmod(slot, columns)
+    rows = max(1, math.ceil(slots / columns))
+    half = width / 2
+    anchor_x = (column + 0.5) / columns * (half - 120 * scale) + (60 * scale if left_side else half + 60 * scale)
+    anchor_y = (row + 0.5) / rows * (height - 120 * scale) + 60 * scale
+    # Whole-team push up and down the pitch with a period of about a minute.
+    phase = rng.uniform(0, 2 * math.pi)
+    drift = 0.15 * width
+    omega = 2 * math.pi / (60 * fps)
+    pull = 0.04
+    noise = 1.8 * scale
+    gauss = rng.gauss
+    x, y = anchor_x, anchor_y
+    vx = vy = 0.0
+    xs = [0.0] * frames
+    ys = [0.0] * frames
+    for idx in range(frames):
+        target_x = anchor_x + drift * math.sin(omega * idx + phase)
+        vx = 0.85 * vx + pull * (target_x - x) + gauss(0, noise)
+        vy = 0.85 * vy + pull * (anchor_y - y) + gauss(0, noise)
+        x = min(max(x + vx, 0.0), width)
+        y = min(max(y + vy, 0.0), height)
+        xs[idx] = x
+        ys[idx] = y
+    return xs, ys
+
+
+def _owners(spec: SyntheticSpec, rng: random.Random, teams: list[str]) -> list[int]:
+    owner = rng.randrange(spec.player_count)
+    owners = [0] * spec.frame_count
+    timer = 0
+    for idx in range(spec.frame_count):
+        timer += 1
+        if timer > rng.randint(20, 45):
+            if spec.possession == "team" and rng.random() < 0.8:
+                mates = [p for p, team in enumerate(teams) if team == teams[owner] and p != owner]
+                owner = rng.choice(mates) if mates else rng.randrange(spec.player_count)
+            else:
+                owner = rng.randrange(spec.player_count)
+            timer = 0
+        owners[idx] = owner
+    return owners
+
+
+def generate_synthetic(spec: SyntheticSpec) -> tuple[TrackTable, dict[str, Any]]:
+    """Generate tracks and series for ``spec``.
+
+    Motion is simulated one player column at a time and frames are assembled
+    afterwards, so the per-frame loop only appends to the track table.
+    """
+    rng = random.Random(spec.seed)
+    scale = spec.height / 720
+    base_w, base_h = (32, 64) if spec.profile == "soccer" else (36, 72)
+    bbox_w = round(base_w * scale, 2)
+    bbox_h = round(base_h * scale, 2)
+    ball_size = round(16 * scale, 2)
+
+    ids = [f"p{idx + 1}" for idx in range(spec.player_count)]
+    teams = ["A" if idx < spec.player_count / 2 else "B" for idx in range(spec.player_count)]
+    columns: list[tuple[list[float], list[float]]] = []
+    team_sizes = {"A": teams.count("A"), "B": teams.count("B")}
+    for idx, team in enumerate(teams):
+        if spec.motion == "formation":
+            slot = idx if team == "A" else idx - team_sizes["A"]
+            columns.append(_formation(spec, rng, scale, slot, team_sizes[team], team == "A"))
+        else:
+            columns.append(_random_walk(spec, rng, scale))
+
+    owners = _owners(spec, rng, teams)
+    spread = 18 * scale
+    uniform = rng.uniform
+    ball_positions: list[tuple[float, float]] = []
+    for idx, owner in enumerate(owners):
+        xs, ys = columns[owner]
+        ball_positions.append((xs[idx] + uniform(-spread, spread), ys[idx] + uniform(-spread, spread)))
+
+    half_w = bbox_w / 2
+    half_h = bbox_h / 2
+    half_ball = ball_size / 2
+    tracks = TrackTable({
+        "profile": spec.profile,
+        "fps": spec.fps,
+        "frame_count": spec.frame_count,
+        "width": spec.width,
+        "height": spec.height,
+    })
+    tracks.tracks = [{"id": ids[p], "label": "player", "team": teams[p]} for p in range(spec.player_count)]
+    add = tracks.add
+    for idx in range(spec.frame_count):
+        tracks.start_frame()
+        for p, (xs, ys) in enumerate(columns):
+            add(ids[p], "player", teams[p], xs[idx] - half_w, ys[idx] - half_h, bbox_w, bbox_h, uniform(0.82, 0.98))
+        ball_x, ball_y = ball_positions[idx]
+        add("ball", "ball", None, ball_x - half_ball, ball_y - half_ball, ball_size, ball_size, uniform(0.7, 0.95))
+
+    series = {
+        "player_positions": {ids[p]: list(zip(xs, ys)) for p, (xs, ys) in enumerate(columns)},
+        "ball_positions": ball_positions,
+        "owner_by_frame": [ids[owner] for owner in owners],
+        "teams": dict(zip(ids, teams)),
+        "fps": spec.fps,
+        "width": spec.width,
+        "height": spec.height,
+    }
+    return tracks, series
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Mapping, Optional, Sequence
+
+TEAMS = ("A", "B")
+MAX_ITERATIONS = 25
+
+
+def _distance(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum((x - y) ** 2 for x, y in zip(a, b))
+
+
+def _mean(vectors: list[Sequence[float]]) -> list[float]:
+    return [sum(values) / len(vectors) for values in zip(*vectors)]
+
+
+def kmeans(vectors: list[Sequence[float]], k: int) -> list[int]:
+    """Deterministic k-means with farthest-point seeding; returns a cluster per vector."""
+    if not vectors:
+        return []
+    k = min(k, len(vectors))
+    center = _mean(vectors)
+    centroids = [list(max(vectors, key=lambda vector: _distance(vector, center)))]
+    while len(centroids) < k:
+        centroids.append(list(max(vectors, key=lambda vector: min(_distance(vector, c) for c in centroids))))
+
+    labels = [-1] * len(vectors)
+    for _ in range(MAX_ITERATIONS):
+        changed = False
+        for idx, vector in enumerate(vectors):
+            best = min(range(k), key=lambda cluster: _distance(vector, centroids[cluster]))
+            if best != labels[idx]:
+                labels[idx] = best
+                changed = True
+        if not changed:
+            break
+        for cluster in range(k):
+            members = [vector for vector, label in zip(vectors, labels) if label == cluster]
+            if members:
+                centroids[cluster] = _mean(members)
+    return labels
+
+
+def classify_teams(
+    features: Mapping[str, Sequence[float]],
+    anchors: Optional[Mapping[str, float]] = None,
+) -> dict[str, str]:
+    """Split tracks into two teams by clustering their jersey colour features.
+
+    Runs once per track rather than per frame. Cluster names are stable across
+    runs: with ``anchors`` (e.g. mean field x per track) the cluster further
+    left is team A, otherwise the larger cluster is.
+    """
+    track_ids = [track_id for track_id, feature in features.items() if feature]
+    if len(track_ids) < 2:
+        return {track_id: TEAMS[0] for track_id in track_ids}
+    labels = kmeans([features[track_id] for track_id in track_ids], 2)
+
+    def order(cluster: int) -> tuple[float, int]:
+        members = [track_id for track_id, label in zip(track_ids, labels) if label == cluster]
+        if anchors:
+            placed = [anchors[track_id] for track_id in members if track_id in anchors]
+            if placed:
+                return sum(placed) / len(placed), -len(members)
+        return 0.0, -len(members)
+
+    ranked = sorted(set(labels), key=order)
+    names = {cluster: TEAMS[rank] for rank, cluster in enumerate(ranked)}
+    return {track_id: names[label] for track_id, label in zip(track_ids, labels)}
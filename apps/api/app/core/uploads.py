@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+from uuid import uuid4
+
+import aiofiles
+
+from .config import UPLOAD_STALL_S
+from .schemas import UploadSession
+from .state import SqliteState
+from .storage import input_dir, load_json, save_json, upload_file
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+HASH_READ_CHUNK = 4 * 1024 * 1024
+# With shared state, progress made by other processes is only seen by polling.
+SHARED_POLL_S = 0.25
+
+
+class UploadBodyError(ValueError):
+    """A request body that disagrees with the sizes the client declared (a client error, not an offset conflict)."""
+
+    status_code = 400
+
+
+class UploadTooLarge(UploadBodyError):
+    status_code = 413
+
+
+def parse_content_range(value: str) -> tuple[int, int, Optional[int]]:
+    """Parse ``bytes start-end/total`` into (start, end inclusive, total)."""
+    match = CONTENT_RANGE.match(value.strip())
+    if not match:
+        raise ValueError(f"invalid Content-Range: {value}")
+    start, end = int(match.group(1)), int(match.group(2))
+    total = None if match.group(3) == "*" else int(match.group(3))
+    if end < start:
+        raise ValueError(f"invalid Content-Range: {value}")
+    return start, end, total
+
+
+class UploadStore:
+    """Resumable uploads written straight into a job's input directory.
+
+    Each session tracks the committed byte offset and a running SHA-256. If a
+    request drops mid-body, the bytes that arrived stay committed and the
+    client resumes from the reported offset.
+
+    With a shared SqliteState the session record lives there, so chunks of one
+    upload may land on different API processes. Writers then also hold an
+    exclusive ``flock`` on the upload file while appending.
+
+    Locks, hashers and reader wake-ups only live while an upload is in
+    flight: they are dropped once it completes and its last reader closes.
+    Completed sessions are then read back from their upload.json.
+    """
+
+    def __init__(self, data_dir: Path, state: Optional[SqliteState] = None):
+        self.data_dir = data_dir
+        self.state = state
+        self.sessions: dict[str, UploadSession] = {}
+        self._hashers: dict[str, Any] = {}
+        # Offset each running hash has consumed; another process may have moved on since.
+        self._hashed: dict[str, int] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        # Readers wait on these from worker threads; appends notify after each chunk.
+        self._progress: dict[str, threading.Condition] = {}
+        self._done: dict[str, asyncio.Event] = {}
+        self._readers: dict[str, int] = {}
+        self._registry = threading.Lock()
+        # Job of each completed upload, to find its upload.json without a live session.
+        self._completed: dict[str, str] = {}
+
+    async def load(self) -> None:
+        jobs_root = self.data_dir / "jobs"
+        if not jobs_root.exists():
+            return
+        sessions = [UploadSession.model_validate(load_json(path)) for path in jobs_root.glob("*/upload.json")]
+        if self.state is not None:
+            self.state.import_records(
+                "upload",
+                ((item.id, item.model_dump(mode="json"), None, item.created_at.isoformat()) for item in sessions),
+            )
+            return
+        for session in sessions:
+            if session.completed:
+                self._completed[session.id] = session.job_id
+            else:
+                self.sessions[session.id] = session
+
+    async def save(self, session: UploadSession) -> None:
+        save_json(upload_file(session.job_id), session.model_dump())
+        if self.state is not None:
+            self.state.put("upload", session.id, session.model_dump(mode="json"), created_at=session.created_at.isoformat())
+
+    def _load(self, upload_id: str) -> Optional[UploadSession]:
+        """Current session: the shared record when there is one, else this process's copy."""
+        if self.state is None:
+            session = self.sessions.get(upload_id)
+            if session is None and upload_id in self._completed:
+                session = UploadSession.model_validate(load_json(upload_file(self._completed[upload_id])))
+            return session
+        payload = self.state.get("upload", upload_id)
+        return UploadSession.model_validate(payload) if payload else None
+
+    async def create(
+        self,
+        job_id: str,
+        filename: str,
+        size: int,
+        content_type: Optional[str],
+        pipelined: bool = False,
+    ) -> UploadSession:
+        now = datetime.now(timezone.utc)
+        path = input_dir(job_id) / Path(filename).name
+        path.touch()
+        session = UploadSession(
+            id=uuid4().hex,
+            job_id=job_id,
+            filename=Path(filename).name,
+            content_type=content_type,
+            path=str(path),
+            size=size,
+            pipelined=pipelined,
+            created_at=now,
+            updated_at=now,
+        )
+        if self.state is None:
+            self.sessions[session.id] = session
+        self._hashers[session.id] = hashlib.sha256()
+        self._hashed[session.id] = 0
+        if size == 0:
+            self._complete(session)
+        await self.save(session)
+        if session.completed:
+            self._release(session)
+        return session
+
+    async def get(self, upload_id: str) -> Optional[UploadSession]:
+        return self._load(upload_id)
+
+    def _hasher(self, session: UploadSession) -> Any:
+        hasher = self._hashers.get(session.id)
+        if hasher is None or self._hashed.get(session.id) != session.offset:
+            # Hash state is not persisted; after a restart, or when another process
+            # appended since, re-read the committed prefix once.
+            hasher = hashlib.sha256()
+            remaining = session.offset
+            with open(session.path, "rb") as handle:
+                while remaining > 0:
+                    block = handle.read(min(HASH_READ_CHUNK, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+            self._hashers[session.id] = hasher
+            self._hashed[session.id] = session.offset
+        return hasher
+
+    def _condition(self, upload_id: str) -> threading.Condition:
+        return self._progress.setdefault(upload_id, threading.Condition())
+
+    def _done_event(self, session: UploadSession) -> asyncio.Event:
+        event = self._done.get(session.id)
+        if event is None:
+            event = self._done[session.id] = asyncio.Event()
+            if session.completed:
+                event.set()
+        return event
+
+    def _notify(self, session: UploadSession) -> None:
+        condition = self._condition(session.id)
+        with condition:
+            condition.notify_all()
+
+    def _release(self, session: UploadSession) -> None:
+        """Drop a completed upload's in-process state unless a reader still has it open."""
+        with self._registry:
+            if self._readers.get(session.id):
+                return
+            self._locks.pop(session.id, None)
+            self._progress.pop(session.id, None)
+            self._done.pop(session.id, None)
+            self._hashers.pop(session.id, None)
+            self._hashed.pop(session.id, None)
+            if self.sessions.pop(session.id, None) is not None and self.state is None:
+                self._completed[session.id] = session.job_id
+
+    def _open_reader(self, upload_id: str) -> threading.Condition:
+        with self._registry:
+            self._readers[upload_id] = self._readers.get(upload_id, 0) + 1
+            return self._condition(upload_id)
+
+    def _close_reader(self, session: UploadSession) -> None:
+        with self._registry:
+            self._readers[session.id] -= 1
+            if self._readers[session.id] == 0:
+                del self._readers[session.id]
+        if session.completed:
+            self._release(session)
+
+    def _complete(self, session: UploadSession) -> None:
+        session.sha256 = self._hasher(session).hexdigest()
+        session.completed = True
+        self._hashers.pop(session.id, None)
+        self._hashed.pop(session.id, None)
+        self._done_event(session).set()
+        self._notify(session)
+
+    async def wait_complete(self, upload_id: str) -> UploadSession:
+        if self.state is None:
+            session = self._load(upload_id)
+            if not session.completed:
+                # The waiter keeps its event even if the upload's state is released meanwhile.
+                await self._done_event(session).wait()
+            return self._load(upload_id)
+        # The final chunk may arrive at another process; watch the shared record.
+        while True:
+            session = await asyncio.to_thread(self._load, upload_id)
+            if session.completed:
+                self._release(session)
+                return session
+            try:
+                await asyncio.wait_for(self._done_event(session).wait(), SHARED_POLL_S)
+            except asyncio.TimeoutError:
+                continue
+
+    def open_reader(self, upload_id: str, stall_timeout: float = UPLOAD_STALL_S) -> "UploadReader":
+        """Blocking reader over the committed prefix; meant for worker threads."""
+        return UploadReader(self, self._load(upload_id), stall_timeout)
+
+    async def append(
+        self,
+        upload_id: str,
+        start: int,
+        chunks: AsyncIterator[bytes],
+        length: Optional[int] = None,
+    ) -> UploadSession:
+        """Write a body starting at ``start``, which must equal the committed offset.
+
+        With ``length`` (from a Content-Range) the body must be exactly that
+        long; bytes beyond it are not written. Bytes that did arrive stay
+        committed either way, so the client can resume from the offset.
+        """
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        session = self._load(upload_id)
+        try:
+            async with lock:
+                if self.state is None:
+                    return await self._append(session, start, chunks, length)
+                import fcntl
+
+                with open(session.path, "rb") as guard:
+                    try:
+                        fcntl.flock(guard, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        raise ValueError("upload is being written by another request")
+                    try:
+                        # Re-read under the lock; another process may have appended.
+                        session = self._load(upload_id)
+                        return await self._append(session, start, chunks, length)
+                    finally:
+                        fcntl.flock(guard, fcntl.LOCK_UN)
+        finally:
+            if session.completed:
+                self._release(session)
+
+    async def _append(
+        self,
+        session: UploadSession,
+        start: int,
+        chunks: AsyncIterator[bytes],
+        length: Optional[int] = None,
+    ) -> UploadSession:
+        if session.completed:
+            raise ValueError("upload already completed")
+        if start != session.offset:
+            raise ValueError(f"offset mismatch: expected {session.offset}")
+        hasher = self._hasher(session)
+        published = time.monotonic()
+        try:
+            async with aiofiles.open(session.path, "r+b") as handle:
+                await handle.seek(session.offset)
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if session.offset + len(chunk) > session.size:
+                        raise UploadTooLarge("upload exceeds declared size")
+                    if length is not None and session.offset + len(chunk) > start + length:
+                        raise UploadBodyError(f"body is longer than the {length} bytes in Content-Range")
+                    await handle.write(chunk)
+                    hasher.update(chunk)
+                    if session.pipelined:
+                        # Readers trust the offset, so bytes must reach the file first.
+                        await handle.flush()
+                    session.offset += len(chunk)
+                    self._hashed[session.id] = session.offset
+                    if session.pipelined:
+                        self._notify(session)
+                        if self.state is not None and time.monotonic() - published > SHARED_POLL_S:
+                            # Readers in other processes only see the shared record.
+                            await self.save(session)
+                            published = time.monotonic()
+                await handle.truncate(session.offset)
+            if length is not None and session.offset != start + length:
+                raise UploadBodyError(f"body has {session.offset - start} bytes, Content-Range declares {length}")
+            if session.offset == session.size:
+                self._complete(session)
+        finally:
+            session.updated_at = datetime.now(timezone.utc)
+            await self.save(session)
+        return session
+
+
+class UploadReader(io.RawIOBase):
+    """Read an upload while it is still arriving.
+
+    ``read`` blocks until bytes past the current position are committed and
+    returns ``b""`` only once the upload is complete. A sender that goes quiet
+    for ``stall_timeout`` seconds raises TimeoutError.
+    """
+
+    def __init__(self, store: UploadStore, session: UploadSession, stall_timeout: float):
+        super().__init__()
+        self._store = store
+        self._session = session
+        self._stall_timeout = stall_timeout
+        self._handle = open(session.path, "rb")
+        self._condition = store._open_reader(session.id)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        session = self._session
+        shared = self._store.state is not None
+        deadline = time.monotonic() + self._stall_timeout
+        with self._condition:
+            while self._position >= session.offset and not session.completed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"upload {session.id} stalled at {session.offset} bytes")
+                notified = self._condition.wait(min(remaining, SHARED_POLL_S) if shared else remaining)
+                if shared:
+                    # Chunks may be committed by another process; re-read the record.
+                    session = self._session = self._store._load(session.id)
+                    notified = session.offset > self._position or session.completed
+                if notified:
+                    deadline = time.monotonic() + self._stall_timeout
+        available = session.offset - self._position
+        if available <= 0:
+            return 0
+        view = memoryview(buffer)[: min(len(buffer), available)]
+        count = self._handle.readinto(view)
+        self._position += count
+        return count
+
+    def close(self) -> None:
+        if not self.closed:
+            self._handle.close()
+            self._store._close_reader(self._session)
+        super().close()
+
+
+@dataclass(frozen=True)
+class UploadSource:
+    """Handle the pipeline uses to consume an upload that may still be arriving."""
+
+    store: UploadStore
+    upload_id: str
+
+    def open_reader(self) -> UploadReader:
+        return self.store.open_reader(self.upload_id)
+
+    async def wait_complete(self) -> UploadSession:
+        return await self.store.wait_complete(self.upload_id)
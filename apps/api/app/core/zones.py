@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterable, Mapping, Sequence
+
+from .schemas import ZoneDefinition
+from .telemetry import register_lru_cache
+
+Edge = tuple[float, float, float, float, float]
+ZoneKey = tuple[str, str, tuple[tuple[float, ...], ...]]
+
+
+@dataclass(frozen=True)
+class CompiledZone:
+    id: str
+    name: str
+    bbox: tuple[float, float, float, float]
+    # (xi, yi, yj, dx, dy) per non-horizontal edge, dy already carries the epsilon.
+    edges: tuple[Edge, ...]
+
+    def contains(self, x: float, y: float) -> bool:
+        return self.classify(((x, y),))[0]
+
+    def classify(self, points: Iterable[Sequence[float]]) -> list[bool]:
+        if not self.edges:
+            return [False for _ in points]
+        min_x, min_y, max_x, max_y = self.bbox
+        edges = self.edges
+        hits = []
+        for x, y in points:
+            if x < min_x or x > max_x or y < min_y or y > max_y:
+                hits.append(False)
+                continue
+            inside = False
+            for xi, yi, yj, dx, dy in edges:
+                if ((yi > y) != (yj > y)) and x < dx * (y - yi) / dy + xi:
+                    inside = not inside
+            hits.append(inside)
+        return hits
+
+
+def _compile(zone_id: str, name: str, polygon: tuple[tuple[float, ...], ...]) -> CompiledZone:
+    if len(polygon) < 3:
+        return CompiledZone(id=zone_id, name=name, bbox=(0.0, 0.0, 0.0, 0.0), edges=())
+    xs = [point[0] for point in polygon]
+    ys = [point[1] for point in polygon]
+    edges = []
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i][0], polygon[i][1]
+        xj, yj = polygon[j][0], polygon[j][1]
+        # Horizontal edges can never straddle a scanline, so drop them up front.
+        if yi != yj:
+            edges.append((xi, yi, yj, xj - xi, yj - yi + 1e-9))
+        j = i
+    return CompiledZone(
+        id=zone_id,
+        name=name,
+        bbox=(min(xs), min(ys), max(xs), max(ys)),
+        edges=tuple(edges),
+    )
+
+
+@lru_cache(maxsize=128)
+def _compile_all(keys: tuple[ZoneKey, ...]) -> tuple[CompiledZone, ...]:
+    return tuple(_compile(zone_id, name, polygon) for zone_id, name, polygon in keys)
+
+
+register_lru_cache("zones", _compile_all)
+
+
+def compile_zones(zones: Iterable[ZoneDefinition]) -> tuple[CompiledZone, ...]:
+    """Compile zone polygons into edge arrays with bounding boxes, cached per zone set."""
+    keys = tuple(
+        (zone.id, zone.name, tuple(tuple(point) for point in zone.polygon)) for zone in zones
+    )
+    return _compile_all(keys)
+
+
+def analyze_zones(
+    zones: Iterable[ZoneDefinition],
+    ball_positions: Sequence[Sequence[float]],
+    player_positions: Mapping[str, Sequence[Sequence[float]]],
+    fps: float,
+    first_frames: Mapping[str, int] | None = None,
+) -> dict[str, Any]:
+    """Classify ball and player positions against every zone in one pass.
+
+    Returns per-frame ball membership for event detection plus per-zone
+    dwell time and occupancy summaries. Player lists start at
+    ``first_frames[id]`` (default 0).
+    """
+    compiled = compile_zones(zones)
+    frame_count = len(ball_positions)
+    ball: dict[str, list[bool]] = {}
+    summary: dict[str, dict[str, Any]] = {}
+
+    for zone in compiled:
+        ball_hits = zone.classify(ball_positions)
+        ball[zone.id] = ball_hits
+
+        occupancy = [0] * frame_count
+        player_dwell: dict[str, float] = {}
+        for player_id, positions in player_positions.items():
+            hits = zone.classify(positions)
+            first = first_frames.get(player_id, 0) if first_frames else 0
+            inside_frames = 0
+            for idx, hit in enumerate(hits, first):
+                if hit:
+                    inside_frames += 1
+                    if idx < frame_count:
+                        occupancy[idx] += 1
+            if inside_frames:
+                player_dwell[player_id] = round(inside_frames / fps, 2)
+
+        peak = max(occupancy) if occupancy else 0
+        summary[zone.id] = {
+            "name": zone.name,
+            "ball_frames": sum(ball_hits),
+            "ball_dwell_s": round(sum(ball_hits) / fps, 2),
+            "player_dwell_s": player_dwell,
+            "avg_occupancy": round(sum(occupancy) / frame_count, 2) if frame_count else 0.0,
+            "max_occupancy": peak,
+            "peak_frame": occupancy.index(peak) if peak else None,
+        }
+
+    return {"ball": ball, "summary": summary}
@@ -8,17 +8,24 @@ from pathlib import Path
 from typing import Optional
 
 import aiofiles
-from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 
-from .core.config import DATA_DIR, DEFAULT_PROFILE
+from .core.config import DATA_DIR, DEFAULT_PROFILE, JOB_EXECUTOR, STATE_BACKEND
+from .core.analytics import open_index
 from .core.auth import require_api_key
 from .core.jobs import JobStore
-from .core.pipeline import recompute_analytics
-from .core.schemas import JobConfig, JobConfigUpdate, JobStatus, StreamJobRequest, InputAsset
+from .core.lod import MAX_FRAMES, tracks_window
+from .core.pipeline import index_analytics, recompute_analytics
+from .core.queue import JobQueue
+from .core.schemas import JobConfig, JobConfigUpdate, JobStatus, StreamJobRequest, InputAsset, UploadCreateRequest, UploadSession
 from .core.shares import ShareStore
+from .core.state import SqliteState
 from .core.storage import artifacts_dir, input_dir, job_file, load_json, save_json, shares_file
+from .core.streaming import EVENT_COLUMNS, MEDIA_TYPES, POSITION_COLUMNS, TRACK_COLUMNS, RowFilter, encode, event_rows, position_rows, track_rows
+from .core.telemetry import REGISTRY, MetricsMiddleware, monitor_event_loop
+from .core.uploads import UploadBodyError, UploadSource, UploadStore, parse_content_range
 
 
 def _apply_config_updates(config: JobConfig, updates: dict) -> JobConfig:
@@ -29,23 +36,49 @@ def _apply_config_updates(config: JobConfig, updates: dict) -> JobConfig:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    store = JobStore(DATA_DIR)
+    # "sqlite" lets several API processes (e.g. uvicorn --workers N) serve the same jobs.
+    state = SqliteState(DATA_DIR / "state.db") if STATE_BACKEND == "sqlite" else None
+    if JOB_EXECUTOR == "queue" and state is None:
+        raise RuntimeError("VAP_JOB_EXECUTOR=queue requires VAP_STATE_BACKEND=sqlite")
+    queue = JobQueue(state) if JOB_EXECUTOR == "queue" else None
+    store = JobStore(DATA_DIR, state, queue)
     await store.load_from_disk()
     app.state.store = store
-    share_store = ShareStore(shares_file())
+    share_store = ShareStore(shares_file(), state)
     await share_store.load()
     app.state.share_store = share_store
+    upload_store = UploadStore(DATA_DIR, state)
+    await upload_store.load()
+    app.state.upload_store = upload_store
+    await store.resume_interrupted(upload_store)
+    REGISTRY.collected("vap_jobs", "Jobs known to this process by status.", store.status_counts)
+    REGISTRY.collected("vap_queue_depth", "Jobs created but not yet started.", lambda: [({}, store.queue_depth())])
+    REGISTRY.collected("vap_jobs_running", "Pipeline tasks running in this process.", lambda: [({}, len(store.worker_tasks))])
+    REGISTRY.collected("vap_sse_subscribers", "Open SSE subscriber queues.", store.subscriber_counts)
+    if queue is not None:
+        REGISTRY.collected(
+            "vap_work_queue", "Durable queue entries by state.", lambda: [({"state": k}, v) for k, v in queue.counts().items()]
+        )
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    follower = asyncio.create_task(store.follow_events()) if state is not None else None
+    claims = asyncio.create_task(store.watch_claims(upload_store)) if store.claims_jobs else None
     yield
+    loop_monitor.cancel()
+    for task in (follower, claims):
+        if task is not None:
+            task.cancel()
 
 
 app = FastAPI(title="Vision Analytics Platform API", version="0.1.0", lifespan=lifespan)
 
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Upload-Offset", "Upload-Length", "Location"],
 )
 
 
@@ -54,6 +87,11 @@ async def health():
     return {"status": "ok", "time": datetime.now(timezone.utc).isoformat()}
 
 
+@app.get("/api/metrics")
+async def metrics(_: None = Depends(require_api_key)):
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/api/jobs")
 async def list_jobs(_: None = Depends(require_api_key)):
     store: JobStore = app.state.store
@@ -118,6 +156,115 @@ async def create_job(
     return job.model_dump()
 
 
+def _upload_headers(session: UploadSession) -> dict[str, str]:
+    return {"Upload-Offset": str(session.offset), "Upload-Length": str(session.size)}
+
+
+async def _get_upload(upload_id: str) -> UploadSession:
+    upload_store: UploadStore = app.state.upload_store
+    session = await upload_store.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="upload not found")
+    return session
+
+
+async def _sync_upload_job(session: UploadSession) -> None:
+    """Publish upload progress on the job and start it once the last byte lands."""
+    store: JobStore = app.state.store
+    job = await store.get_job(session.job_id)
+    job.summary["upload"] = {"id": session.id, "offset": session.offset, "size": session.size}
+    if session.completed:
+        job.summary["upload"]["sha256"] = session.sha256
+    job.updated_at = datetime.now(timezone.utc)
+    if session.pipelined:
+        # The pipeline owns stage and progress once it has started. With shared
+        # state it may run in another process, whose copy of the job would race ours.
+        if store.owns(job.id):
+            await store.update_job(job)
+        return
+    if session.completed and job.status == JobStatus.queued and not job.input:
+        job.input = InputAsset(filename=session.filename, content_type=session.content_type, path=session.path)
+        await store.update_job(job)
+        store.start_job(job.id, Path(session.path))
+        return
+    if not session.completed:
+        job.stage = "upload"
+        job.progress = round(0.1 * session.offset / session.size, 3) if session.size else 0.0
+    await store.update_job(job)
+
+
+@app.post("/api/uploads")
+async def create_upload(payload: UploadCreateRequest, _: None = Depends(require_api_key)):
+    store: JobStore = app.state.store
+    upload_store: UploadStore = app.state.upload_store
+    job = await store.create_job(payload.config or JobConfig(profile=DEFAULT_PROFILE))
+    session = await upload_store.create(
+        job.id, payload.filename, payload.size, payload.content_type, pipelined=payload.pipelined
+    )
+    await _sync_upload_job(session)
+    if session.pipelined:
+        job = await store.get_job(job.id)
+        job.input = InputAsset(filename=session.filename, content_type=session.content_type, path=session.path)
+        await store.update_job(job)
+        store.start_job(job.id, Path(session.path), UploadSource(upload_store, session.id))
+    headers = {**_upload_headers(session), "Location": f"/api/uploads/{session.id}"}
+    return JSONResponse(session.model_dump(mode="json"), status_code=201, headers=headers)
+
+
+@app.head("/api/uploads/{upload_id}")
+async def head_upload(upload_id: str, _: None = Depends(require_api_key)):
+    session = await _get_upload(upload_id)
+    return Response(status_code=200, headers={**_upload_headers(session), "Cache-Control": "no-store"})
+
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str, _: None = Depends(require_api_key)):
+    session = await _get_upload(upload_id)
+    return JSONResponse(session.model_dump(mode="json"), headers=_upload_headers(session))
+
+
+@app.patch("/api/uploads/{upload_id}")
+async def append_upload(
+    upload_id: str,
+    request: Request,
+    content_range: Optional[str] = Header(default=None),
+    upload_offset: Optional[int] = Header(default=None),
+    _: None = Depends(require_api_key),
+):
+    upload_store: UploadStore = app.state.upload_store
+    session = await _get_upload(upload_id)
+
+    length = None
+    if content_range is not None:
+        try:
+            start, end, total = parse_content_range(content_range)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        if total is not None and total != session.size:
+            raise HTTPException(status_code=400, detail="Content-Range total does not match upload size")
+        length = end - start + 1
+        declared = request.headers.get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) != length:
+            detail = f"body has {declared} bytes, Content-Range declares {length}"
+            return JSONResponse({"detail": detail, "offset": session.offset}, status_code=400, headers=_upload_headers(session))
+    elif upload_offset is not None:
+        start = upload_offset
+    else:
+        raise HTTPException(status_code=400, detail="Content-Range or Upload-Offset header required")
+
+    try:
+        session = await upload_store.append(upload_id, start, request.stream(), length)
+    except ValueError as exc:
+        # Bytes that arrived before the error stay committed; report where to resume.
+        session = await _get_upload(upload_id)
+        status_code = exc.status_code if isinstance(exc, UploadBodyError) else 409
+        return JSONResponse({"detail": str(exc), "offset": session.offset}, status_code=status_code, headers=_upload_headers(session))
+    finally:
+        await _sync_upload_job(session)
+
+    return JSONResponse(session.model_dump(mode="json"), headers=_upload_headers(session))
+
+
 @app.get("/api/jobs/{job_id}")
 async def get_job(job_id: str, _: None = Depends(require_api_key)):
     store: JobStore = app.state.store
@@ -170,12 +317,39 @@ async def get_input(job_id: str, _: None = Depends(require_api_key)):
     return FileResponse(job.input.path, media_type=job.input.content_type, filename=job.input.filename)
 
 
-@app.get("/api/jobs/{job_id}/tracks")
-async def get_tracks(job_id: str, _: None = Depends(require_api_key)):
+async def _tracks_response(
+    job_id: str,
+    start_s: Optional[float],
+    end_s: Optional[float],
+    lod: Optional[str],
+    max_frames: int,
+) -> Response:
     path = artifacts_dir(job_id) / "tracks.json"
     if not path.exists():
         raise HTTPException(status_code=404, detail="tracks not available")
-    return JSONResponse(load_json(path))
+    if lod is None and start_s is None and end_s is None:
+        return FileResponse(path, media_type="application/json")
+    try:
+        payload = await asyncio.to_thread(
+            tracks_window, artifacts_dir(job_id), start_s or 0.0, end_s, lod or "auto", max_frames
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="level of detail not available")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return JSONResponse(payload)
+
+
+@app.get("/api/jobs/{job_id}/tracks")
+async def get_tracks(
+    job_id: str,
+    start_s: Optional[float] = Query(None, ge=0),
+    end_s: Optional[float] = Query(None, ge=0),
+    lod: Optional[str] = None,
+    max_frames: int = Query(MAX_FRAMES, ge=1),
+    _: None = Depends(require_api_key),
+):
+    return await _tracks_response(job_id, start_s, end_s, lod, max_frames)
 
 
 @app.get("/api/jobs/{job_id}/metrics")
@@ -202,6 +376,19 @@ async def get_manifest(job_id: str, _: None = Depends(require_api_key)):
     return JSONResponse(load_json(path))
 
 
+@app.get("/api/jobs/{job_id}/timings")
+async def get_timings(job_id: str, _: None = Depends(require_api_key)):
+    store: JobStore = app.state.store
+    try:
+        job = await store.get_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="job not found")
+    timings = job.summary.get("timings")
+    if not timings:
+        raise HTTPException(status_code=404, detail="timings not available")
+    return timings
+
+
 @app.get("/api/jobs/{job_id}/artifacts/{artifact_name}")
 async def download_artifact(job_id: str, artifact_name: str, _: None = Depends(require_api_key)):
     job_manifest_path = artifacts_dir(job_id) / "manifest.json"
@@ -216,6 +403,58 @@ async def download_artifact(job_id: str, artifact_name: str, _: None = Depends(r
     raise HTTPException(status_code=404, detail="artifact not found")
 
 
+@app.get("/api/jobs/{job_id}/stream/{dataset}")
+async def stream_export(
+    job_id: str,
+    dataset: str,
+    fmt: str = Query("ndjson", alias="format"),
+    start_frame: int = Query(0, ge=0),
+    end_frame: Optional[int] = Query(None, ge=0),
+    ids: Optional[str] = None,
+    labels: Optional[str] = None,
+    teams: Optional[str] = None,
+    types: Optional[str] = None,
+    _: None = Depends(require_api_key),
+):
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(MEDIA_TYPES)}")
+    flt = RowFilter(
+        start_frame=start_frame,
+        end_frame=end_frame,
+        ids=RowFilter.values(ids),
+        labels=RowFilter.values(labels),
+        teams=RowFilter.values(teams),
+        types=RowFilter.values(types),
+    )
+    if dataset == "events":
+        path = artifacts_dir(job_id) / "events.json"
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="events not available")
+        rows, columns = event_rows(path, flt), EVENT_COLUMNS
+    elif dataset in ("tracks", "positions"):
+        path = artifacts_dir(job_id) / "tracks.json"
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="tracks not available")
+        if dataset == "tracks":
+            rows, columns = track_rows(path, flt), TRACK_COLUMNS
+        else:
+            store: JobStore = app.state.store
+            try:
+                job = await store.get_job(job_id)
+            except KeyError:
+                raise HTTPException(status_code=404, detail="job not found")
+            rows, columns = position_rows(path, job.config, flt), POSITION_COLUMNS
+    else:
+        raise HTTPException(status_code=404, detail="unknown export")
+
+    # A sync iterator: Starlette pulls each chunk in a worker thread, off the event loop.
+    return StreamingResponse(
+        encode(rows, fmt, columns),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{job_id}_{dataset}.{fmt}"'},
+    )
+
+
 @app.post("/api/jobs/{job_id}/rerun")
 async def rerun_analytics(job_id: str, payload: Optional[JobConfigUpdate] = None, _: None = Depends(require_api_key)):
     store: JobStore = app.state.store
@@ -240,10 +479,19 @@ async def rerun_analytics(job_id: str, payload: Optional[JobConfigUpdate] = None
     await store.update_job(job)
 
     series = load_json(series_path)
-    items, metrics, events = recompute_analytics(job.id, job.config, series)
-    job.manifest.items = [item for item in job.manifest.items if item.name not in {"metrics", "events", "events_csv", "summary_csv", "report_html"}] + items
+    input_path = Path(job.input.path) if job.input else None
+    items, metrics, events, summary = await asyncio.to_thread(recompute_analytics, job.id, job.config, series, input_path)
+    replaced = {item.name for item in items}
+    # Clips for events that disappeared are deleted by the rerun; drop them from the manifest too.
+    job.manifest.items = [
+        item for item in job.manifest.items if item.name not in replaced and Path(item.path).exists()
+    ] + items
     job.summary["metrics"] = metrics["summary"]
     job.summary["events"] = len(events)
+    for key in ("export_warning", "clip_warning"):
+        job.summary.pop(key, None)
+    job.summary.update(summary)
+    job.summary.update(await asyncio.to_thread(index_analytics, job, metrics, events))
     job.status = JobStatus.completed
     job.stage = "completed"
     job.progress = 1.0
@@ -255,6 +503,50 @@ async def rerun_analytics(job_id: str, payload: Optional[JobConfigUpdate] = None
     return job.model_dump()
 
 
+@app.get("/api/analytics")
+async def analytics_summary(_: None = Depends(require_api_key)):
+    return await asyncio.to_thread(open_index().summary)
+
+
+@app.get("/api/analytics/players")
+async def analytics_players(
+    group_by: str = "player",
+    profile: Optional[str] = None,
+    team: Optional[str] = None,
+    player: Optional[str] = None,
+    _: None = Depends(require_api_key),
+):
+    groups = [key.strip() for key in group_by.split(",") if key.strip()]
+    try:
+        rows = await asyncio.to_thread(open_index().player_stats, groups, profile, team, player)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"group_by": groups, "rows": rows}
+
+
+@app.get("/api/analytics/events")
+async def analytics_events(
+    group_by: str = "type",
+    profile: Optional[str] = None,
+    event_type: Optional[str] = Query(None, alias="type"),
+    team: Optional[str] = None,
+    player: Optional[str] = None,
+    _: None = Depends(require_api_key),
+):
+    groups = [key.strip() for key in group_by.split(",") if key.strip()]
+    try:
+        rows = await asyncio.to_thread(open_index().event_stats, groups, profile, event_type, team, player)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"group_by": groups, "rows": rows}
+
+
+@app.post("/api/analytics/reindex")
+async def reindex_analytics(force: bool = False, _: None = Depends(require_api_key)):
+    """Index completed jobs from disk, e.g. ones processed before the index existed."""
+    return {"indexed": await asyncio.to_thread(open_index().backfill, None, force)}
+
+
 def _sse_payload(data: dict | list, event: str | None = None) -> str:
     body = f"data: {json.dumps(data)}\n\n"
     if event:
@@ -328,15 +620,18 @@ async def get_shared_job(share_id: str):
 
 
 @app.get("/api/share/{share_id}/tracks")
-async def get_shared_tracks(share_id: str):
+async def get_shared_tracks(
+    share_id: str,
+    start_s: Optional[float] = Query(None, ge=0),
+    end_s: Optional[float] = Query(None, ge=0),
+    lod: Optional[str] = None,
+    max_frames: int = Query(MAX_FRAMES, ge=1),
+):
     share_store: ShareStore = app.state.share_store
     link = await share_store.get(share_id)
     if not link:
         raise HTTPException(status_code=404, detail="share link invalid")
-    path = artifacts_dir(link.job_id) / "tracks.json"
-    if not path.exists():
-        raise HTTPException(status_code=404, detail="tracks not available")
-    return JSONResponse(load_json(path))
+    return await _tracks_response(link.job_id, start_s, end_s, lod, max_frames)
 
 
 @app.get("/api/share/{share_id}/metrics")
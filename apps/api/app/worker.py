@@ -0,0 +1,146 @@
+"""Pipeline worker: ``python -m app.worker [--concurrency N]``.
+
+Leases jobs from the durable queue in DATA_DIR/state.db, runs them and
+heartbeats the lease while they run. Start as many processes as the hardware
+allows; the API only enqueues when ``VAP_JOB_EXECUTOR=queue``. SIGTERM stops
+leasing and lets running jobs finish; a worker killed outright has its jobs
+picked up by others once their leases expire.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import threading
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+from .core.config import DATA_DIR
+from .core.jobs import JobStore
+from .core.queue import JobQueue, Lease
+from .core.state import SqliteState
+from .core.uploads import UploadSource, UploadStore
+
+logger = logging.getLogger("vap.worker")
+
+POLL_S = 1.0
+
+
+class _Heartbeat(threading.Thread):
+    """Extends a lease from its own thread, so CPU-bound stages on the event loop cannot starve it."""
+
+    def __init__(self, queue: JobQueue, lease: Lease, on_lost):
+        super().__init__(name=f"heartbeat-{lease.job_id}", daemon=True)
+        self.queue = queue
+        self.lease = lease
+        self.on_lost = on_lost
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self) -> None:
+        interval = self.queue.visibility_s / 3
+        while not self.stopped.wait(interval):
+            try:
+                alive = self.queue.heartbeat(self.lease)
+            except Exception:
+                logger.exception("heartbeat failed for %s", self.lease.job_id)
+                continue
+            if not alive:
+                self.lost = True
+                self.on_lost()
+                return
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+async def run_lease(store: JobStore, uploads: UploadStore, queue: JobQueue, lease: Lease) -> None:
+    if lease.exhausted:
+        # The previous holder died on the final attempt.
+        await asyncio.to_thread(queue.fail, lease, "worker lost")
+        await store.fail_job(lease.job_id, f"gave up after {lease.max_attempts} attempts: worker lost")
+        return
+    input_path = lease.payload.get("input_path")
+    upload_id = lease.payload.get("upload_id")
+    upload = UploadSource(uploads, upload_id) if upload_id else None
+
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    heartbeat = _Heartbeat(queue, lease, lambda: loop.call_soon_threadsafe(task.cancel))
+    heartbeat.start()
+    try:
+        await store.process_job(lease.job_id, Path(input_path) if input_path else None, upload)
+    except asyncio.CancelledError:
+        if not heartbeat.lost:
+            raise
+        logger.warning("lease on %s lost; another worker owns it now", lease.job_id)
+        return
+    except Exception as exc:
+        retrying = await asyncio.to_thread(queue.fail, lease, str(exc))
+        await store.fail_job(lease.job_id, str(exc), retrying=retrying)
+        return
+    finally:
+        heartbeat.stop()
+    await asyncio.to_thread(queue.complete, lease)
+
+
+async def run_worker(
+    concurrency: int = 1,
+    poll_s: float = POLL_S,
+    state: Optional[SqliteState] = None,
+    queue: Optional[JobQueue] = None,
+    stop: Optional[asyncio.Event] = None,
+    drain: bool = False,
+) -> None:
+    """Lease and run jobs until ``stop`` is set, or with ``drain`` until the queue is empty."""
+    state = state or SqliteState(DATA_DIR / "state.db")
+    queue = queue or JobQueue(state)
+    store = JobStore(DATA_DIR, state, queue)
+    uploads = UploadStore(DATA_DIR, state)
+    stop = stop or asyncio.Event()
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+    running: set[asyncio.Task] = set()
+
+    while not stop.is_set():
+        if len(running) < concurrency:
+            lease = await asyncio.to_thread(queue.lease, owner)
+            if lease is not None:
+                logger.info("leased %s (attempt %d/%d)", lease.job_id, lease.attempts, lease.max_attempts)
+                task = asyncio.create_task(run_lease(store, uploads, queue, lease))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                continue
+            if drain and not running:
+                break
+        try:
+            await asyncio.wait_for(stop.wait(), poll_s)
+        except asyncio.TimeoutError:
+            pass
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run queued pipeline jobs.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("VAP_WORKER_CONCURRENCY", "1")))
+    parser.add_argument("--poll-s", type=float, default=POLL_S)
+    parser.add_argument("--drain", action="store_true", help="exit once the queue is empty")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    async def runner() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await run_worker(args.concurrency, args.poll_s, stop=stop, drain=args.drain)
+
+    asyncio.run(runner())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+API_ROOT = Path(__file__).resolve().parents[1]
+BASELINE_PATH = API_ROOT / "benchmarks" / "baseline.json"
+
+# (name, frames, players)
+SCENARIOS = {
+    "250f-10p": (250, 10),
+    "250f-22p": (250, 22),
+    "250f-100p": (250, 100),
+    "10kf-22p": (10_000, 22),
+    "10kf-100p": (10_000, 100),
+    "match-22p": (90 * 60 * 25, 22),
+}
+SUITES = {
+    "quick": ["250f-10p", "250f-22p", "250f-100p", "10kf-22p"],
+    "full": list(SCENARIOS),
+}
+# Below this absolute slack, timer noise dominates and is not treated as a regression.
+MIN_SLACK_S = 0.005
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark pipeline analytics, storage and artifact endpoints.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="run only these scenarios")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the median is reported")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline, e.g. 0.25 = 25%%")
+    parser.add_argument("--update-baseline", action="store_true", help="write the measured medians as the new baseline")
+    parser.add_argument("--json", type=Path, help="also write results to this file")
+    return parser.parse_args()
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def run_scenario(name: str, repeat: int) -> dict[str, float]:
+    from fastapi.testclient import TestClient
+
+    from app.core.field import build_field_series
+    from app.core.pipeline import _compute_events, _compute_metrics, _generate_tracks, _write_exports
+    from app.core.schemas import ArtifactManifest, JobConfig
+    from app.core.storage import artifacts_dir, load_json, save_json
+    from app.main import app
+
+    frames, players = SCENARIOS[name]
+    config = JobConfig(profile="soccer")
+    job_id = f"bench-{name}"
+    artifacts_path = artifacts_dir(job_id)
+
+    tracks, series = _generate_tracks(config, seed=1234, frame_count=frames, player_count=players)
+    results: dict[str, float] = {}
+    results["field_series"] = _time(lambda: build_field_series(config, series), repeat)
+    field = build_field_series(config, series)
+    results["compute_metrics"] = _time(lambda: _compute_metrics(config, series, field), repeat)
+    results["compute_events"] = _time(lambda: _compute_events(config, series, field), repeat)
+
+    metrics = _compute_metrics(config, series, field)
+    events = _compute_events(config, series, field)
+    results["write_exports"] = _time(lambda: _write_exports(job_id, events, metrics), repeat)
+
+    series_path = artifacts_path / "series.json"
+    results["save_json_series"] = _time(lambda: save_json(series_path, series), repeat)
+    results["load_json_series"] = _time(lambda: load_json(series_path), repeat)
+    tracks_path = artifacts_path / "tracks.json"
+    results["save_json_tracks"] = _time(lambda: tracks.write_json(tracks_path), repeat)
+    results["load_json_tracks"] = _time(lambda: load_json(tracks_path), repeat)
+
+    save_json(artifacts_path / "metrics.json", metrics)
+    save_json(artifacts_path / "events.json", {"events": events})
+    manifest = ArtifactManifest(items=_write_exports(job_id, events, metrics))
+    save_json(artifacts_path / "manifest.json", manifest.model_dump())
+
+    client = TestClient(app)
+    for endpoint, path in (
+        ("http_tracks", f"/api/jobs/{job_id}/tracks"),
+        ("http_metrics", f"/api/jobs/{job_id}/metrics"),
+        ("http_events", f"/api/jobs/{job_id}/events"),
+        ("http_events_csv", f"/api/jobs/{job_id}/artifacts/events_csv"),
+    ):
+        def fetch(path: str = path) -> None:
+            response = client.get(path)
+            response.raise_for_status()
+
+        results[endpoint] = _time(fetch, repeat)
+
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    regressions = []
+    for key, measured in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        limit = max(expected * (1 + threshold), expected + MIN_SLACK_S)
+        if measured > limit:
+            regressions.append(f"{key}: {measured:.4f}s vs baseline {expected:.4f}s (limit {limit:.4f}s)")
+    return regressions
+
+
+def main() -> int:
+    args = _parse_args()
+    # DATA_DIR is read at import time, so isolate benchmark artifacts before importing the app.
+    os.environ.setdefault("VAP_DATA_DIR", tempfile.mkdtemp(prefix="vap-bench-"))
+    sys.path.append(str(API_ROOT))
+
+    scenarios = args.scenario or SUITES[args.suite]
+    results: dict[str, float] = {}
+    for name in scenarios:
+        for case, seconds in run_scenario(name, args.repeat).items():
+            key = f"{name}:{case}"
+            results[key] = round(seconds, 5)
+            print(f"{key:<36} {seconds * 1000:10.2f} ms", flush=True)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, sort_keys=True), encoding="utf-8")
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Updated baseline: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("No baseline found; run with --update-baseline to record one.")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("Regressions beyond threshold:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("No regressions beyond threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
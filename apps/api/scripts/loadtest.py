@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive concurrent uploads, SSE watches and artifact reads against a running API.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--api-key", default=os.getenv("VAP_API_KEY"))
+    parser.add_argument("--jobs", type=int, default=10, help="number of jobs to create")
+    parser.add_argument("--concurrency", type=int, default=4, help="jobs in flight at once")
+    parser.add_argument("--upload-mb", type=float, default=1.0, help="size of each uploaded payload")
+    parser.add_argument("--reads", type=int, default=5, help="artifact read rounds per completed job")
+    parser.add_argument("--duration-s", type=float, help="synthetic clip duration per job, e.g. 5400 for a full match")
+    parser.add_argument("--players", type=int, help="synthetic player count per job")
+    parser.add_argument("--fps", type=int, help="synthetic frame rate per job")
+    parser.add_argument("--formation", action="store_true", help="use the formation motion model")
+    parser.add_argument("--team-possession", action="store_true", help="use the team possession model")
+    parser.add_argument("--job-timeout", type=float, default=600.0, help="seconds to wait for a job to finish")
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    return parser.parse_args()
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def ok(self, op: str, seconds: float) -> None:
+        self.samples[op].append(seconds)
+
+    def fail(self, op: str) -> None:
+        self.errors[op] += 1
+
+    def report(self, elapsed: float) -> dict[str, dict[str, float]]:
+        report = {}
+        for op in sorted(set(self.samples) | set(self.errors)):
+            samples = self.samples.get(op, [])
+            row = {"count": len(samples), "errors": self.errors.get(op, 0), "throughput_per_s": round(len(samples) / elapsed, 3)}
+            if samples:
+                row.update({
+                    "p50_ms": round(_percentile(samples, 50) * 1000, 2),
+                    "p90_ms": round(_percentile(samples, 90) * 1000, 2),
+                    "p99_ms": round(_percentile(samples, 99) * 1000, 2),
+                    "max_ms": round(max(samples) * 1000, 2),
+                })
+            report[op] = row
+        return report
+
+
+def _job_config(args: argparse.Namespace) -> dict:
+    thresholds: dict[str, float] = {}
+    if args.duration_s:
+        thresholds["synthetic_duration_s"] = args.duration_s
+    if args.players:
+        thresholds["synthetic_players"] = args.players
+    if args.fps:
+        thresholds["synthetic_fps"] = args.fps
+    if args.formation:
+        thresholds["synthetic_formation"] = 1
+    if args.team_possession:
+        thresholds["synthetic_team_possession"] = 1
+    return {"profile": "soccer", "thresholds": thresholds}
+
+
+async def _watch_until_done(client: httpx.AsyncClient, job_id: str, recorder: Recorder, timeout: float) -> str | None:
+    started = time.perf_counter()
+    first_event = True
+    async with client.stream("GET", f"/api/updates/jobs/{job_id}", timeout=None) as response:
+        response.raise_for_status()
+        async with asyncio.timeout(timeout):
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if first_event:
+                    recorder.ok("sse_first_event", time.perf_counter() - started)
+                    first_event = False
+                status = json.loads(line[6:]).get("status")
+                if status in {"completed", "failed"}:
+                    return status
+    return None
+
+
+async def _run_job(client: httpx.AsyncClient, args: argparse.Namespace, payload: bytes, recorder: Recorder) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            "/api/jobs",
+            files={"video": ("loadtest.mp4", payload, "video/mp4")},
+            data={"config": json.dumps(_job_config(args))},
+        )
+        response.raise_for_status()
+    except httpx.HTTPError:
+        recorder.fail("create_job")
+        return
+    recorder.ok("create_job", time.perf_counter() - started)
+    job_id = response.json()["id"]
+
+    try:
+        status = await _watch_until_done(client, job_id, recorder, args.job_timeout)
+    except (httpx.HTTPError, TimeoutError):
+        status = None
+    if status != "completed":
+        recorder.fail("job_completion")
+        return
+    recorder.ok("job_completion", time.perf_counter() - started)
+
+    for _ in range(args.reads):
+        for op, path in (
+            ("read_tracks", f"/api/jobs/{job_id}/tracks"),
+            ("read_metrics", f"/api/jobs/{job_id}/metrics"),
+            ("read_events", f"/api/jobs/{job_id}/events"),
+        ):
+            read_started = time.perf_counter()
+            try:
+                read = await client.get(path)
+                read.raise_for_status()
+                recorder.ok(op, time.perf_counter() - read_started)
+            except httpx.HTTPError:
+                recorder.fail(op)
+
+
+async def main() -> int:
+    args = _parse_args()
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    payload = os.urandom(int(args.upload_mb * 1024 * 1024))
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2 + 4)
+
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, timeout=60.0, limits=limits) as client:
+        async def bounded() -> None:
+            async with semaphore:
+                await _run_job(client, args, payload, recorder)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bounded() for _ in range(args.jobs)))
+        elapsed = time.perf_counter() - started
+
+    report = recorder.report(elapsed)
+    print(f"{args.jobs} jobs, concurrency {args.concurrency}, {elapsed:.2f}s wall")
+    print(f"{'operation':<18}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for op, row in report.items():
+        print(
+            f"{op:<18}{row['count']:>7}{row['errors']:>8}{row['throughput_per_s']:>9.2f}"
+            f"{row.get('p50_ms', 0):>10.1f}{row.get('p90_ms', 0):>10.1f}{row.get('p99_ms', 0):>10.1f}{row.get('max_ms', 0):>10.1f}"
+        )
+    if args.json:
+        args.json.write_text(json.dumps({"elapsed_s": round(elapsed, 3), "operations": report}, indent=2), encoding="utf-8")
+    return 1 if any(row["errors"] for row in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
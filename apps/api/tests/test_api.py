@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import threading
 import time
 from fastapi.testclient import TestClient
 
@@ -9,6 +10,8 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from app import main
+from app.core import storage
 from app.main import app
 
 
@@ -23,7 +26,9 @@ def test_health():
 
 
 def test_job_flow(tmp_path, monkeypatch):
-    monkeypatch.setenv("VAP_DATA_DIR", str(tmp_path))
+    # DATA_DIR is read once at import, so VAP_DATA_DIR cannot move the stores here.
+    monkeypatch.setattr(main, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
     with TestClient(app) as local_client:
         response = local_client.post(
             "/api/jobs",
@@ -46,6 +51,39 @@ def test_job_flow(tmp_path, monkeypatch):
             time.sleep(0.2)
         assert job_state and job_state.get("status") == "completed"
 
+        timings_response = local_client.get(f"/api/jobs/{job_id}/timings")
+        assert timings_response.status_code == 200
+        timings = timings_response.json()
+        assert {"detect", "metrics", "events", "exports"} <= set(timings["stages"])
+        assert timings["artifact_bytes"]["tracks"] > 0
+        assert timings["stages"]["detect"]["cpu_s"] is None and timings["sections"]["detect.inference"]["cpu_s"] is not None
+
+        stream = local_client.get(
+            f"/api/jobs/{job_id}/stream/tracks",
+            params={"format": "csv", "start_frame": 100, "end_frame": 109, "labels": "player"},
+        )
+        assert stream.status_code == 200
+        assert stream.headers["content-type"].startswith("text/csv")
+        header, *rows = stream.text.strip().splitlines()
+        assert header.startswith("frame,time_s,id,label")
+        assert {int(row.split(",")[0]) for row in rows} == set(range(100, 110))
+        assert all(row.split(",")[3] == "player" for row in rows)
+
+        positions = local_client.get(f"/api/jobs/{job_id}/stream/positions", params={"ids": "p1", "end_frame": 49})
+        assert positions.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(line) for line in positions.text.splitlines()]
+        assert [record["frame"] for record in records] == list(range(50))
+        assert {record["id"] for record in records} == {"p1"} and records[1]["speed_mps"] is not None
+        assert local_client.get(f"/api/jobs/{job_id}/stream/tracks", params={"format": "xml"}).status_code == 400
+
+        overview = local_client.get(f"/api/jobs/{job_id}/tracks", params={"start_s": 0, "end_s": 10, "max_frames": 20}).json()
+        assert overview["meta"]["lod"]["fps"] == 1.0
+        assert [frame["frame"] for frame in overview["frames"]] == list(range(0, 250, 25))
+
+        analytics = local_client.get("/api/analytics/events", params={"group_by": "job,type"}).json()
+        assert any(row["job"] == job_id and row["events"] > 0 for row in analytics["rows"])
+        assert local_client.get("/api/analytics/players", params={"group_by": "height"}).status_code == 400
+
         config_response = local_client.get(f"/api/jobs/{job_id}/config")
         assert config_response.status_code == 200
 
@@ -57,3 +95,219 @@ def test_job_flow(tmp_path, monkeypatch):
 
         rerun_response = local_client.post(f"/api/jobs/{job_id}/rerun", json={"team_overrides": {"p1": "A"}})
         assert rerun_response.status_code == 200
+
+        metrics_response = local_client.get("/api/metrics")
+        assert metrics_response.status_code == 200
+        exposition = metrics_response.text
+        assert 'vap_jobs{status="completed"}' in exposition
+        assert 'vap_pipeline_stage_duration_seconds_count{stage="detect"}' in exposition
+        assert 'route="/api/jobs/{job_id}"' in exposition
+        assert 'vap_cache_lookups_total{cache="field_series",result="hit"}' in exposition
+
+
+def test_resumable_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    payload = b"0123456789" * 10
+    with TestClient(app) as local_client:
+        response = local_client.post(
+            "/api/uploads",
+            json={"filename": "../clip.mp4", "size": len(payload), "content_type": "video/mp4"},
+        )
+        assert response.status_code == 201
+        upload = response.json()
+        assert upload["filename"] == "clip.mp4"
+        assert response.headers["location"] == f"/api/uploads/{upload['id']}"
+
+        first = local_client.patch(
+            f"/api/uploads/{upload['id']}",
+            content=payload[:40],
+            headers={"Content-Range": f"bytes 0-39/{len(payload)}"},
+        )
+        assert first.status_code == 200
+        assert first.headers["upload-offset"] == "40"
+
+        stale = local_client.patch(
+            f"/api/uploads/{upload['id']}",
+            content=payload[10:],
+            headers={"Upload-Offset": "10"},
+        )
+        assert stale.status_code == 409
+        assert stale.json()["offset"] == 40
+
+        short = local_client.patch(
+            f"/api/uploads/{upload['id']}",
+            content=payload[40:50],
+            headers={"Content-Range": f"bytes 40-59/{len(payload)}"},
+        )
+        assert short.status_code == 400 and short.json()["offset"] == 40
+        oversized = local_client.patch(
+            f"/api/uploads/{upload['id']}",
+            content=payload[40:] + b"!",
+            headers={"Upload-Offset": "40"},
+        )
+        assert oversized.status_code == 413 and oversized.json()["offset"] == 40
+
+        head = local_client.head(f"/api/uploads/{upload['id']}")
+        assert head.headers["upload-offset"] == "40"
+
+        last = local_client.patch(
+            f"/api/uploads/{upload['id']}",
+            content=payload[40:],
+            headers={"Upload-Offset": "40"},
+        )
+        assert last.status_code == 200
+        session = last.json()
+        assert session["completed"] is True
+        assert Path(session["path"]).read_bytes() == payload
+
+        deadline = time.time() + 10
+        job_state = None
+        while time.time() < deadline:
+            job_state = local_client.get(f"/api/jobs/{upload['job_id']}").json()
+            if job_state.get("status") == "completed":
+                break
+            time.sleep(0.2)
+        assert job_state and job_state.get("status") == "completed"
+        assert job_state["input"]["filename"] == "clip.mp4"
+
+
+def test_pipelined_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    payload = bytes(range(256)) * 64
+    with TestClient(app) as local_client:
+        upload = local_client.post(
+            "/api/uploads",
+            json={"filename": "live.ts", "size": len(payload), "content_type": "video/mp2t", "pipelined": True},
+        ).json()
+        job_state = local_client.get(f"/api/jobs/{upload['job_id']}").json()
+        assert job_state["status"] == "processing"
+        assert job_state["input"]["filename"] == "live.ts"
+
+        received: list[bytes] = []
+        reader = app.state.upload_store.open_reader(upload["id"], stall_timeout=10)
+        consumer = threading.Thread(target=lambda: received.append(reader.readall()))
+        consumer.start()
+
+        half = len(payload) // 2
+        for start, chunk in ((0, payload[:half]), (half, payload[half:])):
+            response = local_client.patch(
+                f"/api/uploads/{upload['id']}",
+                content=chunk,
+                headers={"Upload-Offset": str(start)},
+            )
+            assert response.status_code == 200
+        consumer.join(timeout=10)
+        reader.close()
+        assert received == [payload]
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            job_state = local_client.get(f"/api/jobs/{upload['job_id']}").json()
+            if job_state.get("status") == "completed":
+                break
+            time.sleep(0.2)
+        assert job_state.get("status") == "completed"
+        assert job_state["summary"]["upload"]["sha256"]
+
+        # Per-upload state goes once the upload completes and its reader closes; the record stays readable.
+        store = app.state.upload_store
+        live = store.sessions.keys() | store._locks.keys() | store._progress.keys() | store._done.keys()
+        assert upload["id"] not in live
+        assert local_client.head(f"/api/uploads/{upload['id']}").headers["upload-offset"] == str(len(payload))
+
+
+def test_shared_state_reaches_other_processes(tmp_path, monkeypatch):
+    import asyncio
+
+    from app.core.jobs import JobStore
+    from app.core.schemas import JobConfig, JobStatus
+    from app.core.state import SqliteState
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+
+    async def scenario():
+        # Two stores over one state file stand in for two API worker processes.
+        first = JobStore(tmp_path, SqliteState(tmp_path / "state.db"))
+        second = JobStore(tmp_path, SqliteState(tmp_path / "state.db"))
+        follower = asyncio.create_task(second.follow_events(interval=0.01))
+        await asyncio.sleep(0.05)
+
+        job = await first.create_job(JobConfig(profile="soccer"))
+        queue = await second.subscribe_job(job.id)
+        assert (await second.get_job(job.id)).id == job.id
+
+        job.stage = "detect"
+        job.status = JobStatus.processing
+        await first.update_job(job)
+        payload = await asyncio.wait_for(queue.get(), timeout=2)
+        if payload["stage"] == "queued":
+            # The creation event may still be in flight when we subscribe.
+            payload = await asyncio.wait_for(queue.get(), timeout=2)
+        follower.cancel()
+
+        assert payload["stage"] == "detect"
+        assert second.queue_depth() == 0
+        assert [item.id for item in await second.list_jobs()] == [job.id]
+
+    asyncio.run(scenario())
+
+
+def test_queued_jobs_run_in_worker(tmp_path, monkeypatch):
+    import asyncio
+
+    from app.core.jobs import JobStore
+    from app.core.queue import JobQueue
+    from app.core.schemas import JobConfig
+    from app.core.state import SqliteState
+    from app.worker import run_worker
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+
+    async def scenario():
+        state = SqliteState(tmp_path / "state.db")
+        queue = JobQueue(state)
+        api = JobStore(tmp_path, state, queue)
+        job = await api.create_job(JobConfig(profile="soccer", thresholds={"synthetic_frames": 120}))
+        api.start_job(job.id, None)
+        assert not api.worker_tasks and queue.counts() == {"ready": 1}
+
+        await run_worker(state=state, queue=queue, poll_s=0.01, drain=True)
+        return await api.get_job(job.id)
+
+    job = asyncio.run(scenario())
+    assert job.status.value == "completed"
+
+
+def test_shared_state_inline_jobs_recover_after_claims_lapse(tmp_path, monkeypatch):
+    import asyncio
+
+    from app.core.jobs import JobStore
+    from app.core.schemas import JobConfig, JobStatus
+    from app.core.state import SqliteState
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+
+    async def scenario():
+        # A process that died mid-job leaves it in processing with a claim nobody renews.
+        dead = JobStore(tmp_path, SqliteState(tmp_path / "state.db"), claim_ttl_s=0.3)
+        survivor = JobStore(tmp_path, SqliteState(tmp_path / "state.db"), claim_ttl_s=0.3)
+        job = await dead.create_job(JobConfig(profile="soccer", thresholds={"synthetic_frames": 60}))
+        job.status = JobStatus.processing
+        await dead.update_job(job)
+        assert dead.state.claim("job", job.id, dead.owner, dead.claim_ttl_s)
+        assert await survivor.resume_interrupted() == []
+
+        watcher = asyncio.create_task(survivor.watch_claims())
+        deadline = asyncio.get_running_loop().time() + 5
+        while (await survivor.get_job(job.id)).status != JobStatus.completed:
+            assert asyncio.get_running_loop().time() < deadline
+            await asyncio.sleep(0.05)
+        watcher.cancel()
+        await asyncio.gather(*survivor.worker_tasks)
+        assert await dead.resume_interrupted() == []
+        assert survivor.state.unclaimed("job", JobStatus.processing.value) == []
+        return survivor.state.query("SELECT COUNT(*) FROM claims")[0][0]
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,632 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.core.calibration import field_transform, map_series_to_field
+from app.core.cv import _TrackAccumulator
+from app.core.decode import DecodeOptions, _output_size
+from app.core.field import build_field_series, load_field_series
+from app.core.pipeline import _compute_events, _compute_metrics, _generate_tracks
+from app.core.records import SparseTrack, TrackTable, iter_track_frames, read_track_header
+from app.core.schemas import JobConfig, ZoneDefinition
+from app.core.spatial import GridIndex, nearest_owner, radius_counts
+from app.core.synthetic import SyntheticSpec, generate_synthetic
+from app.core.teams import classify_teams
+from app.core.zones import analyze_zones, compile_zones
+
+
+def test_field_transform_fits_calibration_points():
+    config = JobConfig(
+        profile="soccer",
+        calibration_points=[
+            {"image_x": 100, "image_y": 50, "field_x": 0, "field_y": 0},
+            {"image_x": 1180, "image_y": 50, "field_x": 105, "field_y": 0},
+            {"image_x": 1280, "image_y": 700, "field_x": 105, "field_y": 68},
+            {"image_x": 0, "image_y": 700, "field_x": 0, "field_y": 68},
+        ],
+    )
+    transform = field_transform(config, 1280, 720)
+    assert transform.calibrated
+    mapped = transform.map_points([(100, 50), (1280, 700), (640, 700)])
+    assert abs(mapped[0][0]) < 1e-6 and abs(mapped[0][1]) < 1e-6
+    assert abs(mapped[1][0] - 105) < 1e-6 and abs(mapped[1][1] - 68) < 1e-6
+    assert abs(mapped[2][0] - 52.5) < 1e-6
+    assert field_transform(config, 1280, 720) is transform
+
+
+def test_field_transform_falls_back_to_scale():
+    transform = field_transform(JobConfig(profile="basketball"), 1280, 720)
+    assert not transform.calibrated
+    assert transform.map_point(1280, 720) == (28.0, 15.0)
+    series = {"width": 1280, "height": 720, "player_positions": {"p1": [(640, 360)]}, "ball_positions": [(1280, 720)]}
+    assert map_series_to_field(JobConfig(profile="basketball"), series) == {
+        "calibrated": False, "player_positions": {"p1": [(14.0, 7.5)]}, "ball_positions": [(28.0, 15.0)],
+    }
+
+
+def test_field_series_is_reused_until_calibration_changes(tmp_path):
+    config = JobConfig(profile="soccer")
+    _, series = _generate_tracks(config, seed=7)
+    path = tmp_path / "field.json"
+
+    field, rebuilt = load_field_series(path, config, series)
+    assert rebuilt and path.exists()
+    assert len(field["player_speeds"]["p1"]) == len(series["player_positions"]["p1"])
+    assert len(field["nearest_player_distance"]) == len(series["ball_positions"])
+
+    _, rebuilt = load_field_series(path, config, series)
+    assert not rebuilt
+
+    # Same frame count and size, different detections.
+    _, reseeded = _generate_tracks(config, seed=8)
+    _, rebuilt = load_field_series(path, config, reseeded)
+    assert rebuilt
+
+    calibrated = config.model_copy(update={"calibration_points": _corner_calibration()})
+    field, rebuilt = load_field_series(path, calibrated, series)
+    assert rebuilt and field["calibrated"]
+
+
+def _corner_calibration():
+    return JobConfig.model_validate({
+        "calibration_points": [
+            {"image_x": 0, "image_y": 0, "field_x": 0, "field_y": 0},
+            {"image_x": 1280, "image_y": 0, "field_x": 105, "field_y": 0},
+            {"image_x": 1280, "image_y": 720, "field_x": 105, "field_y": 68},
+            {"image_x": 0, "image_y": 720, "field_x": 0, "field_y": 68},
+        ],
+    }).calibration_points
+
+
+def test_grid_index_matches_linear_scan():
+    import random
+
+    rng = random.Random(3)
+    points = [(rng.uniform(0, 1280), rng.uniform(0, 720)) for _ in range(40)]
+    query = (640.0, 360.0)
+    by_distance = sorted(
+        ((px - query[0]) ** 2 + (py - query[1]) ** 2, idx) for idx, (px, py) in enumerate(points)
+    )
+
+    index = GridIndex.auto(points)
+    assert [idx for idx, _ in index.k_nearest(*query, 5)] == [idx for _, idx in by_distance[:5]]
+    assert GridIndex(points, 200).count_within(*query, 200) == sum(1 for dist, _ in by_distance if dist < 200 ** 2)
+
+
+def test_batched_proximity_queries_skip_missing_frames():
+    positions = {"p1": [(0, 0), (10, 0)], "p2": [(5, 0)]}
+    ball = [(4, 0), (9, 0)]
+    assert [owner for owner, _ in nearest_owner(positions, ball)] == ["p2", "p1"]
+    assert radius_counts(positions, ball, 6) == [2, 1]
+
+
+def test_zones_compile_once_and_report_dwell():
+    zones = [
+        ZoneDefinition(id="z1", name="Box", polygon=[[0, 0], [10, 0], [10, 10], [0, 10]]),
+        ZoneDefinition(id="z2", name="Wing", polygon=[[20, 0], [30, 0], [25, 10]]),
+    ]
+    compiled = compile_zones(zones)
+    assert compiled is compile_zones([zone.model_copy() for zone in zones])
+    assert compiled[0].bbox == (0, 0, 10, 10)
+    assert compiled[1].classify([(25, 2), (21, 9), (100, 100)]) == [True, False, False]
+
+    report = analyze_zones(
+        zones,
+        ball_positions=[(5, 5), (5, 5), (25, 2), (50, 50)],
+        player_positions={"p1": [(1, 1), (2, 2), (3, 3), (40, 40)], "p2": [(9, 9), (50, 50), (50, 50), (50, 50)]},
+        fps=2,
+    )
+    assert report["ball"]["z1"] == [True, True, False, False]
+    assert report["summary"]["z1"]["player_dwell_s"] == {"p1": 1.5, "p2": 0.5}
+    assert report["summary"]["z1"]["max_occupancy"] == 2
+    assert report["summary"]["z2"]["ball_dwell_s"] == 0.5
+
+
+def test_synthetic_spec_reads_scale_from_thresholds():
+    config = JobConfig(
+        profile="soccer",
+        thresholds={"synthetic_duration_s": 4, "synthetic_fps": 30, "synthetic_players": 6, "synthetic_height": 1080},
+    )
+    spec = SyntheticSpec.from_config(config, seed=5)
+    assert (spec.frame_count, spec.fps, spec.player_count, spec.height) == (120, 30, 6, 1080)
+
+    tracks, series = generate_synthetic(SyntheticSpec(frame_count=50, player_count=6, motion="formation", possession="team"))
+    payload = tracks.to_payload()
+    assert len(payload["frames"]) == 50
+    assert len(payload["frames"][0]["objects"]) == 7
+    assert all(len(positions) == 50 for positions in series["player_positions"].values())
+    assert set(series["owner_by_frame"]) <= set(series["player_positions"])
+
+
+def test_decode_options_from_thresholds():
+    defaults = DecodeOptions.from_config(JobConfig(profile="soccer"))
+    assert defaults.is_default
+
+    options = DecodeOptions.from_config(
+        JobConfig(profile="soccer", thresholds={"decode_stride": 3, "decode_scale": 0.5, "decode_keyframes": 1})
+    )
+    assert (options.stride, options.scale, options.keyframes_only) == (3, 0.5, True)
+    assert not options.is_default
+    assert _output_size(1920, 1080, options.scale) == (960, 540)
+    assert _output_size(1281, 721, 0.5) == (640, 360)
+
+
+def test_track_table_round_trips_public_shape(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.records.CHUNK_FRAMES", 3)
+    monkeypatch.setattr("app.core.records.INDEX_STRIDE", 2)
+    table = TrackTable({"profile": "soccer", "fps": 25, "frame_count": 7, "width": 1280, "height": 720})
+    table.tracks = [{"id": "p1", "label": "player", "team": "A"}]
+    for frame in range(7):
+        table.start_frame()
+        if frame % 2:
+            continue
+        table.add("p1", "player", "A", 10.123 + frame, 20.5, 32, 64, 0.91234)
+        table.add("ball", "ball", None, 100.0, 200.0, 16, 16, 0.7)
+
+    assert table.frame_count == 7
+    assert len(table.chunks) == 3
+    assert len(table.ids) == 2
+    frames = list(table.iter_frames())
+    assert [frame["frame"] for frame in frames] == list(range(7))
+    assert frames[1]["objects"] == []
+    assert frames[2]["objects"][0] == {
+        "id": "p1", "label": "player", "team": "A", "bbox": [12.12, 20.5, 32.0, 64.0], "confidence": 0.912,
+    }
+    assert frames[2]["objects"][1]["team"] is None
+
+    path = tmp_path / "tracks.json"
+    table.write_json(path)
+    assert json.loads(path.read_text()) == json.loads(json.dumps(table.to_payload()))
+    assert read_track_header(path) == {"meta": table.meta, "tracks": table.tracks}
+    assert [frame["frame"] for frame in iter_track_frames(path, 3, 5)] == [3, 4, 5]
+    assert list(iter_track_frames(path, 6)) == json.loads(json.dumps(frames[6:]))
+
+
+def test_lod_levels_downsample_and_pick_by_span(tmp_path):
+    from app.core.lod import choose_level, tracks_window, write_lod
+
+    table = TrackTable({"profile": "soccer", "fps": 10, "frame_count": 40, "width": 100, "height": 100})
+    table.tracks = [{"id": "p1", "label": "player", "team": "A"}]
+    for frame in range(40):
+        table.start_frame()
+        table.add("p1", "player", "A", float(frame), 50.0 - frame, 2, 2, 0.9)
+    table.write_json(tmp_path / "tracks.json")
+
+    items = write_lod(tmp_path, table, levels=[1, 5, 10])
+    assert {item.name for item in items} == {"tracks_lod_10", "tracks_lod_2", "tracks_envelope", "tracks_lod"}
+    one_fps = json.loads((tmp_path / "lod" / "tracks_10.json").read_text())
+    assert [frame["frame"] for frame in one_fps["frames"]] == [0, 10, 20, 30]
+    assert one_fps["meta"]["lod"] == {"fps": 1.0, "step": 10}
+
+    envelope = tracks_window(tmp_path, lod="envelope")
+    assert envelope["columns"] == ["t", "min_x", "max_x", "min_y", "max_y", "samples"]
+    assert envelope["tracks"][0]["buckets"][1] == [1.0, 11.0, 20.0, 32.0, 41.0, 10]
+
+    index = json.loads((tmp_path / "lod" / "index.json").read_text())
+    assert choose_level(index, span_s=4, max_frames=40) is None
+    assert choose_level(index, span_s=4, max_frames=20)["fps"] == 5.0
+    assert choose_level(index, span_s=400, max_frames=20)["fps"] == 1.0
+
+    window = tracks_window(tmp_path, start_s=1.0, end_s=3.0, max_frames=10)
+    assert window["meta"]["lod"]["step"] == 2
+    assert [frame["frame"] for frame in window["frames"]] == list(range(10, 31, 2))
+    assert [frame["frame"] for frame in tracks_window(tmp_path, 0.0, 0.3, lod="full")["frames"]] == [0, 1, 2, 3]
+
+
+def test_sparse_track_interpolates_gaps_lazily():
+    track = SparseTrack()
+    for frame, x in ((5, 0.0), (6, 10.0), (10, 50.0)):
+        track.observe(frame, x, 2 * x)
+    assert (track.first_frame, track.last_frame) == (5, 10)
+    assert track.position(4) is None
+    assert track.position(8) == (30.0, 60.0)
+    dense = track.dense()
+    assert len(dense) == 6
+    assert dense[2] == (20.0, 40.0)
+
+
+def test_late_tracks_are_offset_not_padded():
+    fps = 10
+    series = {
+        "player_positions": {"p1": [(100.0, 100.0)] * 20, "p2": [(500.0 + 20 * i, 300.0) for i in range(10)]},
+        "player_first_frame": {"p2": 10},
+        "ball_positions": [(510.0, 300.0)] * 20,
+        "owner_by_frame": ["p1"] * 20,
+        "fps": fps,
+        "width": 1280,
+        "height": 720,
+    }
+    assert nearest_owner(series["player_positions"], series["ball_positions"], series["player_first_frame"])[9][0] == "p1"
+    assert nearest_owner(series["player_positions"], series["ball_positions"], series["player_first_frame"])[10][0] == "p2"
+
+    config = JobConfig(profile="soccer", thresholds={"sprint_speed_mps": 1.0, "sprint_min_frames": 3})
+    field = build_field_series(config, series)
+    assert field["player_first_frame"] == {"p2": 10}
+    metrics = _compute_metrics(config, series, field)
+    players = {player["id"]: player for player in metrics["players"]}
+    # 9 steps of 20 px each; no jump in from the origin before the track appeared.
+    assert players["p2"]["distance_m"] == round(sum(field["player_speeds"]["p2"][1:]) / fps, 2)
+    assert players["p2"]["max_speed_mps"] == round(max(field["player_speeds"]["p2"][1:]), 2)
+
+    series["player_positions"]["p2"] = series["player_positions"]["p2"] + [(680.0, 300.0)] * 2
+    series["ball_positions"] += [(510.0, 300.0)] * 2
+    series["owner_by_frame"] += ["p1"] * 2
+    field = build_field_series(config, series)
+    sprints = [event for event in _compute_events(config, series, field) if event["type"] == "sprint_burst"]
+    assert [event["frame"] for event in sprints] == [20]
+
+
+class _Column:
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def tolist(self):
+        return list(self.values)
+
+
+class _Boxes:
+    def __init__(self, rows):
+        self.xyxy = _Column([row[0] for row in rows])
+        self.conf = _Column([0.9] * len(rows))
+        self.cls = _Column([0] * len(rows))
+        self.id = _Column([row[1] for row in rows])
+
+
+class _Result:
+    def __init__(self, rows):
+        self.boxes = _Boxes(rows)
+        self.speed = {}
+
+
+def test_fragments_merge_into_compact_identities():
+    def box(x, y):
+        return [x - 10, y - 20, x + 10, y + 20]
+
+    accumulator = _TrackAccumulator({0: "person"}, 1280, 720, None)
+    for frame in range(41):
+        rows = [(box(900, 100 + frame), 3)]
+        x = 100 + 5 * frame
+        if frame < 20:
+            rows.append((box(x, 400), 1))
+        elif frame > 21:
+            # Same player after an ID switch, continuing the same motion.
+            rows.append((box(x, 400), 7))
+        if frame in (5, 6):
+            rows.append((box(600, 650), 42))
+        accumulator.add(_Result(rows))
+
+    tracks, series = accumulator.finish(JobConfig(profile="soccer"), 25, 41)
+    assert tracks.meta["reid"] == {"fragments": 4, "identities": 2}
+    assert set(series["player_positions"]) == {"p1", "p2"}
+    merged = next(track for track in tracks.tracks if track["id"] != "unassigned" and track["fragments"] == ["p1", "p7"])
+    moving = series["player_positions"][merged["id"]]
+    assert series["player_first_frame"][merged["id"]] == 0
+    assert len(moving) == 41
+    assert moving[20] == (200.0, 400.0)
+    frame_ids = {obj["id"] for frame in tracks.iter_frames() for obj in frame["objects"]}
+    assert frame_ids == {"p1", "p2", "unassigned"}
+
+
+def test_team_classification_clusters_jersey_colours():
+    red = [0.7, 0.2, 0.1, 0.0]
+    blue = [0.0, 0.1, 0.2, 0.7]
+    features = {}
+    anchors = {}
+    for idx in range(10):
+        jitter = 0.02 * (idx % 3)
+        base = red if idx % 2 else blue
+        features[f"p{idx + 1}"] = [value + jitter for value in base]
+        anchors[f"p{idx + 1}"] = 300.0 if idx % 2 else 900.0
+    features["p11"] = []
+
+    teams = classify_teams(features, anchors)
+    assert "p11" not in teams
+    # Red shirts play on the left, so they are team A.
+    assert {teams[f"p{idx + 1}"] for idx in range(1, 10, 2)} == {"A"}
+    assert {teams[f"p{idx + 1}"] for idx in range(0, 10, 2)} == {"B"}
+
+    series = {
+        "player_positions": {"p1": [(100.0, 100.0)] * 4, "p2": [(200.0, 100.0)] * 4},
+        "ball_positions": [(100.0, 100.0)] * 4,
+        "owner_by_frame": ["p2"] * 4,
+        "teams": {"p1": "B", "p2": "B"},
+        "fps": 25,
+        "width": 1280,
+        "height": 720,
+    }
+    metrics = _compute_metrics(JobConfig(profile="soccer"), series)
+    assert metrics["summary"]["team_possession"] == {"A": 0.0, "B": 1.0}
+    overridden = _compute_metrics(JobConfig(profile="soccer", team_overrides={"p2": "A"}), series)
+    assert overridden["summary"]["team_possession"] == {"A": 1.0, "B": 0.0}
+
+
+def test_queue_leases_retries_and_recovers_expired_leases(tmp_path):
+    from app.core.queue import JobQueue
+    from app.core.state import SqliteState
+
+    queue = JobQueue(SqliteState(tmp_path / "state.db"), visibility_s=60, max_attempts=2)
+    queue.enqueue("job-1", {"input_path": None})
+
+    lease = queue.lease("worker-a")
+    assert lease.attempts == 1 and lease.payload == {"input_path": None}
+    assert queue.lease("worker-b") is None
+    assert queue.heartbeat(lease)
+
+    # A failed attempt is retried after a backoff, not immediately.
+    assert queue.fail(lease, "boom")
+    assert queue.lease("worker-b") is None
+    with queue.state.transaction() as conn:
+        conn.execute("UPDATE queue SET available_at = 0")
+
+    # A worker that stops heartbeating loses the job once its lease expires.
+    queue.visibility_s = -1
+    stale = queue.lease("worker-a")
+    assert stale.attempts == 2
+    taken = queue.lease("worker-b")
+    assert taken.owner == "worker-b" and taken.exhausted
+    assert not queue.heartbeat(stale)
+    assert not queue.fail(taken, "worker lost")
+    assert queue.counts() == {"dead": 1}
+
+
+def test_pipeline_resumes_from_checkpoints(tmp_path, monkeypatch):
+    import asyncio
+    from datetime import datetime, timezone
+
+    from app.core import pipeline, storage
+    from app.core.schemas import JobRecord
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    now = datetime.now(timezone.utc)
+    job = JobRecord(
+        id="resume-job",
+        status="processing",
+        created_at=now,
+        updated_at=now,
+        config=JobConfig(profile="soccer", thresholds={"synthetic_frames": 90}),
+    )
+    asyncio.run(pipeline.run_pipeline(job, None))
+    first = json.loads((tmp_path / "jobs" / job.id / "artifacts" / "metrics.json").read_text())
+    assert "resumed_stages" not in job.summary
+
+    def fail(*args, **kwargs):
+        raise AssertionError("detect should have been skipped")
+
+    # A crashed job rerun with unchanged inputs skips every finished stage.
+    monkeypatch.setattr(pipeline, "_generate_tracks", fail)
+    job.summary = {}
+    manifest = asyncio.run(pipeline.run_pipeline(job, None))
+    assert "detect" in job.summary["resumed_stages"] and "exports" in job.summary["resumed_stages"]
+    assert job.summary["frames"] == 90
+    assert {"tracks", "series", "field", "metrics", "events"} <= {item.name for item in manifest.items}
+    assert json.loads((tmp_path / "jobs" / job.id / "artifacts" / "metrics.json").read_text()) == first
+
+    # Changing only zones keeps detection and field mapping but reruns analytics.
+    job.config = job.config.model_copy(update={"zones": [ZoneDefinition(id="z", name="Box", polygon=[[0, 0], [1, 0], [1, 1]])]})
+    job.summary = {}
+    asyncio.run(pipeline.run_pipeline(job, None))
+    assert {"detect", "write_tracks", "understand"} <= set(job.summary["resumed_stages"])
+    assert not {"metrics", "events", "exports"} & set(job.summary["resumed_stages"])
+
+    # A stage that needs the track table reruns from tracks.json without redoing detection.
+    artifacts = tmp_path / "jobs" / job.id / "artifacts"
+    lod = {path.name: path.read_bytes() for path in (artifacts / "lod").iterdir()}
+    (artifacts / "lod" / "index.json").unlink()
+    job.summary = {}
+    asyncio.run(pipeline.run_pipeline(job, None))
+    assert {"detect", "write_tracks", "understand", "metrics"} <= set(job.summary["resumed_stages"])
+    assert "lod" not in job.summary["resumed_stages"]
+    assert {path.name: path.read_bytes() for path in (artifacts / "lod").iterdir()} == lod
+
+    # Without tracks.json detect reruns, and so does everything downstream of it.
+    monkeypatch.undo()
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    (artifacts / "tracks.json").unlink()
+    job.summary = {}
+    asyncio.run(pipeline.run_pipeline(job, None))
+    assert "resumed_stages" not in job.summary
+
+
+def test_recompute_analytics_reports_failed_columnar_export(tmp_path, monkeypatch):
+    from app.core import pipeline, storage
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("pyarrow is required for columnar exports")
+
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(pipeline, "export_analytics", unavailable)
+    config = JobConfig(profile="soccer")
+    _, series = _generate_tracks(config, seed=3)
+    items, _, events, summary = pipeline.recompute_analytics("rerun-job", config, series)
+    assert summary == {"export_warning": "pyarrow is required for columnar exports"}
+    assert {"metrics", "events"} <= {item.name for item in items} and events
+
+
+def test_analytics_index_aggregates_across_jobs(tmp_path):
+    from app.core.analytics import AnalyticsIndex
+
+    index = AnalyticsIndex(tmp_path / "analytics.db")
+    players = [
+        {"id": "p1", "team": "A", "distance_m": 100.0, "avg_speed_mps": 2.0, "max_speed_mps": 6.0},
+        {"id": "p2", "team": "B", "distance_m": 50.0, "avg_speed_mps": 1.0, "max_speed_mps": 4.0},
+    ]
+    sprint = {"type": "sprint_burst", "frame": 10, "start": 0.4, "end": 1.0, "confidence": 0.8, "involved": ["p1"]}
+    index.index_job("j1", "soccer", {"players": players}, [sprint, {**sprint, "frame": 90}])
+    index.index_job("j2", "soccer", {"players": players}, [{**sprint, "involved": ["p2"]}])
+    index.index_job("j3", "basketball", {"players": players[:1]}, [])
+    # Reindexing a job replaces its rows.
+    index.index_job("j2", "soccer", {"players": players}, [{**sprint, "involved": ["p2"]}])
+
+    by_player = {row["player"]: row for row in index.player_stats(["player"], profile="soccer")}
+    assert by_player["p1"]["jobs"] == 2 and by_player["p1"]["total_distance_m"] == 200.0
+
+    sprints = index.event_stats(["player"], profile="soccer", event_type="sprint_burst")
+    assert [(row["player"], row["events"], row["jobs"], row["per_job"]) for row in sprints] == [("p1", 2, 2, 1.0), ("p2", 1, 2, 0.5)]
+    by_type = index.event_stats(["profile", "type"])
+    assert by_type == [{"profile": "soccer", "type": "sprint_burst", "events": 3, "jobs": 2, "per_job": 1.5, "avg_confidence": 0.8}]
+    assert index.summary()["profiles"] == [{"profile": "basketball", "jobs": 1, "events": 0}, {"profile": "soccer", "jobs": 2, "events": 3}]
+    with pytest.raises(ValueError):
+        index.player_stats(["distance_m; DROP TABLE jobs"])
+
+    artifacts = tmp_path / "jobs" / "j4" / "artifacts"
+    artifacts.mkdir(parents=True)
+    (artifacts.parent / "job.json").write_text(json.dumps({"id": "j4", "status": "completed", "config": {"profile": "soccer"}}))
+    (artifacts / "metrics.json").write_text(json.dumps({"players": players}))
+    (artifacts / "events.json").write_text(json.dumps({"events": [sprint]}))
+    assert index.backfill(tmp_path / "jobs") == 1
+    assert index.backfill(tmp_path / "jobs") == 0
+    assert index.event_stats([], profile="soccer")[0]["events"] == 4
+
+
+def test_clips_are_planned_per_event_and_reused_across_reruns(tmp_path, monkeypatch):
+    from app.core import clips
+    from app.core.clips import ClipOptions, extract_clips, plan_clips
+
+    video = tmp_path / "match.mp4"
+    video.write_bytes(b"video")
+    events = [
+        {"id": "e1", "type": "shot_attempt", "start": 1.0, "end": 2.0, "confidence": 0.9},
+        {"id": "e2", "type": "shot_attempt", "start": 3.0, "end": 3.5, "confidence": 0.5},
+        {"id": "e3", "type": "sprint_burst", "start": 20.0, "end": 21.0, "confidence": 0.7},
+    ]
+    reels = plan_clips(events, ClipOptions(by_type=True), "src")
+    assert [(plan.name, plan.segments) for plan in reels] == [
+        ("clip_shot_attempt", ((0.0, 5.5),)),
+        ("clip_sprint_burst", ((18.0, 23.0),)),
+    ]
+
+    cuts = []
+
+    def fake_cut(ffmpeg, input_path, start, end, output):
+        cuts.append((start, end))
+        output.write_bytes(b"clip")
+
+    monkeypatch.setattr(clips, "_ffmpeg", lambda: "ffmpeg")
+    monkeypatch.setattr(clips, "_cut", fake_cut)
+    items, summary = extract_clips(tmp_path / "clips", video, events, ClipOptions(max_clips=2))
+    assert [item.name for item in items] == ["clip_e1", "clip_e3", "clips"]
+    assert summary == {"clips": 2, "clips_cut": 2}
+
+    moved = [events[0], {**events[2], "start": 30.0, "end": 31.0}]
+    items, summary = extract_clips(tmp_path / "clips", video, moved, ClipOptions(max_clips=2))
+    assert summary == {"clips": 2, "clips_cut": 1}
+    assert cuts[-1] == (28.0, 33.0)
+    assert len(list((tmp_path / "clips").glob("*.mp4"))) == 2
+
+
+def test_overlay_painter_follows_decoded_frames(tmp_path):
+    from app.core.overlay import OverlayOptions, _Painter
+    from app.core.records import write_frames_json
+
+    assert not OverlayOptions.from_config(JobConfig(profile="soccer")).enabled
+    options = OverlayOptions.from_config(JobConfig(profile="soccer", thresholds={"overlay_enabled": 1, "overlay_stride": 0, "overlay_scale": 2}))
+    assert (options.enabled, options.stride, options.scale) == (True, 1, 1.0)
+
+    def ball(frame, x):
+        return {"frame": frame, "objects": [{"id": "ball", "label": "ball", "bbox": [x, 10, 2, 2]}]}
+
+    path = tmp_path / "tracks.json"
+    write_frames_json(path, {}, [], [ball(0, 0), ball(1, 20), ball(2, 40), ball(5, 60)])
+    painter = _Painter(None, None, path, JobConfig(profile="soccer"), (100, 100), (50, 50), trail=2)
+    assert painter._objects_at(0)[0]["bbox"][0] == 0
+    # Frames skipped on a stride still extend the ball trail.
+    assert painter._objects_at(2)[0]["bbox"][0] == 40
+    assert list(painter._trail) == [(10, 5), (20, 5)]
+    assert painter._objects_at(4) == []
+    assert painter._objects_at(5)[0]["bbox"][0] == 60
+    assert painter._objects_at(6) == []
+
+
+def test_stage_graph_runs_independent_stages_concurrently(tmp_path):
+    import asyncio
+    import threading
+    import time
+
+    from app.core.checkpoints import Checkpoints
+    from app.core.dag import Resource, Stage, StageContext, StageGraph, StageOutput
+    from app.core.profiling import StageProfiler
+
+    barrier = threading.Barrier(2, timeout=2)
+
+    def source(ctx):
+        return StageOutput(values={"x": 2})
+
+    def branch(name):
+        def run(ctx):
+            barrier.wait()  # deadlocks unless both branches run at once
+            # "a" burns CPU while "b" sleeps; neither stage may be charged the other's CPU.
+            deadline = time.perf_counter() + 0.2
+            while name == "a" and time.perf_counter() < deadline:
+                pass
+            time.sleep(0.2 if name == "b" else 0)
+            return StageOutput(values={name: ctx.values["x"] * 10})
+        return run
+
+    def join(ctx):
+        return StageOutput(values={"total": ctx.values["a"] + ctx.values["b"]})
+
+    graph = StageGraph([
+        Stage("join", join, inputs=("a", "b"), outputs=("total",)),
+        Stage("a", branch("a"), inputs=("x",), outputs=("a",), resource=Resource.io),
+        Stage("b", branch("b"), inputs=("x",), outputs=("b",), resource=Resource.io),
+        Stage("source", source, outputs=("x",)),
+    ])
+    assert graph.order() == ["source", "a", "b", "join"]
+
+    progress = []
+
+    async def on_progress(active, fraction):
+        progress.append(fraction)
+
+    from datetime import datetime, timezone
+
+    from app.core.schemas import JobRecord
+
+    now = datetime.now(timezone.utc)
+    job = JobRecord(id="dag", status="processing", created_at=now, updated_at=now, config=JobConfig(profile="soccer"))
+    ctx = StageContext(job, None, None, tmp_path, StageProfiler())
+    asyncio.run(graph.run(ctx, Checkpoints(tmp_path / "checkpoints.json"), on_progress=on_progress))
+    assert ctx.values["total"] == 40
+    assert progress[-1] == 1.0 and progress == sorted(progress)
+    stages = ctx.profiler.summary()["stages"]
+    assert stages["a"]["cpu_s"] >= 0.1 and stages["b"]["cpu_s"] < 0.05
+
+
+def test_columnar_exports_match_track_table(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    from app.core.columnar import export_analytics, export_tracks
+    from app.core.field import build_field_series
+
+    config = JobConfig(profile="basketball", thresholds={"synthetic_frames": 50})
+    tracks, series = _generate_tracks(config, seed=5)
+    field = build_field_series(config, series)
+    items = export_tracks(tmp_path, tracks, series, field, formats=["parquet", "arrow"])
+    assert {item.name for item in items} == {"tracks_parquet", "tracks_arrow", "series_parquet", "series_arrow"}
+
+    table = pq.read_table(tmp_path / "tracks.parquet")
+    rows = [
+        {"frame": frame["frame"], "id": obj["id"], "team": obj["team"]}
+        for frame in tracks.iter_frames()
+        for obj in frame["objects"]
+    ]
+    assert table.select(["frame", "id", "team"]).to_pylist() == rows
+    with pa.ipc.open_file(tmp_path / "tracks.arrow") as reader:
+        assert reader.read_all().num_rows == len(rows)
+    assert pq.read_table(tmp_path / "series.parquet").num_rows == 50 * (1 + len(series["player_positions"]))
+
+    metrics = _compute_metrics(config, series, field)
+    events = _compute_events(config, series, field)
+    export_analytics(tmp_path, metrics, events, formats=["parquet"])
+    assert pq.read_table(tmp_path / "players.parquet").column("id").to_pylist() == [p["id"] for p in metrics["players"]]
+    assert pq.read_table(tmp_path / "events.parquet").num_rows == len(events)